@@ -0,0 +1,20 @@
+-- 1 se o pdvvalor tem um índice válido começando por (pdvid, coo) ou
+-- (tipo, pdvid, coo), usado pelas estratégias "distinct_on"/"lateral" do
+-- status_caixa; 0 caso contrário.
+SELECT CASE WHEN EXISTS (
+	SELECT 1
+	FROM pg_index i
+	JOIN pg_class t ON t.oid = i.indrelid
+	WHERE t.relname = 'pdvvalor'
+		AND pg_table_is_visible(t.oid)
+		AND i.indisvalid
+		AND (
+			(i.indkey[0], i.indkey[1]) = (
+				(SELECT attnum FROM pg_attribute WHERE attrelid = t.oid AND attname = 'pdvid'),
+				(SELECT attnum FROM pg_attribute WHERE attrelid = t.oid AND attname = 'coo'))
+			OR (i.indkey[0], i.indkey[1], i.indkey[2]) = (
+				(SELECT attnum FROM pg_attribute WHERE attrelid = t.oid AND attname = 'tipo'),
+				(SELECT attnum FROM pg_attribute WHERE attrelid = t.oid AND attname = 'pdvid'),
+				(SELECT attnum FROM pg_attribute WHERE attrelid = t.oid AND attname = 'coo'))
+		)
+) THEN 1 ELSE 0 END;
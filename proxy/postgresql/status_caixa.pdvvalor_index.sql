@@ -0,0 +1,11 @@
+-- Índice das estratégias "distinct_on" e "lateral" do status_caixa
+-- (PARAM_STATUS_CAIXA_QUERY): último COO tipo 5 por PDV sem varrer o
+-- histórico do pdvvalor. Com operadorid na chave a busca sai só do índice.
+--
+-- CONCURRENTLY não bloqueia as gravações dos PDVs, mas não roda dentro de
+-- transação: execute com "psql -f" direto no banco do concentrador. Se a
+-- criação for interrompida o índice fica inválido (indisvalid = false);
+-- remova com DROP INDEX CONCURRENTLY e rode de novo.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pdvvalor_tipo5_pdvid_coo_idx
+    ON pdvvalor (pdvid, coo DESC, operadorid)
+    WHERE tipo = 5;
@@ -1,39 +1,14 @@
 #!/usr/bin/env python3
-import os
-import sys
 from pathlib import Path
-import psutil
-
-def already_running():
-    """Retorna True se já existir outra instância Python rodando exatamente este script."""
-    me_pid    = os.getpid()
-    me_script = str(Path(__file__).resolve())
-    me_python = sys.executable
-
-    for proc in psutil.process_iter(['pid','exe','cmdline']):
-        try:
-            pid = proc.info['pid']
-            if pid == me_pid:
-                continue
-            exe  = proc.info.get('exe')     or ''
-            cmd  = proc.info.get('cmdline') or []
-            if exe == me_python and len(cmd) >= 2:
-                script_path = str(Path(cmd[1]).resolve())
-                if script_path == me_script:
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-if already_running():
-    print("Script já está em execução em outro processo.")
-    sys.exit(1)
+from instance_lock import exit_if_running
+
+exit_if_running("Cupons")
 
 # —–––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
 
 import json
 import mysql.connector
-import subprocess
+from zabbix_sender import send_trap
 import requests
 import argparse
 from datetime import datetime
@@ -47,17 +22,8 @@ def load_config(config_file):
 
 def send_zabbix_trap(status, message, config):
     """Envia trap para Zabbix indicando status e mensagem."""
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    cmd = [
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{config['PARAM_REDE']}-PROXY",
-        "-k", "concentrador.mysql.conexao",
-        "-o", f'{{"status":"{status}", "message":"{message}"}}'
-    ]
-    subprocess.run(cmd)
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{config['PARAM_REDE']}-PROXY", "concentrador.mysql.conexao", value)
 
 def connect_mysql(host, user, password, database):
     """Tenta conectar ao MySQL com timeout de 60s."""
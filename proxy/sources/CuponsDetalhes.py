@@ -1,41 +1,14 @@
 #!/usr/bin/env python3
-import os
 import sys
 from pathlib import Path
-import psutil
+from instance_lock import exit_if_running
 import argparse
 import json
 import mysql.connector
 import requests
 from datetime import datetime
 
-def already_running():
-    """
-    Retorna True se já existir outra instância Python rodando exatamente este script.
-    """
-    me_pid    = os.getpid()
-    me_script = str(Path(__file__).resolve())
-    me_python = sys.executable
-
-    for proc in psutil.process_iter(['pid','exe','cmdline']):
-        try:
-            pid  = proc.info['pid']
-            if pid == me_pid:
-                continue
-            exe  = proc.info.get('exe')     or ''
-            cmd  = proc.info.get('cmdline') or []
-            # Só considera processos Python com mesmo executável e mesmo script
-            if exe == me_python and len(cmd) >= 2:
-                script_path = str(Path(cmd[1]).resolve())
-                if script_path == me_script:
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-if already_running():
-    print("Script já está em execução em outro processo.")
-    sys.exit(1)
+exit_if_running("CuponsDetalhes")
 
 # ————————————————————————————————————————————————————————————
 # Parser de argumentos para debug e datas
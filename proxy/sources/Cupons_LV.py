@@ -1,10 +1,8 @@
 #!/usr/bin/env python3
-import os
-import sys
 from pathlib import Path
-import psutil
+from instance_lock import exit_if_running
 import json
-import subprocess
+from zabbix_sender import send_trap
 import requests
 import mysql.connector
 from mysql.connector import Error
@@ -13,27 +11,7 @@ from datetime import datetime, date, time
 import multiprocessing as mp
 
 
-def already_running():
-    """Retorna True se já existir outra instância Python rodando exatamente este script."""
-    me_pid = os.getpid()
-    me_script = str(Path(__file__).resolve())
-    me_python = sys.executable
-
-    for proc in psutil.process_iter(['pid', 'exe', 'cmdline']):
-        try:
-            if proc.info['pid'] == me_pid:
-                continue
-            if proc.info.get('exe') == me_python and len(proc.info.get('cmdline') or []) >= 2:
-                if str(Path(proc.info['cmdline'][1]).resolve()) == me_script:
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-
-if already_running():
-    print("Script já está em execução em outro processo.")
-    sys.exit(1)
+exit_if_running("Cupons_LV")
 
 
 def load_config(config_file):
@@ -44,17 +22,8 @@ def load_config(config_file):
 
 def send_zabbix_trap(status, message, config):
     """Envia trap para Zabbix indicando status e mensagem."""
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    cmd = [
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{config['PARAM_REDE']}-PROXY",
-        "-k", "concentrador.cupons.lote",
-        "-o", f'{{"status":"{status}","message":"{message}"}}'
-    ]
-    subprocess.run(cmd)
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{config['PARAM_REDE']}-PROXY", "concentrador.cupons.lote", value)
 
 
 def connect_mysql(host, user, password, database, timeout=60):
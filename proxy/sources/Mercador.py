@@ -1,45 +1,19 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
-import os
 import sys
 import json
-import psutil
-import requests
-import subprocess
+from instance_lock import exit_if_running
+from zabbix_sender import send_trap
 import mysql.connector
 from datetime import datetime
 from pathlib import Path
 import argparse
+import logging
 
-# —————— Função para checar outra instância em execução ——————
-def already_running():
-    """
-    Retorna True se já existir outra instância Python rodando exatamente este script.
-    """
-    me_pid    = os.getpid()
-    me_script = str(Path(__file__).resolve())
-    me_python = sys.executable
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
 
-    for proc in psutil.process_iter(['pid', 'exe', 'cmdline']):
-        try:
-            pid = proc.info['pid']
-            if pid == me_pid:
-                continue
-            exe     = proc.info.get('exe')     or ''
-            cmdline = proc.info.get('cmdline') or []
-            # só considera processos Python com mesmo executável e mesmo script
-            if exe == me_python and len(cmdline) >= 2:
-                script_path = str(Path(cmdline[1]).resolve())
-                if script_path == me_script:
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-if already_running():
-    print("Script já está em execução em outro processo.")
-    sys.exit(1)
+exit_if_running("Mercador")
 
 # —————— Parser de argumentos ——————
 parser = argparse.ArgumentParser(description="Sincroniza dados do Mercador com o BI")
@@ -77,16 +51,8 @@ else:
 
 # —————— Funções auxiliares ——————
 def send_zabbix_trap(status, message):
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    subprocess.run([
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{REDE}-PROXY",
-        "-k", "mercador.mysql.conexao",
-        "-o", json.dumps({"status": status, "message": message}, ensure_ascii=False)
-    ])
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{REDE}-PROXY", "mercador.mysql.conexao", value)
 
 def connect_mysql(host, database):
     return mysql.connector.connect(
@@ -116,57 +82,42 @@ def build_payload(row):
         "Grupo":             row[13]
     }
 
-def send_to_bi(batch):
-    url = f"https://{config['PARAM_BI_SERVER']}/mercador/batch"
-    headers = {
-        "Authorization": f"Bearer {TOKEN_BI}",
-        "Content-Type":  "application/json"
-    }
-    if args.debug:
-        print("\n=== LOTE ENVIADO ===")
-        print(json.dumps(batch, indent=2, ensure_ascii=False))
-        print("====================\n")
-    try:
-        resp = requests.post(url, json=batch, headers=headers, verify=CERT_PATH, timeout=30)
-        if resp.status_code == 200:
-            print(f"Lote enviado: {len(batch)} registros.")
-        else:
-            print(f"Erro {resp.status_code}: {resp.text}")
-    except Exception as e:
-        print(f"Falha no envio: {e}")
-
 # —————— Função principal ——————
 def main():
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format="%(message)s")
+    logger = logging.getLogger("mercador")
+
     with open(LOG_PATH, "a") as log:
-        for host in config["PARAM_IP_CONCENTRADORES"]:
+        def extract(host):
             ts = datetime.now().isoformat(sep=" ")
             log.write(f"{ts} - Conectando a {host}\n")
+            conn = connect_mysql(host, "retag")
             try:
-                conn   = connect_mysql(host, "retag")
-                cursor = conn.cursor()
-                cursor.execute(SQL_QUERY)
-                rows   = cursor.fetchall()
-                cursor.close()
+                first = True
+                for batch in extract_batches(conn, SQL_QUERY, config, build_payload, 1000):
+                    if first:
+                        send_zabbix_trap("sucesso", f"MERCADOR - Conectado em {host}")
+                        first = False
+                    yield batch
+            finally:
                 conn.close()
-            except Exception as e:
-                log.write(f"{ts} - Erro em {host}: {e}\n")
-                send_zabbix_trap("erro", f"MERCADOR - Erro MySQL em {host}")
-                continue
-
-            if not rows:
-                log.write(f"{ts} - Sem resultados em {host}\n")
-                continue
-
-            send_zabbix_trap("sucesso", f"MERCADOR - Conectado em {host}")
-
-            batch = []
-            for row in rows:
-                batch.append(build_payload(row))
-                if len(batch) >= 1000:
-                    send_to_bi(batch)
-                    batch = []
-            if batch:
-                send_to_bi(batch)
+
+        def send(host, batch):
+            uploader.send(batch)
+
+        def on_error(host, exc):
+            log.write(f"{datetime.now().isoformat(sep=' ')} - Erro em {host}: {exc}\n")
+            send_zabbix_trap("erro", f"MERCADOR - Erro MySQL em {host}")
+
+        uploader = BIUploader(config, "/mercador/batch", logger, timeout=30, debug=args.debug)
+        try:
+            results = run_concentrators(config["PARAM_IP_CONCENTRADORES"], extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
+                log.write(f"{datetime.now().isoformat(sep=' ')} - Sem resultados em {host}\n")
 
 if __name__ == "__main__":
     try:
@@ -3,6 +3,9 @@ import json
 import mysql.connector
 from mysql.connector import Error
 import csv
+from concurrent.futures import ThreadPoolExecutor
+
+from bi_pipeline import concurrency
 
 # Carregar configurações do arquivo JSON
 with open('config_bot.json', 'r') as config_file:
@@ -148,8 +151,9 @@ def process_concentrador(db_host):
 
 
 def main():
-    for db_host in CONCENTRADORES:
-        process_concentrador(db_host)
+    # Cada concentrador usa suas próprias conexões e arquivos CSV (nome inclui o IP)
+    with ThreadPoolExecutor(max_workers=concurrency(config, len(CONCENTRADORES))) as executor:
+        list(executor.map(process_concentrador, CONCENTRADORES))
 
 
 if __name__ == "__main__":
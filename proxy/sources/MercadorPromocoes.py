@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 import mysql.connector
 import json
-import requests
 import argparse
+import logging
 from datetime import datetime
 from pathlib import Path
 from decimal import Decimal, InvalidOperation
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+
 # Argumentos
 parser = argparse.ArgumentParser(description="Sincroniza promoções com o BI")
 parser.add_argument("--dtini", help="Data inicial (YYYY-MM-DD)")
@@ -60,78 +62,59 @@ def decimal_or_none(val):
     except (InvalidOperation, TypeError):
         return None
 
-def send_to_bi(lote):
-    url = f"https://{config['PARAM_BI_SERVER']}/promocoes/batch"
-    headers = {
-        "Authorization": f"Bearer {TOKEN_BI}",
-        "Content-Type": "application/json"
+def build_payload(row):
+    return {
+        "empresa_id": EMPRESA_ID,
+        "loja_codigo": row[0],
+        "CodPromocao": str(row[1]) if row[1] is not None else None,
+        "Descricao": row[2],
+        "TipoPromocao": row[3],
+        "CodGrpGatilho": str(row[4]) if row[4] is not None else None,
+        "QtdGatilho": row[5],
+        "CodGrpDesc": str(row[6]) if row[6] is not None else None,
+        "QtdDesc": row[7],
+        "PercDesc": decimal_or_none(row[8]),
+        "DataInicio": row[9].isoformat() if row[9] else None,
+        "DataFim": row[10].isoformat() if row[10] else None,
+        "DataExclusao": row[11].isoformat() if row[11] else None,
+        "Excluido": row[12],
+        "vinculadoMeioPagto": row[13],
+        "TipoDesconto": row[14],
+        "ExcluiOferta": row[15],
+        "nome_campanha": row[16],
+        "VlrDescUnit": decimal_or_none(row[17]),
+        "VlrFinalUnit": decimal_or_none(row[18]),
+        "VlrMaxTotal": decimal_or_none(row[19])
     }
 
-    if args.debug:
-        print("\n=== LOTE ENVIADO ===")
-        print(json.dumps(lote, indent=2, ensure_ascii=False))
-        print("======================\n")
-
-    try:
-        response = requests.post(url, json=lote, headers=headers, verify=CERT_PATH, timeout=30)
-        if response.status_code == 200:
-            print(f"Lote enviado com sucesso: {len(lote)} registros.")
-        else:
-            print(f"Erro {response.status_code} ao enviar lote: {response.text}")
-    except Exception as e:
-        print(f"Erro ao enviar para API: {e}")
-
 def main():
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format="%(message)s")
+    logger = logging.getLogger("mercador_promocoes")
+
     with open(LOG_PATH, 'a') as log:
-        for host in config["PARAM_IP_CONCENTRADORES"]:
+        def extract(host):
             log.write(f"{datetime.now()} - Conectando ao {host}\n")
+            conn = connect_mysql(host, "controle")
             try:
-                conn = connect_mysql(host, "controle")
-                cursor = conn.cursor()
-                cursor.execute(SQL_QUERY)
-                rows = cursor.fetchall()
-                cursor.close()
+                yield from extract_batches(conn, SQL_QUERY, config, build_payload, 500)
+            finally:
                 conn.close()
-            except Exception as e:
-                log.write(f"Erro no host {host}: {e}\n")
-                continue
 
-            if not rows:
+        def send(host, batch):
+            uploader.send(batch)
+
+        def on_error(host, exc):
+            log.write(f"Erro no host {host}: {exc}\n")
+
+        uploader = BIUploader(config, "/promocoes/batch", logger, timeout=30, debug=args.debug)
+        try:
+            results = run_concentrators(config["PARAM_IP_CONCENTRADORES"], extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
                 log.write(f"{datetime.now()} - Nenhum dado retornado de {host}\n")
-                continue
-
-            batch_size = 500
-            batch = []
-            for row in rows:
-                item = {
-                    "empresa_id": EMPRESA_ID,
-                    "loja_codigo": row[0],
-                    "CodPromocao": str(row[1]) if row[1] is not None else None,
-                    "Descricao": row[2],
-                    "TipoPromocao": row[3],
-                    "CodGrpGatilho": str(row[4]) if row[4] is not None else None,
-                    "QtdGatilho": row[5],
-                    "CodGrpDesc": str(row[6]) if row[6] is not None else None,
-                    "QtdDesc": row[7],
-                    "PercDesc": decimal_or_none(row[8]),
-                    "DataInicio": row[9].isoformat() if row[9] else None,
-                    "DataFim": row[10].isoformat() if row[10] else None,
-                    "DataExclusao": row[11].isoformat() if row[11] else None,
-                    "Excluido": row[12],
-                    "vinculadoMeioPagto": row[13],
-                    "TipoDesconto": row[14],
-                    "ExcluiOferta": row[15],
-                    "nome_campanha": row[16],
-                    "VlrDescUnit": decimal_or_none(row[17]),
-                    "VlrFinalUnit": decimal_or_none(row[18]),
-                    "VlrMaxTotal": decimal_or_none(row[19])
-                }
-                batch.append(item)
-                if len(batch) >= batch_size:
-                    send_to_bi(batch)
-                    batch = []
-            if batch:
-                send_to_bi(batch)
 
 if __name__ == "__main__":
     main()
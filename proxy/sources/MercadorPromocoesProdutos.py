@@ -1,48 +1,22 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
-import os
-import sys
 from pathlib import Path
-import psutil
+from instance_lock import exit_if_running
 
-def already_running():
-    """
-    Retorna True se já existir outra instância Python rodando exatamente este script.
-    """
-    me_pid    = os.getpid()
-    me_script = str(Path(__file__).resolve())
-    me_python = sys.executable
-
-    for proc in psutil.process_iter(['pid', 'exe', 'cmdline']):
-        try:
-            pid = proc.info['pid']
-            if pid == me_pid:
-                continue
-            exe     = proc.info.get('exe')     or ''
-            cmdline = proc.info.get('cmdline') or []
-            # só considera processos Python com mesmo executável e mesmo script
-            if exe == me_python and len(cmdline) >= 2:
-                script_path = str(Path(cmdline[1]).resolve())
-                if script_path == me_script:
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-if already_running():
-    print("Script já está em execução em outro processo.")
-    sys.exit(1)
+exit_if_running("MercadorPromocoesProdutos")
 
 # —————— Imports e parser de argumentos ——————
 import json
-import requests
-import subprocess
+from zabbix_sender import send_trap
 import mysql.connector
 import argparse
+import logging
 from datetime import datetime
 from pathlib import Path
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+
 parser = argparse.ArgumentParser(description="Sincroniza promoções de produtos com o BI")
 parser.add_argument("--debug", "-d", action="store_true", help="Modo depuração")
 args = parser.parse_args()
@@ -66,16 +40,8 @@ LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 # —————— Funções auxiliares ——————
 def send_zabbix_trap(status, message):
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    subprocess.run([
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{REDE}-PROXY",
-        "-k", "promocao.mysql.conexao",
-        "-o", json.dumps({"status": status, "message": message}, ensure_ascii=False)
-    ])
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{REDE}-PROXY", "promocao.mysql.conexao", value)
 
 def connect_mysql(host, database):
     return mysql.connector.connect(
@@ -86,66 +52,57 @@ def connect_mysql(host, database):
         connect_timeout=15
     )
 
-def send_to_bi(batch):
-    url = f"https://{BI_SERVER}/promocoes/produtos/batch"
-    headers = {
-        "Authorization": f"Bearer {TOKEN_BI}",
-        "Content-Type": "application/json"
+# --- Função principal ---------------------------------------------------
+SQL_QUERY = (
+    "SELECT nroloja, codigoean, CodGrpMerc "
+    "FROM promocaodesconto_grupo"
+)
+
+def build_payload(row):
+    loja, ean, codgrp = row
+    return {
+        "empresa_id":  EMPRESA_ID,
+        "loja_codigo": loja,
+        "codigoean":   str(ean),
+        "CodGrpMerc":  str(codgrp)
     }
-    if debug:
-        print("\n=== LOTE ENVIADO ===")
-        print(json.dumps(batch, indent=2, ensure_ascii=False))
-        print("=====================\n")
-    try:
-        resp = requests.post(url, json=batch, headers=headers, verify=CERT_PATH, timeout=30)
-        if resp.status_code == 200:
-            print(f"Lote enviado com sucesso: {len(batch)} registros.")
-        else:
-            print(f"Erro {resp.status_code} ao enviar lote: {resp.text}")
-    except Exception as e:
-        print(f"Erro ao enviar para API: {e}")
 
-# --- Função principal ---------------------------------------------------
 def main():
+    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO, format="%(message)s")
+    logger = logging.getLogger("mercador_promocoes_produtos")
+
     with open(LOG_PATH, 'a') as log:
-        for host in hosts:
+        def extract(host):
             ts = datetime.now().isoformat(sep=" ")
             log.write(f"{ts} - Conectando ao {host}\n")
+            conn = connect_mysql(host, "controle")
             try:
-                conn   = connect_mysql(host, "controle")
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT nroloja, codigoean, CodGrpMerc "
-                    "FROM promocaodesconto_grupo"
-                )
-                rows   = cursor.fetchall()
-                cursor.close()
+                first = True
+                for batch in extract_batches(conn, SQL_QUERY, config, build_payload, 500):
+                    if first:
+                        send_zabbix_trap("sucesso", f"PROMOCAO - Coleta OK {host}")
+                        first = False
+                    yield batch
+            finally:
                 conn.close()
-            except Exception as e:
-                log.write(f"{ts} - Erro ao consultar {host}: {e}\n")
-                send_zabbix_trap("erro", f"PROMOCAO - Erro MySQL em {host}")
-                continue
-
-            if not rows:
-                log.write(f"{ts} - Nenhum dado retornado de {host}\n")
-                continue
-
-            send_zabbix_trap("sucesso", f"PROMOCAO - Coleta OK {host}")
-
-            batch_size = 500
-            batch = []
-            for loja, ean, codgrp in rows:
-                batch.append({
-                    "empresa_id":  EMPRESA_ID,
-                    "loja_codigo": loja,
-                    "codigoean":   str(ean),
-                    "CodGrpMerc":  str(codgrp)
-                })
-                if len(batch) >= batch_size:
-                    send_to_bi(batch)
-                    batch = []
-            if batch:
-                send_to_bi(batch)
+
+        def send(host, batch):
+            uploader.send(batch)
+
+        def on_error(host, exc):
+            ts = datetime.now().isoformat(sep=" ")
+            log.write(f"{ts} - Erro ao consultar {host}: {exc}\n")
+            send_zabbix_trap("erro", f"PROMOCAO - Erro MySQL em {host}")
+
+        uploader = BIUploader(config, "/promocoes/produtos/batch", logger, timeout=30, debug=debug)
+        try:
+            results = run_concentrators(hosts, extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
+                log.write(f"{datetime.now().isoformat(sep=' ')} - Nenhum dado retornado de {host}\n")
 
 if __name__ == "__main__":
     main()
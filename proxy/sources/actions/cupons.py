@@ -4,27 +4,22 @@ Ação local para envio de cupons NFC-e para a API do BI.
 Baseada no script standalone Cupons.py.
 """
 import json
-import subprocess
-import requests
 import mysql.connector
 from datetime import datetime
 from pathlib import Path
 import logging
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+from bi_watermark import WatermarkTracker, get_store, lag_seconds
+from zabbix_sender import send_trap
+
+WATERMARK_STREAM = "cupons"
+
 
 def send_zabbix_trap(status, message, config):
     """Envia trap para Zabbix indicando status e mensagem."""
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    cmd = [
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{config['PARAM_REDE']}-PROXY",
-        "-k", "concentrador.mysql.conexao",
-        "-o", f'{{"status":"{status}", "message":"{message}"}}'
-    ]
-    subprocess.run(cmd)
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{config['PARAM_REDE']}-PROXY", "concentrador.mysql.conexao", value)
 
 
 def connect_mysql(host, user, password, database):
@@ -41,31 +36,60 @@ def connect_mysql(host, user, password, database):
         return str(e)
 
 
-def enviar_lote(batch, config, logger: logging.Logger, debug=False):
-    url = f"https://{config['PARAM_BI_SERVER']}/cupons/batch"
-    token = config["PARAM_TOKEN_BI"]
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
+def row_to_item(row, rede):
+    modelo = row[5][20:22] if len(row[5]) >= 22 else "0"
+    return {
+        "rede":       rede,
+        "nroloja":    row[0],
+        "DataProc":   row[1].isoformat(),
+        "Pdv":        int(row[2]),
+        "Chave":      row[5],
+        "modelo":     int(modelo),
+        "emServidor": 1,
+        "nCupom":     row[3],
+        "vICMS":      float(row[6]),
+        "vICMS_ST":   float(row[7]),
+        "vPIS":       float(row[8]),
+        "vPIS_ST":    float(row[9]),
+        "vCOFINS":    float(row[10]),
+        "vCOFINS_ST": float(row[11]),
+        "vFCP":       float(row[12]),
+        "vFCP_ST":    float(row[13]),
+        "LV":         row[14],
+        "estornado":  int(row[4]),
+        "dEmi":       row[1].isoformat(),
+        "Status":     str(row[15]) if row[15] is not None else ""
     }
-    try:
-        r = requests.post(
-            url,
-            headers=headers,
-            json=batch,
-            timeout=90,
-            verify=config["PARAM_BI_CERTI_PATH"]
-        )
-        if r.status_code == 200:
-            logger.info(f"Lote enviado: {len(batch)} registros.")
-        else:
-            logger.error(f"Erro {r.status_code} ao enviar lote: {r.text}")
-            if debug:
-                logger.debug(f"Payload enviado: {json.dumps(batch, ensure_ascii=False)[:2000]}")
-    except requests.Timeout:
-        logger.error("Envio de lote excedeu o timeout de 90s.")
-    except Exception as e:
-        logger.error(f"Falha ao enviar lote: {e}")
+
+
+def row_mark(row):
+    # (dthr_emit_nfe, [chave_nfe]); chave_nfe desempata cupons no mesmo segundo
+    return row[1], [row[5]]
+
+
+def build_incremental_sql(filtro_nroloja, mark, lag):
+    """
+    Linhas após a marca (dthr_emit_nfe, chave_nfe), até NOW() - lag, em ordem
+    de marca. Sem marca (primeira execução), parte da janela de 10 minutos.
+    """
+    params = []
+    if mark:
+        ts, key = mark
+        after = "(dthr_emit_nfe > %s OR (dthr_emit_nfe = %s AND chave_nfe > %s))"
+        params = [ts, ts, key[0]]
+    else:
+        after = "dthr_emit_nfe >= DATE_SUB(NOW(), INTERVAL 10 MINUTE)"
+    sql = f"""
+        SELECT nroloja, dthr_emit_nfe, Pdv, NroCupom, estornado,
+               chave_nfe, vICMS, vICMS_ST, vPIS, vPIS_ST,
+               vCOFINS, vCOFINS_ST, vFCP, vFCP_ST, LV, Status
+        FROM nfce
+        WHERE {after}
+          AND dthr_emit_nfe <= DATE_SUB(NOW(), INTERVAL {int(lag)} SECOND)
+          AND chave_nfe != ''{filtro_nroloja}
+        ORDER BY dthr_emit_nfe, chave_nfe
+    """
+    return sql, params
 
 
 def run_local(config: dict, logger: logging.Logger, args):
@@ -105,10 +129,18 @@ def run_local(config: dict, logger: logging.Logger, args):
               AND chave_nfe != ''{filtro_nroloja};
         """
 
+    rede = config["PARAM_REDE"]
+    batch_size = 200
+
+    # Execução do cron (sem --dtini/--dtfim) é incremental pela marca d'água;
+    # reprocessamentos manuais não leem nem movem a marca.
+    store = get_store(config) if not args.dtini and not args.dtfim else None
+    lag = lag_seconds(config)
+    trackers = {}
+
     with open(log_file, "a") as log:
-        for db_host in config.get("PARAM_IP_CONCENTRADORES", []):
-            ts = datetime.now().isoformat()
-            msg = f"{ts} - Conectando ao IP {db_host}"
+        def extract(db_host):
+            msg = f"{datetime.now().isoformat()} - Conectando ao IP {db_host}"
             logger.info(msg)
             log.write(msg + "\n")
 
@@ -119,73 +151,59 @@ def run_local(config: dict, logger: logging.Logger, args):
                 "retag"
             )
             if isinstance(conn, str):
-                err = f"{datetime.now().isoformat()} - Erro conexão {db_host}: {conn}"
-                logger.error(err)
-                log.write(err + "\n")
-                send_zabbix_trap("erro", f"NFCE - Erro MySQL em {db_host}", config)
-                continue
+                raise ConnectionError(conn)
+
+            sql, params, mark_fn = sql_query, None, None
+            if store is not None:
+                sql, params = build_incremental_sql(filtro_nroloja, store.get(WATERMARK_STREAM, db_host), lag)
+                mark_fn = row_mark
+                trackers[db_host] = WatermarkTracker(
+                    store, WATERMARK_STREAM, db_host, logger, config=config,
+                    alert=lambda msg: send_zabbix_trap("erro", f"NFCE - {msg}", config),
+                )
 
             try:
-                cursor = conn.cursor()
-                cursor.execute(sql_query)
-                results = cursor.fetchall()
-            except Exception as e:
-                err = f"{datetime.now().isoformat()} - Erro consulta em {db_host}: {e}"
-                logger.error(err)
-                log.write(err + "\n")
-                send_zabbix_trap("erro", f"NFCE - Falha consulta {db_host}", config)
-                continue
+                first = True
+                for batch in extract_batches(conn, sql, config, lambda row: row_to_item(row, rede), batch_size,
+                                             params=params, row_mark=mark_fn):
+                    if first:
+                        send_zabbix_trap("sucesso", f"NFCE - Conectado ao MySQL {db_host}", config)
+                        first = False
+                    if db_host in trackers:
+                        trackers[db_host].register(batch)
+                    yield batch
             finally:
-                cursor.close()
                 conn.close()
 
-            if not results:
+        def send(db_host, batch):
+            msg = f"{datetime.now().isoformat()} - Enviado lote de {len(batch)} registros para {db_host}"
+            logger.info(msg)
+            log.write(msg + "\n")
+            ok = uploader.send(batch)
+            if db_host in trackers:
+                trackers[db_host].ack(batch, ok)
+
+        def on_error(db_host, exc):
+            if isinstance(exc, ConnectionError):
+                err = f"{datetime.now().isoformat()} - Erro conexão {db_host}: {exc}"
+                trap = f"NFCE - Erro MySQL em {db_host}"
+            else:
+                err = f"{datetime.now().isoformat()} - Erro consulta em {db_host}: {exc}"
+                trap = f"NFCE - Falha consulta {db_host}"
+            logger.error(err)
+            log.write(err + "\n")
+            send_zabbix_trap("erro", trap, config)
+
+        uploader = BIUploader(config, "/cupons/batch", logger, timeout=90, debug=args.debug)
+        try:
+            results = run_concentrators(config.get("PARAM_IP_CONCENTRADORES", []), extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for db_host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
                 nres = f"{datetime.now().isoformat()} - Nenhum resultado em {db_host}"
                 logger.info(nres)
                 log.write(nres + "\n")
-                continue
-
-            send_zabbix_trap("sucesso", f"NFCE - Conectado ao MySQL {db_host}", config)
-
-            batch_size = 200
-            batch = []
-            for row in results:
-                modelo = row[5][20:22] if len(row[5]) >= 22 else "0"
-                item = {
-                    "rede":       config["PARAM_REDE"],
-                    "nroloja":    row[0],
-                    "DataProc":   row[1].isoformat(),
-                    "Pdv":        int(row[2]),
-                    "Chave":      row[5],
-                    "modelo":     int(modelo),
-                    "emServidor": 1,
-                    "nCupom":     row[3],
-                    "vICMS":      float(row[6]),
-                    "vICMS_ST":   float(row[7]),
-                    "vPIS":       float(row[8]),
-                    "vPIS_ST":    float(row[9]),
-                    "vCOFINS":    float(row[10]),
-                    "vCOFINS_ST": float(row[11]),
-                    "vFCP":       float(row[12]),
-                    "vFCP_ST":    float(row[13]),
-                    "LV":         row[14],
-                    "estornado":  int(row[4]),
-                    "dEmi":       row[1].isoformat(),
-                    "Status":     str(row[15]) if row[15] is not None else ""
-                }
-                batch.append(item)
-
-                if len(batch) >= batch_size:
-                    msg = f"{datetime.now().isoformat()} - Enviado lote de {len(batch)} registros para {db_host}"
-                    logger.info(msg)
-                    log.write(msg + "\n")
-                    enviar_lote(batch, config, logger, debug=args.debug)
-                    batch = []
-
-            if batch:
-                msg = f"{datetime.now().isoformat()} - Enviado lote de {len(batch)} registros para {db_host}"
-                logger.info(msg)
-                log.write(msg + "\n")
-                enviar_lote(batch, config, logger, debug=args.debug)
 
     logger.info("Envio de cupons concluído.")
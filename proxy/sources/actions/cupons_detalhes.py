@@ -3,13 +3,13 @@
 Ação local para sincronizar cupons detalhados com o BI.
 Baseada no script standalone CuponsDetalhes.py.
 """
-import json
 import mysql.connector
-import requests
 from datetime import datetime
 from pathlib import Path
 import logging
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+
 
 def connect_mysql(host, user, password, database):
     return mysql.connector.connect(
@@ -21,24 +21,6 @@ def connect_mysql(host, user, password, database):
     )
 
 
-def send_to_bi(batch, config, debug, logger: logging.Logger):
-    url = f"https://{config['PARAM_BI_SERVER']}/cupons/detalhes"
-    headers = {
-        "Authorization": f"Bearer {config['PARAM_TOKEN_BI']}",
-        "Content-Type": "application/json"
-    }
-    if debug:
-        logger.debug("Lote enviado (debug): %s", json.dumps(batch, indent=2, ensure_ascii=False))
-    try:
-        r = requests.post(url, json=batch, headers=headers, verify=config["PARAM_BI_CERTI_PATH"], timeout=30)
-        if r.status_code == 200:
-            logger.info(f"Lote enviado com sucesso: {len(batch)} registros.")
-        else:
-            logger.error(f"Erro {r.status_code} ao enviar lote: {r.text}")
-    except Exception as e:
-        logger.error(f"Erro ao enviar para API: {e}")
-
-
 def build_sql(args):
     sql_base = """
     SELECT DataProc, nroloja, NroCupom, Pdv, HoraMinSeg, NroItens, FlagEstorno, LV,
@@ -59,6 +41,24 @@ def build_sql(args):
     )
 
 
+def row_to_item(row, rede):
+    return {
+        "rede":        rede,
+        "DataProc":    row[0].isoformat(),
+        "nroloja":     row[1],
+        "NroCupom":    row[2],
+        "Pdv":         row[3],
+        "HoraMinSeg":  row[4].isoformat() if row[4] else None,
+        "NroItens":    row[5],
+        "FlagEstorno": row[6],
+        "LV":          row[7],
+        "tipooperacao": row[8],
+        "total":       float(row[9]),
+        "FlagInicupom": row[10],
+        "FlagFimCupom": row[11],
+    }
+
+
 def run_local(config: dict, logger: logging.Logger, args):
     debug = bool(getattr(args, "debug", False))
     hosts = config.get("PARAM_IP_CONCENTRADORES", [])
@@ -66,54 +66,39 @@ def run_local(config: dict, logger: logging.Logger, args):
     log_path.parent.mkdir(parents=True, exist_ok=True)
 
     sql_query = build_sql(args)
+    rede = config["PARAM_REDE"]
+    batch_size = 500
 
     with open(log_path, "a") as log:
-        for host in hosts:
+        def on_item_error(row, exc):
+            log.write(f"{datetime.now()} - Erro ao processar item: {exc}\n")
+            logger.error(f"Erro ao processar item: {exc}")
+
+        def extract(host):
             log.write(f"{datetime.now()} - Conectando ao {host}\n")
+            conn = connect_mysql(host, config["DB_USER"], config["DB_PASS"], "retag")
             try:
-                conn = connect_mysql(host, config["DB_USER"], config["DB_PASS"], "retag")
-                cursor = conn.cursor()
-                cursor.execute(sql_query)
-                rows = cursor.fetchall()
-                cursor.close()
+                yield from extract_batches(conn, sql_query, config, lambda row: row_to_item(row, rede),
+                                           batch_size, on_error=on_item_error)
+            finally:
                 conn.close()
-            except Exception as e:
-                log.write(f"{datetime.now()} - Erro no host {host}: {e}\n")
-                logger.error(f"Erro no host {host}: {e}")
-                continue
 
-            if not rows:
+        def send(host, batch):
+            uploader.send(batch)
+
+        def on_error(host, exc):
+            log.write(f"{datetime.now()} - Erro no host {host}: {exc}\n")
+            logger.error(f"Erro no host {host}: {exc}")
+
+        uploader = BIUploader(config, "/cupons/detalhes", logger, timeout=30, debug=debug)
+        try:
+            results = run_concentrators(hosts, extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
                 log.write(f"{datetime.now()} - Nenhum dado retornado de {host}\n")
                 logger.info(f"Nenhum dado retornado de {host}")
-                continue
-
-            batch = []
-            batch_size = 500
-            for row in rows:
-                try:
-                    item = {
-                        "rede":        config["PARAM_REDE"],
-                        "DataProc":    row[0].isoformat(),
-                        "nroloja":     row[1],
-                        "NroCupom":    row[2],
-                        "Pdv":         row[3],
-                        "HoraMinSeg":  row[4].isoformat() if row[4] else None,
-                        "NroItens":    row[5],
-                        "FlagEstorno": row[6],
-                        "LV":          row[7],
-                        "tipooperacao": row[8],
-                        "total":       float(row[9]),
-                        "FlagInicupom": row[10],
-                        "FlagFimCupom": row[11],
-                    }
-                    batch.append(item)
-                    if len(batch) >= batch_size:
-                        send_to_bi(batch, config, debug, logger)
-                        batch = []
-                except Exception as e:
-                    log.write(f"{datetime.now()} - Erro ao processar item: {e}\n")
-                    logger.error(f"Erro ao processar item: {e}")
-            if batch:
-                send_to_bi(batch, config, debug, logger)
 
     logger.info("Sincronização de cupons detalhados finalizada.")
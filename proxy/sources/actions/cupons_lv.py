@@ -4,29 +4,30 @@ Ação local para coleta de cupons LV e envio ao BI.
 Baseada no script standalone Cupons_LV.py.
 """
 import json
-import subprocess
-import requests
 import mysql.connector
 from mysql.connector import Error
 from datetime import datetime, date, time
 from pathlib import Path
-import multiprocessing as mp
 import logging
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+from bi_watermark import WatermarkTracker, get_store, lag_seconds
+from zabbix_sender import send_trap
+
+WATERMARK_STREAM = "cupons_lv"
+SQL_BASE = """
+    SELECT
+      DataProc, nroloja, NroCupom, Pdv, HoraMinSeg, NroItens, FlagEstorno, LV, tipooperacao
+    FROM cupom
+    WHERE LV IN (0,1)
+      AND tipooperacao IN (1,2,4,8)
+"""
+
 
 def send_zabbix_trap(status, message, config):
     """Envia trap para Zabbix indicando status e mensagem."""
-    zbx_sender_server = config.get("PARAM_ZABBIX_SENDER_SERVER", "127.0.0.1")
-    zbx_sender_port = str(config.get("PARAM_ZABBIX_SENDER_PORT", "10051"))
-    cmd = [
-        "zabbix_sender",
-        "-z", zbx_sender_server,
-        "-p", zbx_sender_port,
-        "-s", f"{config['PARAM_REDE']}-PROXY",
-        "-k", "concentrador.cupons.lote",
-        "-o", f'{{"status":"{status}","message":"{message}"}}'
-    ]
-    subprocess.run(cmd)
+    value = json.dumps({"status": status, "message": message}, ensure_ascii=False)
+    send_trap(config, f"{config['PARAM_REDE']}-PROXY", "concentrador.cupons.lote", value)
 
 
 def connect_mysql(host, user, password, database, timeout=60):
@@ -43,39 +44,6 @@ def connect_mysql(host, user, password, database, timeout=60):
         return str(e)
 
 
-def enviar_lote_em_subprocesso(batch, config):
-    """Envia lote via subprocesso para não bloquear execução principal."""
-    url = f"https://{config['PARAM_BI_SERVER']}/cupons/detalhes"
-    headers = {
-        "Authorization": f"Bearer {config['PARAM_TOKEN_BI']}",
-        "Content-Type": "application/json"
-    }
-    try:
-        r = requests.post(
-            url,
-            headers=headers,
-            json=batch,
-            timeout=30,
-            verify=config["PARAM_BI_CERTI_PATH"]
-        )
-        if r.status_code == 200:
-            print(f"Lote enviado: {len(batch)} registros.")
-        else:
-            print(f"Erro {r.status_code} ao enviar lote: {r.text}")
-    except Exception as e:
-        print(f"Falha ao enviar lote: {e}")
-
-
-def enviar_lote(batch, config, logger: logging.Logger):
-    """Wrapper para enviar lote em processo separado com timeout de 90s."""
-    proc = mp.Process(target=enviar_lote_em_subprocesso, args=(batch, config))
-    proc.start()
-    proc.join(timeout=90)
-    if proc.is_alive():
-        proc.terminate()
-        logger.warning("Subprocesso de envio finalizado por timeout.")
-
-
 def build_date_filter(args):
     if not args.dtini and not args.dtfim:
         return "HoraMinSeg >= DATE_SUB(NOW(), INTERVAL 10 MINUTE)"
@@ -84,6 +52,46 @@ def build_date_filter(args):
     return f"HoraMinSeg BETWEEN '{args.dtini}' AND '{args.dtfim}'"
 
 
+def build_incremental_filter(mark, lag):
+    """
+    Filtro após a marca (HoraMinSeg, nroloja, Pdv, NroCupom), até NOW() - lag.
+    Sem marca (primeira execução), parte da janela de 10 minutos.
+    """
+    params = []
+    if mark:
+        ts, key = mark
+        after = "(HoraMinSeg > %s OR (HoraMinSeg = %s AND (nroloja, Pdv, NroCupom) > (%s, %s, %s)))"
+        params = [ts, ts, *key]
+    else:
+        after = "HoraMinSeg >= DATE_SUB(NOW(), INTERVAL 10 MINUTE)"
+    return f"{after} AND HoraMinSeg <= DATE_SUB(NOW(), INTERVAL {int(lag)} SECOND)", params
+
+
+def row_mark(row):
+    return row["HoraMinSeg"], [row["nroloja"], row["Pdv"], row["NroCupom"]]
+
+
+def row_to_item(row, rede):
+    hora_value = row["HoraMinSeg"]
+    hora_str = (
+        hora_value.isoformat()
+        if isinstance(hora_value, (datetime, date, time))
+        else str(hora_value)
+    )
+    return {
+        "rede": rede,
+        "DataProc": row["DataProc"].isoformat(),
+        "nroloja": int(row["nroloja"]),
+        "NroCupom": str(row["NroCupom"]),
+        "Pdv": int(row["Pdv"]),
+        "HoraMinSeg": hora_str,
+        "NroItens": int(row["NroItens"]),
+        "FlagEstorno": int(row["FlagEstorno"]),
+        "LV": int(row["LV"]),
+        "tipooperacao": int(row["tipooperacao"])
+    }
+
+
 def run_local(config: dict, logger: logging.Logger, args):
     base_dir = Path(config.get("PARAM_BASE_DIR", "/ariusmonitor"))
     log_dir = base_dir / "logs"
@@ -94,73 +102,70 @@ def run_local(config: dict, logger: logging.Logger, args):
         # logger already configured by main; keep it but ensure level honors debug flag
         logger.setLevel(logging.DEBUG if getattr(args, "debug", False) else logging.INFO)
 
-    date_filter = build_date_filter(args)
-    sql_query = f"""
-        SELECT
-          DataProc, nroloja, NroCupom, Pdv, HoraMinSeg, NroItens, FlagEstorno, LV, tipooperacao
-        FROM cupom
-        WHERE LV IN (0,1)
-          AND tipooperacao IN (1,2,4,8)
-          AND {date_filter}
-    """
+    sql_query = f"{SQL_BASE}  AND {build_date_filter(args)}"
+
+    rede = config["PARAM_REDE"]
+    batch_size = 200
 
-    for db_host in config.get("PARAM_IP_CONCENTRADORES", []):
+    # Execução do cron é incremental pela marca d'água; --dtini/--dtfim não a usam.
+    store = get_store(config) if not args.dtini and not args.dtfim else None
+    lag = lag_seconds(config)
+    trackers = {}
+
+    def extract(db_host):
         ts = datetime.now().isoformat()
         logger.info(f"{ts} - Coletando cupons do concentrador {db_host}")
 
         conn = connect_mysql(db_host, config["DB_USER"], config["DB_PASS"], "retag")
         if isinstance(conn, str):
-            logger.error(f"Erro conexão {db_host}: {conn}")
-            send_zabbix_trap("erro", f"Cupons LV - Erro MySQL {db_host}", config)
-            continue
+            raise ConnectionError(conn)
+
+        sql, params, mark_fn = sql_query, None, None
+        if store is not None:
+            date_filter, params = build_incremental_filter(store.get(WATERMARK_STREAM, db_host), lag)
+            sql = f"{SQL_BASE}  AND {date_filter}\n    ORDER BY HoraMinSeg, nroloja, Pdv, NroCupom"
+            mark_fn = row_mark
+            trackers[db_host] = WatermarkTracker(
+                store, WATERMARK_STREAM, db_host, logger, config=config,
+                alert=lambda msg: send_zabbix_trap("erro", f"Cupons LV - {msg}", config),
+            )
 
-        cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(sql_query)
-            results = cursor.fetchall()
-        except Exception as e:
-            logger.error(f"Erro consulta {db_host}: {e}")
-            send_zabbix_trap("erro", f"Cupons LV - Falha consulta {db_host}", config)
-            continue
+            first = True
+            for batch in extract_batches(conn, sql, config, lambda row: row_to_item(row, rede),
+                                         batch_size, dictionary=True, params=params, row_mark=mark_fn):
+                if first:
+                    send_zabbix_trap("sucesso", f"Cupons LV - Dados coletados de {db_host}", config)
+                    first = False
+                if db_host in trackers:
+                    trackers[db_host].register(batch)
+                yield batch
         finally:
-            cursor.close()
             conn.close()
 
-        if not results:
+    def send(db_host, batch):
+        logger.info(f"Enviando lote de {len(batch)} registros de {db_host}...")
+        ok = uploader.send(batch)
+        if db_host in trackers:
+            trackers[db_host].ack(batch, ok)
+
+    def on_error(db_host, exc):
+        if isinstance(exc, ConnectionError):
+            logger.error(f"Erro conexão {db_host}: {exc}")
+            send_zabbix_trap("erro", f"Cupons LV - Erro MySQL {db_host}", config)
+        else:
+            logger.error(f"Erro consulta {db_host}: {exc}")
+            send_zabbix_trap("erro", f"Cupons LV - Falha consulta {db_host}", config)
+
+    # Timeout total por lote (antes garantido por um multiprocessing.Process por lote)
+    uploader = BIUploader(config, "/cupons/detalhes", logger, timeout=90, debug=getattr(args, "debug", False))
+    try:
+        results = run_concentrators(config.get("PARAM_IP_CONCENTRADORES", []), extract, send, config, logger, on_error)
+    finally:
+        uploader.close()
+
+    for db_host, result in results.items():
+        if not result["error"] and result["rows"] == 0:
             logger.info(f"Nenhum cupom encontrado em {db_host}.")
-            continue
-
-        send_zabbix_trap("sucesso", f"Cupons LV - Dados coletados de {db_host}", config)
-
-        batch_size = 200
-        batch = []
-        for row in results:
-            hora_value = row["HoraMinSeg"]
-            hora_str = (
-                hora_value.isoformat()
-                if isinstance(hora_value, (datetime, date, time))
-                else str(hora_value)
-            )
-            item = {
-                "rede": config["PARAM_REDE"],
-                "DataProc": row["DataProc"].isoformat(),
-                "nroloja": int(row["nroloja"]),
-                "NroCupom": str(row["NroCupom"]),
-                "Pdv": int(row["Pdv"]),
-                "HoraMinSeg": hora_str,
-                "NroItens": int(row["NroItens"]),
-                "FlagEstorno": int(row["FlagEstorno"]),
-                "LV": int(row["LV"]),
-                "tipooperacao": int(row["tipooperacao"])
-            }
-            batch.append(item)
-            if len(batch) >= batch_size:
-                logger.info(f"Enviando lote de {len(batch)} registros de {db_host}...")
-                enviar_lote(batch, config, logger)
-                batch.clear()
-
-        if batch:
-            logger.info(f"Enviando lote remanescente de {len(batch)} registros de {db_host}...")
-            enviar_lote(batch, config, logger)
 
     logger.info("Processo de cupons LV concluído com sucesso.")
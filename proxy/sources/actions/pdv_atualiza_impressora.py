@@ -9,10 +9,12 @@ import requests
 import logging
 import urllib3
 
+from zabbix_client import get_client
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-def get_zabbix_group_id(session, api_url, group_name, logger: logging.Logger):
+def get_zabbix_group_id(client, group_name, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "hostgroup.get",
@@ -21,9 +23,7 @@ def get_zabbix_group_id(session, api_url, group_name, logger: logging.Logger):
     }
     logger.info(f"Buscando ID do grupo '{group_name}' no Zabbix...")
     try:
-        response = session.post(api_url, json=payload, timeout=15)
-        response.raise_for_status()
-        data = response.json()
+        data = client.call(payload["method"], payload["params"], use_cache=False, timeout=15)
         if "error" in data:
             logger.error(f"API Zabbix retornou um erro ao buscar grupo: {data['error']}")
             return None
@@ -39,7 +39,7 @@ def get_zabbix_group_id(session, api_url, group_name, logger: logging.Logger):
         return None
 
 
-def get_hosts_data_map(session, api_url, groupid, logger: logging.Logger):
+def get_hosts_data_map(client, groupid, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "host.get",
@@ -52,9 +52,7 @@ def get_hosts_data_map(session, api_url, groupid, logger: logging.Logger):
     }
     logger.info("Mapeando hosts existentes e suas macros no Zabbix...")
     try:
-        response = session.post(api_url, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        data = client.call(payload["method"], payload["params"], use_cache=False, timeout=30)
         if "error" in data:
             logger.error(f"API Zabbix retornou um erro ao buscar hosts: {data['error']}")
             return {}
@@ -105,7 +103,7 @@ def get_printer_data(ip_concentrador, usuario, senha, nome_db, logger: logging.L
         return []
 
 
-def update_zabbix_macros(session, api_url, hostid, hostname, macros, logger: logging.Logger):
+def update_zabbix_macros(client, hostid, hostname, macros, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "host.update",
@@ -114,9 +112,7 @@ def update_zabbix_macros(session, api_url, hostid, hostname, macros, logger: log
     }
     logger.info(f"Atualizando macros para o host '{hostname}' (ID: {hostid})...")
     try:
-        response = session.post(api_url, json=payload, timeout=15)
-        response.raise_for_status()
-        resposta = response.json()
+        resposta = client.call(payload["method"], payload["params"], use_cache=False, timeout=15)
         if "error" in resposta:
             logger.error(f"Erro ao atualizar host '{hostname}': {resposta['error']}")
         else:
@@ -138,20 +134,14 @@ def _extract_loja_from_arg(loja_arg: str):
 
 
 def run_local(config: dict, logger: logging.Logger, args):
-    api_url = f"https://{config['PARAM_ZABBIX_SERVER']}/api_jsonrpc.php"
-    session = requests.Session()
-    session.verify = False
-    session.headers.update({
-        "Content-Type": "application/json-rpc",
-        "Authorization": f"Bearer {config['PARAM_TOKEN']}"
-    })
-
-    group_id = get_zabbix_group_id(session, api_url, config["PARAM_REDE"], logger)
+    client = get_client(config)
+
+    group_id = get_zabbix_group_id(client, config["PARAM_REDE"], logger)
     if not group_id:
         logger.critical("Não foi possível obter o ID do grupo. Abortando execução.")
         return
 
-    zabbix_hosts_data = get_hosts_data_map(session, api_url, group_id, logger)
+    zabbix_hosts_data = get_hosts_data_map(client, group_id, logger)
     if not zabbix_hosts_data:
         logger.warning("Nenhum host encontrado no Zabbix. Nenhuma macro será atualizada.")
 
@@ -235,7 +225,7 @@ def run_local(config: dict, logger: logging.Logger, args):
                 if getattr(args, "dry_run", False):
                     logger.info(f"[DRY-RUN] Host: {hostname} | ID: {hostid} | Macros: {macros_finais}")
                 else:
-                    update_zabbix_macros(session, api_url, hostid, hostname, macros_finais, logger)
+                    update_zabbix_macros(client, hostid, hostname, macros_finais, logger)
             else:
                 logger.warning(f"Host '{hostname}' (do concentrador {ip_conc}) não foi encontrado no Zabbix.")
 
@@ -9,6 +9,8 @@ import logging
 import urllib3
 import re
 
+from zabbix_client import get_client
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
@@ -37,7 +39,7 @@ def _extract_loja_pdv(text, rede):
     return match.group("loja"), match.group("pdv")
 
 
-def get_zabbix_group_id(session, api_url, rede, logger: logging.Logger):
+def get_zabbix_group_id(client, rede, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "hostgroup.get",
@@ -46,9 +48,7 @@ def get_zabbix_group_id(session, api_url, rede, logger: logging.Logger):
     }
     logger.info(f"Obtendo ID do grupo '{rede}' no Zabbix...")
     try:
-        response = session.post(api_url, json=payload, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = client.call(payload["method"], payload["params"], use_cache=False, timeout=10)
         grupos = data.get("result")
         if not grupos:
             logger.error(f"Nenhum grupo encontrado com o nome '{rede}'. Verifique PARAM_REDE no config.")
@@ -61,7 +61,7 @@ def get_zabbix_group_id(session, api_url, rede, logger: logging.Logger):
         return None
 
 
-def get_existing_hosts_map(session, api_url, groupid, logger: logging.Logger):
+def get_existing_hosts_map(client, groupid, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "host.get",
@@ -70,9 +70,7 @@ def get_existing_hosts_map(session, api_url, groupid, logger: logging.Logger):
     }
     logger.info("Obtendo lista de hosts existentes no Zabbix...")
     try:
-        response = session.post(api_url, json=payload, timeout=15)
-        response.raise_for_status()
-        data = response.json()
+        data = client.call(payload["method"], payload["params"], use_cache=False, timeout=15)
         mapping = {}
         for item in data.get("result", []):
             nome = item.get("host")
@@ -127,7 +125,7 @@ def get_hosts_from_db(ip_concentrador, usuario, senha, nome_db, loja, logger: lo
     return lista_hosts
 
 
-def create_zabbix_host(session, api_url, host_info, config, groupid, logger: logging.Logger):
+def create_zabbix_host(client, host_info, config, groupid, logger: logging.Logger):
     nome_host = host_info["host"]
     interface = {
         "type": 1, "main": 1, "useip": 1,
@@ -154,9 +152,7 @@ def create_zabbix_host(session, api_url, host_info, config, groupid, logger: log
     logger.info(f"Enviando requisição para criar host '{nome_host}' no Zabbix...")
     logger.debug(f"Payload de criação: {payload}")
     try:
-        response = session.post(api_url, json=payload, timeout=15)
-        response.raise_for_status()
-        resposta = response.json()
+        resposta = client.call(payload["method"], payload["params"], use_cache=False, timeout=15)
         if resposta.get("error"):
             logger.error(f"Erro da API ao criar host {nome_host}: {resposta['error']}")
             return False
@@ -167,7 +163,7 @@ def create_zabbix_host(session, api_url, host_info, config, groupid, logger: log
         return False
 
 
-def rename_zabbix_host(session, api_url, hostid, new_host, new_name, logger: logging.Logger):
+def rename_zabbix_host(client, hostid, new_host, new_name, logger: logging.Logger):
     payload = {
         "jsonrpc": "2.0",
         "method": "host.update",
@@ -181,9 +177,7 @@ def rename_zabbix_host(session, api_url, hostid, new_host, new_name, logger: log
     logger.info(f"Atualizando hostid {hostid} para '{new_host}'...")
     logger.debug(f"Payload de atualização: {payload}")
     try:
-        response = session.post(api_url, json=payload, timeout=15)
-        response.raise_for_status()
-        resposta = response.json()
+        resposta = client.call(payload["method"], payload["params"], use_cache=False, timeout=15)
         if resposta.get("error"):
             logger.error(f"Erro da API ao atualizar host {hostid}: {resposta['error']}")
             return False
@@ -195,20 +189,14 @@ def rename_zabbix_host(session, api_url, hostid, new_host, new_name, logger: log
 
 
 def run_local(config: dict, logger: logging.Logger, args):
-    api_url = f"https://{config['PARAM_ZABBIX_SERVER']}/api_jsonrpc.php"
-    session = requests.Session()
-    session.verify = False
-    session.headers.update({
-        "Content-Type": "application/json-rpc",
-        "Authorization": f"Bearer {config['PARAM_TOKEN']}"
-    })
-
-    groupid = get_zabbix_group_id(session, api_url, config["PARAM_REDE"], logger)
+    client = get_client(config)
+
+    groupid = get_zabbix_group_id(client, config["PARAM_REDE"], logger)
     if not groupid:
         logger.error("Não foi possível obter o ID do grupo. Abortando.")
         return
 
-    existing_map = get_existing_hosts_map(session, api_url, groupid, logger)
+    existing_map = get_existing_hosts_map(client, groupid, logger)
     ip_to_host = {
         data.get("ip"): {"host": host, "hostid": data.get("hostid")}
         for host, data in existing_map.items()
@@ -260,14 +248,14 @@ def run_local(config: dict, logger: logging.Logger, args):
                     if getattr(args, "fix_divergent", False):
                         hostid = ip_to_host[ip_db]["hostid"]
                         new_name = f"{config['PARAM_REDE']} (LOJA{loja_format}) PDV{registro['codigo']}"
-                        rename_zabbix_host(session, api_url, hostid, chave_host, new_name, logger)
+                        rename_zabbix_host(client, hostid, chave_host, new_name, logger)
                 else:
                     logger.info(f"[AUSENTE] Concentrador: {ip_conc} | Host: {chave_host} | IP: {ip_db}")
 
                 if getattr(args, "autoregister", False):
                     registro["host"] = chave_host
                     registro["name"] = f"{config['PARAM_REDE']} (LOJA{loja_format}) PDV{registro['codigo']}"
-                    create_zabbix_host(session, api_url, registro, config, groupid, logger)
+                    create_zabbix_host(client, registro, config, groupid, logger)
             else:
                 ip_zabbix = existing_map.get(chave_host, {}).get("ip")
                 if ip_zabbix and ip_zabbix != ip_db:
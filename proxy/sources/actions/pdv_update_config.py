@@ -6,44 +6,81 @@ import threading
 import tempfile
 import hashlib
 import time
+import shlex
 from ssh_manager import SSHSession
 from utils import GREEN, RED, YELLOW, NC
 # Importa o dicionário de checksums que é populado pelo pdv_asset_manager
 from pdv_asset_manager import LOCAL_CHECKSUMS
 
-def _sync_file(session: SSHSession, local_path: str, remote_path: str, needs_sudo: bool, logger, host_log_prefix):
+LIBS_ARCHIVE = "libs.tar.gz"
+# Registra o hash do libs.tar.gz efetivamente descompactado; se o envio der certo
+# e o tar falhar, a próxima execução ainda descompacta.
+LIBS_STAMP = ".libs.tar.gz.sha256"
+
+
+def _parse_sha256_manifest(out: str) -> dict:
+    manifest = {}
+    for line in (out or "").splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) == 2 and len(parts[0]) == 64:
+            manifest[parts[1].lstrip("*")] = parts[0]
+    return manifest
+
+
+def _remote_manifest(session: SSHSession, remote_paths: list, needs_sudo: bool) -> dict:
     """
-    Função auxiliar que sincroniza um único arquivo de forma idempotente,
-    usando o checksum pré-calculado do dicionário global.
+    Hashes de todos os caminhos em um único comando; ausentes ficam fora do dict.
     """
-    filename = os.path.basename(local_path)
-    local_checksum = LOCAL_CHECKSUMS.get(filename)
-    
-    if not local_checksum:
-        logger.error(f"{host_log_prefix} {RED}Checksum local para {filename} não encontrado. Envio abortado.{NC}")
-        return False
+    quoted = " ".join(shlex.quote(p) for p in remote_paths)
+    _, out, _ = session.run(f"sha256sum {quoted} 2>/dev/null", use_sudo=needs_sudo)
+    return _parse_sha256_manifest(out)
 
-    logger.info(f"{host_log_prefix} Verificando {filename} remoto em {remote_path}...")
-    remote_checksum_cmd = f"sha256sum {remote_path} 2>/dev/null | cut -d' ' -f1"
-    status, remote_checksum, _ = session.run(remote_checksum_cmd, use_sudo=needs_sudo)
-    
-    if local_checksum == remote_checksum.strip():
-        logger.info(f"{host_log_prefix} {GREEN}{filename} já está atualizado. Envio ignorado.{NC}")
-        return True
-    
-    logger.info(f"{host_log_prefix} {filename} desatualizado. Enviando nova versão...")
-    try:
-        session.put(local_path, remote_path, use_sudo=needs_sudo)
-        status, new_remote_checksum, _ = session.run(remote_checksum_cmd, use_sudo=needs_sudo)
-        if local_checksum == new_remote_checksum.strip():
-            logger.info(f"{host_log_prefix} {GREEN}Envio de {filename} concluído e verificado.{NC}")
-            return True
-        else:
+
+def _sync_assets(session: SSHSession, local_dir: str, files_to_sync: dict, needs_sudo: bool,
+                 logger, host_log_prefix) -> list | None:
+    """
+    Compara o manifesto remoto com LOCAL_CHECKSUMS e envia só o que mudou,
+    verificando os enviados com um segundo manifesto. Retorna os nomes
+    enviados ou None em caso de falha.
+    """
+    for filename in files_to_sync:
+        if not LOCAL_CHECKSUMS.get(filename):
+            logger.error(f"{host_log_prefix} {RED}Checksum local para {filename} não encontrado. Envio abortado.{NC}")
+            return None
+
+    logger.info(f"{host_log_prefix} Obtendo manifesto remoto de {len(files_to_sync)} arquivos...")
+    manifest = _remote_manifest(session, list(files_to_sync.values()), needs_sudo)
+    changed = [
+        filename for filename, remote_path in files_to_sync.items()
+        if manifest.get(remote_path) != LOCAL_CHECKSUMS[filename]
+    ]
+    for filename in files_to_sync:
+        if filename not in changed:
+            logger.info(f"{host_log_prefix} {GREEN}{filename} já está atualizado. Envio ignorado.{NC}")
+    if not changed:
+        return []
+
+    for filename in changed:
+        logger.info(f"{host_log_prefix} {filename} desatualizado. Enviando nova versão...")
+        try:
+            session.put(os.path.join(local_dir, filename), files_to_sync[filename], use_sudo=needs_sudo)
+        except Exception as e:
+            logger.error(f"{host_log_prefix} {RED}FALHA no envio de {filename}. Erro: {e}{NC}")
+            return None
+
+    verify = _remote_manifest(session, [files_to_sync[f] for f in changed], needs_sudo)
+    for filename in changed:
+        if verify.get(files_to_sync[filename]) != LOCAL_CHECKSUMS[filename]:
             logger.error(f"{host_log_prefix} {RED}FALHA na verificação pós-envio de {filename}.{NC}")
-            return False
-    except Exception as e:
-        logger.error(f"{host_log_prefix} {RED}FALHA no envio de {filename}. Erro: {e}{NC}")
-        return False
+            return None
+        logger.info(f"{host_log_prefix} {GREEN}Envio de {filename} concluído e verificado.{NC}")
+    return changed
+
+
+def _libs_extracted_hash(session: SSHSession, stamp_path: str, needs_sudo: bool) -> str:
+    _, out, _ = session.run(f"cat {stamp_path} 2>/dev/null", use_sudo=needs_sudo)
+    return (out or "").strip()
+
 
 def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, args):
     """
@@ -74,36 +111,34 @@ def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, a
     }
 
     logger.info(f"{host_log_prefix} Etapa 1/5: Sincronizando arquivos de assets...")
-    for filename, remote_path in files_to_sync.items():
-        local_path = os.path.join(local_dir, filename)
-        if not _sync_file(session, local_path, remote_path, needs_sudo, logger, host_log_prefix):
-            logger.error(f"{host_log_prefix} {RED}Falha crítica na sincronização. Abortando update.{NC}")
-            return
-    logger.info(f"{host_log_prefix} {GREEN}Etapa 1/5: Sincronização de arquivos concluída.{NC}")
+    changed = _sync_assets(session, local_dir, files_to_sync, needs_sudo, logger, host_log_prefix)
+    if changed is None:
+        logger.error(f"{host_log_prefix} {RED}Falha crítica na sincronização. Abortando update.{NC}")
+        return
+    logger.info(f"{host_log_prefix} {GREEN}Etapa 1/5: Sincronização de arquivos concluída ({len(changed)} enviados).{NC}")
             
     logger.info(f"{host_log_prefix} Etapa 2/5: Aplicando permissões de execução...")
     executables_to_permission = [
         "MonitoraSATc", "MonitoraSATc64", "MonitoraSAT.sh", "MonitoraImpressora"
     ]
-    all_permissions_ok = True
-    for filename in executables_to_permission:
-        remote_path = files_to_sync.get(filename)
-        if remote_path:
-            status, _, err = session.run(f"chmod +x {remote_path}", use_sudo=needs_sudo)
-            if status != 0:
-                logger.error(f"{host_log_prefix} {RED}Falha em {filename}: {err}{NC}")
-                all_permissions_ok = False
-    
-    if not all_permissions_ok:
-        logger.error(f"{host_log_prefix} {RED}Falha crítica nas permissões. Abortando update.{NC}")
+    remote_executables = " ".join(files_to_sync[f] for f in executables_to_permission if f in files_to_sync)
+    status, _, err = session.run(f"chmod +x {remote_executables}", use_sudo=needs_sudo)
+    if status != 0:
+        logger.error(f"{host_log_prefix} {RED}Falha crítica nas permissões: {err}. Abortando update.{NC}")
         return
     logger.info(f"{host_log_prefix} {GREEN}Etapa 2/5: Permissões aplicadas com sucesso.{NC}")
 
-    logger.info(f"{host_log_prefix} Etapa 3/5: Descompactando libs.tar.gz...")
-    status, _, err = session.run(f"tar zxvf {base_dir}/libs.tar.gz -C {base_dir}", use_sudo=needs_sudo, logger=logger)
-    if status != 0:
-        logger.warning(f"{host_log_prefix} {YELLOW}Não foi possível descompactar libs.tar.gz. Erro: {err}{NC}")
-    logger.info(f"{host_log_prefix} {GREEN}Etapa 3/5: Descompactação concluída.{NC}")
+    libs_hash = LOCAL_CHECKSUMS[LIBS_ARCHIVE]
+    stamp_path = f"{base_dir}/{LIBS_STAMP}"
+    if LIBS_ARCHIVE not in changed and _libs_extracted_hash(session, stamp_path, needs_sudo) == libs_hash:
+        logger.info(f"{host_log_prefix} {GREEN}Etapa 3/5: libs.tar.gz inalterado. Descompactação ignorada.{NC}")
+    else:
+        logger.info(f"{host_log_prefix} Etapa 3/5: Descompactando libs.tar.gz...")
+        extract_cmd = f"tar zxvf {base_dir}/{LIBS_ARCHIVE} -C {base_dir} && echo {libs_hash} > {stamp_path}"
+        status, _, err = session.run(f"sh -c {shlex.quote(extract_cmd)}", use_sudo=needs_sudo, logger=logger)
+        if status != 0:
+            logger.warning(f"{host_log_prefix} {YELLOW}Não foi possível descompactar libs.tar.gz. Erro: {err}{NC}")
+        logger.info(f"{host_log_prefix} {GREEN}Etapa 3/5: Descompactação concluída.{NC}")
 
     logger.info(f"{host_log_prefix} Etapa 4/5: Gerando e enviando zabbix_agentd.conf...")
     proxy_ip = config.get("PARAM_PROXY_IP", "127.0.0.1")
@@ -1,6 +1,7 @@
 # actions/pdv_update_timezone.py
 import logging
 from ssh_manager import SSHSession
+from host_facts import get_cached_host_facts
 from utils import GREEN, RED, YELLOW, NC
 
 
@@ -23,39 +24,39 @@ def _run_cmd(
     return True, out
 
 
-def _get_systemd_timezone(session: SSHSession, needs_sudo: bool, timedatectl_path: str):
-    if not timedatectl_path:
-        return None
-    status, out, _ = session.run(
-        f"{timedatectl_path} 2>/dev/null | awk -F': *' '/Time zone:/{{print $2}}'",
-        use_sudo=needs_sudo,
-    )
-    if status != 0:
-        return None
-    return out.strip().split(" ")[0] if out.strip() else None
+TIMEDATECTL_PATH_CMD = (
+    "command -v timedatectl 2>/dev/null "
+    "|| (test -x /bin/timedatectl && echo /bin/timedatectl) "
+    "|| (test -x /usr/bin/timedatectl && echo /usr/bin/timedatectl) "
+    "|| true"
+)
+SYSTEMD_TIMEZONE_CMD = (
+    f"T=$({TIMEDATECTL_PATH_CMD}); "
+    "[ -n \"$T\" ] && \"$T\" 2>/dev/null | awk -F': *' '/Time zone:/{print $2}'"
+)
+TIMEDATECTL_STATUS_CMD = f"T=$({TIMEDATECTL_PATH_CMD}); [ -n \"$T\" ] && \"$T\" 2>/dev/null"
+TIMEZONE_FILE_CMD = "cat /etc/timezone 2>/dev/null"
+LOCALTIME_TARGET_CMD = "readlink -f /etc/localtime 2>/dev/null"
 
 
-def _get_timezone_file(session: SSHSession, needs_sudo: bool):
-    status, out, _ = session.run("cat /etc/timezone 2>/dev/null", use_sudo=needs_sudo)
+def _probe_value(result: tuple[int, str, str]):
+    status, out, _ = result
     if status != 0:
         return None
     return out.strip()
 
 
+def _parse_systemd_timezone(result: tuple[int, str, str]):
+    value = _probe_value(result)
+    return value.split(" ")[0] if value else None
+
+
 def _get_localtime_target(session: SSHSession, needs_sudo: bool):
-    status, out, _ = session.run("readlink -f /etc/localtime 2>/dev/null", use_sudo=needs_sudo)
+    status, out, _ = session.run(LOCALTIME_TARGET_CMD, use_sudo=needs_sudo)
     if status != 0:
         return None
     return out.strip()
 
-def _get_timedatectl_status(session: SSHSession, needs_sudo: bool, timedatectl_path: str):
-    if not timedatectl_path:
-        return ""
-    status, out, _ = session.run(f"{timedatectl_path} 2>/dev/null", use_sudo=needs_sudo)
-    if status != 0:
-        return ""
-    return out.strip()
-
 def _as_bool(value) -> bool:
     if isinstance(value, bool):
         return value
@@ -176,23 +177,25 @@ def _configure_timesyncd(
     )
     return True
 
-def _detect_distro(session: SSHSession, needs_sudo: bool):
-    cmd = (
-        "if [ -f /etc/os-release ]; then "
-        "ID=$(awk -F= '/^ID=/{print $2}' /etc/os-release | head -n1 | tr -d '\"'); "
-        "VER=$(awk -F= '/^VERSION_ID=/{print $2}' /etc/os-release | head -n1 | tr -d '\"'); "
-        "echo ${ID:-unknown}; echo ${VER:-unknown}; "
-        "elif [ -x /usr/bin/lsb_release ] || [ -x /bin/lsb_release ]; then "
-        "lsb_release -si 2>/dev/null | tr '[:upper:]' '[:lower:]'; "
-        "lsb_release -sr 2>/dev/null; "
-        "elif [ -f /etc/issue ]; then "
-        "head -n 1 /etc/issue | awk '{print tolower($1)}'; "
-        "head -n 1 /etc/issue | awk '{print $2}'; "
-        "elif [ -f /etc/slackware-version ]; then "
-        "echo \"slackware\"; cat /etc/slackware-version; "
-        "else echo \"unknown\"; echo \"unknown\"; fi"
-    )
-    status, out, _ = session.run(cmd, use_sudo=needs_sudo)
+DISTRO_PROBE_CMD = (
+    "if [ -f /etc/os-release ]; then "
+    "ID=$(awk -F= '/^ID=/{print $2}' /etc/os-release | head -n1 | tr -d '\"'); "
+    "VER=$(awk -F= '/^VERSION_ID=/{print $2}' /etc/os-release | head -n1 | tr -d '\"'); "
+    "echo ${ID:-unknown}; echo ${VER:-unknown}; "
+    "elif [ -x /usr/bin/lsb_release ] || [ -x /bin/lsb_release ]; then "
+    "lsb_release -si 2>/dev/null | tr '[:upper:]' '[:lower:]'; "
+    "lsb_release -sr 2>/dev/null; "
+    "elif [ -f /etc/issue ]; then "
+    "head -n 1 /etc/issue | awk '{print tolower($1)}'; "
+    "head -n 1 /etc/issue | awk '{print $2}'; "
+    "elif [ -f /etc/slackware-version ]; then "
+    "echo \"slackware\"; cat /etc/slackware-version; "
+    "else echo \"unknown\"; echo \"unknown\"; fi"
+)
+
+
+def _parse_distro(result: tuple[int, str, str]):
+    status, out, _ = result
     if status != 0:
         return "unknown", "unknown"
     lines = [line.strip() for line in out.splitlines() if line.strip()]
@@ -234,30 +237,38 @@ def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, a
     zoneinfo_path = f"/usr/share/zoneinfo/{timezone}"
     localtime_target = localtime_target or zoneinfo_path
 
-    distro, version = _detect_distro(session, False)
+    # Sondagens iniciais em um único round-trip (sudo uma vez para o lote).
+    # A distro vem do cache de fatos do host quando disponível (ex.: preenchido pelo compatibility_guard).
+    cached_facts = get_cached_host_facts(host, config)
+    probes = [
+        f"test -e {zoneinfo_path}",
+        f"test -e {localtime_target}",
+        TIMEDATECTL_PATH_CMD,
+        SYSTEMD_TIMEZONE_CMD,
+    ]
+    if cached_facts is None:
+        probes.insert(0, DISTRO_PROBE_CMD)
+    probe_results = session.run_batch(probes, use_sudo=needs_sudo)
+
+    if cached_facts is None:
+        distro, version = _parse_distro(probe_results.pop(0))
+    else:
+        distro = cached_facts.get("distro") or "unknown"
+        version = cached_facts.get("version") or "unknown"
+    zoneinfo_result, target_result, timedatectl_result, current_tz_result = probe_results
     logger.info(f"{host_log_prefix} Distro detectada: {distro} {version}")
 
-    ok, _ = _run_cmd(session, f"test -e {zoneinfo_path}", needs_sudo, logger, host_log_prefix)
-    if not ok:
+    if zoneinfo_result[0] != 0:
         logger.error(f"{host_log_prefix} {RED}Timezone inválido: {zoneinfo_path} não existe.{NC}")
         return
 
-    if localtime_target != zoneinfo_path:
-        ok_target, _ = _run_cmd(session, f"test -e {localtime_target}", needs_sudo, logger, host_log_prefix)
-        if not ok_target:
-            logger.error(f"{host_log_prefix} {RED}Timezone inválido: {localtime_target} não existe.{NC}")
-            return
-
-    status_timedatectl, timedatectl_path, _ = session.run(
-        "command -v timedatectl 2>/dev/null "
-        "|| (test -x /bin/timedatectl && echo /bin/timedatectl) "
-        "|| (test -x /usr/bin/timedatectl && echo /usr/bin/timedatectl) "
-        "|| true",
-        use_sudo=False,
-    )
-    timedatectl_path = timedatectl_path.strip()
+    if localtime_target != zoneinfo_path and target_result[0] != 0:
+        logger.error(f"{host_log_prefix} {RED}Timezone inválido: {localtime_target} não existe.{NC}")
+        return
+
+    timedatectl_path = timedatectl_result[1].strip() if timedatectl_result[0] == 0 else ""
     if timedatectl_path:
-        current_tz = _get_systemd_timezone(session, needs_sudo, timedatectl_path)
+        current_tz = _parse_systemd_timezone(current_tz_result)
         if current_tz == timezone:
             logger.info(f"{host_log_prefix} {GREEN}Timezone já está em {timezone}.{NC}")
 
@@ -271,18 +282,26 @@ def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, a
             allow_fail=True,
             dry_run=dry_run,
         )
-        if not dry_run:
-            if ok_set:
-                new_tz = _get_systemd_timezone(session, needs_sudo, timedatectl_path)
-                if new_tz == timezone:
-                    logger.info(f"{host_log_prefix} {GREEN}Timezone ajustado para {timezone}.{NC}")
-                else:
-                    logger.warning(f"{host_log_prefix} {YELLOW}timedatectl não confirmou a mudança. Aplicando fallback manual.{NC}")
+    else:
+        ok_set = False
+
+    # Estado pós-timedatectl (timezone do systemd, /etc/timezone e /etc/localtime) em um round-trip.
+    new_tz_result, file_tz_result, localtime_result = session.run_batch(
+        [SYSTEMD_TIMEZONE_CMD, TIMEZONE_FILE_CMD, LOCALTIME_TARGET_CMD],
+        use_sudo=needs_sudo,
+    )
+    if timedatectl_path and not dry_run:
+        if ok_set:
+            new_tz = _parse_systemd_timezone(new_tz_result)
+            if new_tz == timezone:
+                logger.info(f"{host_log_prefix} {GREEN}Timezone ajustado para {timezone}.{NC}")
             else:
-                logger.warning(f"{host_log_prefix} {YELLOW}timedatectl falhou. Aplicando fallback manual.{NC}")
+                logger.warning(f"{host_log_prefix} {YELLOW}timedatectl não confirmou a mudança. Aplicando fallback manual.{NC}")
+        else:
+            logger.warning(f"{host_log_prefix} {YELLOW}timedatectl falhou. Aplicando fallback manual.{NC}")
 
-    current_file_tz = _get_timezone_file(session, needs_sudo)
-    current_localtime = _get_localtime_target(session, needs_sudo)
+    current_file_tz = _probe_value(file_tz_result)
+    current_localtime = _probe_value(localtime_result)
     if current_localtime == localtime_target and (not current_file_tz or current_file_tz == timezone):
         logger.info(f"{host_log_prefix} {GREEN}Timezone já está alinhado com {timezone}.{NC}")
 
@@ -406,9 +425,18 @@ def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, a
     if dry_run:
         return
 
-    final_localtime = _get_localtime_target(session, needs_sudo) or "indisponivel"
-    final_timezone_file = _get_timezone_file(session, needs_sudo) or "indisponivel"
-    td_status = _get_timedatectl_status(session, False, timedatectl_path)
+    final_localtime_result, final_file_result, td_status_result, ntpdate_result = session.run_batch(
+        [
+            LOCALTIME_TARGET_CMD,
+            TIMEZONE_FILE_CMD,
+            TIMEDATECTL_STATUS_CMD,
+            "command -v ntpdate 2>/dev/null || test -x /usr/sbin/ntpdate && echo /usr/sbin/ntpdate || true",
+        ],
+        use_sudo=needs_sudo,
+    )
+    final_localtime = _probe_value(final_localtime_result) or "indisponivel"
+    final_timezone_file = _probe_value(final_file_result) or "indisponivel"
+    td_status = (_probe_value(td_status_result) or "") if timedatectl_path else ""
     if td_status:
         logger.info(f"{host_log_prefix} Status timedatectl:\\n{td_status}")
     logger.info(
@@ -416,10 +444,7 @@ def run(session: SSHSession, host: dict, config: dict, logger: logging.Logger, a
     )
 
     if ntp_server:
-        status_ntpdate, ntp_path, _ = session.run(
-            "command -v ntpdate 2>/dev/null || test -x /usr/sbin/ntpdate && echo /usr/sbin/ntpdate || true",
-            use_sudo=needs_sudo,
-        )
+        status_ntpdate, ntp_path, _ = ntpdate_result
         ntp_path = ntp_path.strip()
         if status_ntpdate == 0 and ntp_path:
             _run_cmd(
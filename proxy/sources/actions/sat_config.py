@@ -3,17 +3,19 @@
 Ação local para sincronizar conf_nfce (SAT Config) com o BI.
 Baseada no script standalone SatConfig.py.
 """
-import json
 import mysql.connector
-import requests
 from datetime import datetime
 from pathlib import Path
 import logging
 
+from bi_pipeline import BIUploader, extract_batches, run_concentrators
+
 SQL_QUERY = """
     SELECT nroloja, ChaveConciliaSat FROM conf_nfce
     WHERE LENGTH(ChaveConciliaSat) = 36
 """
+# conf_nfce tem uma linha por loja; na prática um único lote por concentrador.
+BATCH_SIZE = 1000
 
 
 def connect_mysql(host, user, password, database):
@@ -26,52 +28,42 @@ def connect_mysql(host, user, password, database):
     )
 
 
-def send_to_bi(data_lote, config, debug, logger: logging.Logger):
-    url = f"https://{config['PARAM_BI_SERVER']}/sat/config"
-    headers = {
-        "Authorization": f"Bearer {config['PARAM_TOKEN_BI']}",
-        "Content-Type": "application/json"
-    }
-
-    if debug:
-        logger.debug("Lote enviado (debug): %s", json.dumps(data_lote, indent=2, ensure_ascii=False))
-
-    try:
-        response = requests.post(url, json=data_lote, headers=headers, verify=config["PARAM_BI_CERTI_PATH"], timeout=20)
-        if response.status_code == 200:
-            logger.info(f"Lote enviado com sucesso: {len(data_lote)} registros.")
-        else:
-            logger.error(f"Erro {response.status_code} ao enviar lote: {response.text}")
-    except Exception as e:
-        logger.error(f"Erro ao enviar para API: {e}")
-
-
 def run_local(config: dict, logger: logging.Logger, args):
     debug = bool(getattr(args, "debug", False))
     log_path = Path(config["PARAM_BASE_DIR"]) / "logs" / "sat_config_log.txt"
     log_path.parent.mkdir(parents=True, exist_ok=True)
 
+    rede = config["PARAM_REDE"]
+
     with open(log_path, "a") as log:
-        for host in config.get("PARAM_IP_CONCENTRADORES", []):
+        def extract(host):
             log.write(f"{datetime.now()} - Conectando ao {host}\n")
+            conn = connect_mysql(host, config["DB_USER"], config["DB_PASS"], "controle")
             try:
-                conn = connect_mysql(host, config["DB_USER"], config["DB_PASS"], "controle")
-                cursor = conn.cursor()
-                cursor.execute(SQL_QUERY)
-                rows = cursor.fetchall()
-                cursor.close()
+                yield from extract_batches(
+                    conn, SQL_QUERY, config,
+                    lambda r: {"rede": rede, "nroloja": r[0], "chaveSeguranca": r[1]},
+                    BATCH_SIZE,
+                )
+            finally:
                 conn.close()
-            except Exception as e:
-                log.write(f"Erro no host {host}: {e}\n")
-                logger.error(f"Erro no host {host}: {e}")
-                continue
 
-            if not rows:
+        def send(host, lote):
+            uploader.send(lote)
+
+        def on_error(host, exc):
+            log.write(f"Erro no host {host}: {exc}\n")
+            logger.error(f"Erro no host {host}: {exc}")
+
+        uploader = BIUploader(config, "/sat/config", logger, timeout=20, debug=debug)
+        try:
+            results = run_concentrators(config.get("PARAM_IP_CONCENTRADORES", []), extract, send, config, logger, on_error)
+        finally:
+            uploader.close()
+
+        for host, result in results.items():
+            if not result["error"] and result["rows"] == 0:
                 log.write(f"{datetime.now()} - Nenhum dado retornado do host {host}\n")
                 logger.info(f"Nenhum dado retornado do host {host}")
-                continue
-
-            lote = [{"rede": config["PARAM_REDE"], "nroloja": r[0], "chaveSeguranca": r[1]} for r in rows]
-            send_to_bi(lote, config, debug, logger)
 
     logger.info("Sincronização SAT Config finalizada.")
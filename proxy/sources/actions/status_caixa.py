@@ -1,26 +1,43 @@
 # actions/status_caixa.py
 """
 Ação local que replica o ConnectAriusServerCAIXA.sh:
-- consulta operador_id nos concentradores PostgreSQL
-- envia via zabbix_sender para hosts PDV
+- consulta operador_id nos concentradores PostgreSQL (psycopg2, em paralelo)
+- envia ao Zabbix (protocolo trapper, em lote por concentrador) para hosts PDV;
+  com TLSConnect=psk/cert no zabbix_agentd.conf, pelo binário zabbix_sender
+
+Só vão ao Zabbix os operadores que mudaram desde o último envio, mais um
+reenvio forçado a cada PARAM_STATUS_CAIXA_HEARTBEAT segundos (padrão 3600;
+0 envia tudo em toda execução). O último valor enviado por PDV fica em
+PARAM_STATUS_CAIXA_STATE (padrão PARAM_BASE_DIR/state/status_caixa.json).
+
+PARAM_STATUS_CAIXA_QUERY escolhe a consulta do último COO tipo 5 por PDV:
+"legacy" (padrão, IN sobre MAX(coo) de todo o pdvvalor), "distinct_on" ou
+"lateral" (uma busca LIMIT 1 por PDV). As duas últimas dependem do índice de
+proxy/postgresql/status_caixa.pdvvalor_index.sql; sem ele, "lateral" varre a
+tabela uma vez por PDV. Para conferir o índice e comparar os planos:
+benchmarks/explain_status_caixa.py.
 """
 from __future__ import annotations
 
-import fcntl
+import json
 import logging
 import os
-import shutil
-import subprocess
 import time
-from pathlib import Path
+from typing import NamedTuple
 
+from instance_lock import InstanceLock, acquire_instance_lock
+from pg_client import PreparedQuery, query_all
 from utils import GREEN, RED, YELLOW, NC
+from zabbix_sender import ZabbixSenderError, sender_for_agent
 
 
 LOCK_FILE = "/run/lock/ConnectAriusServerCAIXA.lock"
-MAX_AGE_SECONDS = 60 * 60
 ZABBIX_CONFIG = "/etc/zabbix/zabbix_agentd.conf"
 ZABBIX_KEY = "pdv.neo.operador_id"
+DEFAULT_HEARTBEAT = 3600
+DEFAULT_QUERY_STRATEGY = "legacy"
+# PDVs que sumiram dos concentradores saem do estado depois disso
+STATE_MAX_AGE = 7 * 86400
 
 QUERY = """
 SELECT l.codigo AS codigo_loja,
@@ -36,56 +53,148 @@ WHERE b.tipo = 5
     WHERE a.tipo = 5
     GROUP BY a.pdvid
   )
-ORDER BY l.codigo, p.codigo;
+ORDER BY l.codigo, p.codigo
 """
 
+QUERY_DISTINCT_ON = """
+SELECT l.codigo AS codigo_loja,
+       p.codigo AS codigo_pdv,
+       b.operadorid
+FROM (
+    SELECT DISTINCT ON (a.pdvid) a.pdvid, a.operadorid
+    FROM pdvvalor a
+    WHERE a.tipo = 5
+      AND a.coo IS NOT NULL
+    ORDER BY a.pdvid, a.coo DESC
+) b
+JOIN pdv p   ON p.id = b.pdvid
+JOIN loja l  ON l.id = p.lojaid
+ORDER BY l.codigo, p.codigo
+"""
 
-def _acquire_lock(logger: logging.Logger) -> tuple[Path, object] | None:
-    lock_path = Path(LOCK_FILE)
-    if lock_path.exists():
-        try:
-            age = int(time.time()) - int(lock_path.stat().st_mtime)
-            if age > MAX_AGE_SECONDS:
-                logger.warning(
-                    f"{YELLOW}[LOCK] Lock antigo detectado (>{MAX_AGE_SECONDS}s). Removendo: {lock_path}{NC}"
-                )
-                lock_path.unlink(missing_ok=True)
-        except OSError as exc:
-            logger.warning(f"{YELLOW}[LOCK] Falha ao avaliar lock: {exc}{NC}")
+QUERY_LATERAL = """
+SELECT l.codigo AS codigo_loja,
+       p.codigo AS codigo_pdv,
+       b.operadorid
+FROM pdv p
+JOIN loja l  ON l.id = p.lojaid
+CROSS JOIN LATERAL (
+    SELECT a.operadorid
+    FROM pdvvalor a
+    WHERE a.pdvid = p.id
+      AND a.tipo = 5
+      AND a.coo IS NOT NULL
+    ORDER BY a.coo DESC
+    LIMIT 1
+) b
+ORDER BY l.codigo, p.codigo
+"""
+
+
+class OperadorRow(NamedTuple):
+    codigo_loja: int | str
+    codigo_pdv: int | str
+    operadorid: int | str | None
+
+
+OPERADOR_QUERIES = {
+    "legacy": PreparedQuery("status_caixa_operador", QUERY, OperadorRow),
+    "distinct_on": PreparedQuery("status_caixa_operador_distinct_on", QUERY_DISTINCT_ON, OperadorRow),
+    "lateral": PreparedQuery("status_caixa_operador_lateral", QUERY_LATERAL, OperadorRow),
+}
 
-    lock_path.parent.mkdir(parents=True, exist_ok=True)
-    lock_file = lock_path.open("a+")
+
+def operador_query(config: dict, logger: logging.Logger | None = None) -> PreparedQuery:
+    strategy = str(config.get("PARAM_STATUS_CAIXA_QUERY", DEFAULT_QUERY_STRATEGY)).strip().lower()
+    query = OPERADOR_QUERIES.get(strategy)
+    if query is None:
+        if logger:
+            logger.warning(
+                f"{YELLOW}PARAM_STATUS_CAIXA_QUERY '{strategy}' desconhecido "
+                f"(use {', '.join(OPERADOR_QUERIES)}); usando '{DEFAULT_QUERY_STRATEGY}'.{NC}"
+            )
+        query = OPERADOR_QUERIES[DEFAULT_QUERY_STRATEGY]
+    return query
+
+
+def _acquire_lock(logger: logging.Logger) -> InstanceLock | None:
+    # Mesmo arquivo do ConnectAriusServerCAIXA.sh, para não rodarem juntos.
+    # Com flock a trava some com o processo; não há lock antigo a remover.
+    lock = acquire_instance_lock("status_caixa", path=LOCK_FILE)
+    if lock is None:
+        holder = InstanceLock(LOCK_FILE).holder()
+        logger.error(
+            f"{RED}Outra instância de status_caixa já está em execução"
+            f" ({holder or 'PID desconhecido'}). Abortando.{NC}"
+        )
+    return lock
+
+
+def _state_path(config: dict) -> str:
+    explicit = config.get("PARAM_STATUS_CAIXA_STATE")
+    if explicit:
+        return explicit
+    return os.path.join(config.get("PARAM_BASE_DIR", "/ariusmonitor"), "state", "status_caixa.json")
+
+
+def _load_state(path: str, logger: logging.Logger) -> dict:
+    """
+    {host PDV: {"value": último operador enviado, "sent": epoch do envio}}.
+    Estado ausente ou corrompido = reenviar tudo.
+    """
     try:
-        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-    except OSError:
-        logger.error(f"{RED}Outra instância de status_caixa já está em execução. Abortando.{NC}")
-        lock_file.close()
-        return None
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"{YELLOW}Estado de envio ilegível em {path}, reenviando todos os operadores: {e}{NC}")
+        return {}
+    return state if isinstance(state, dict) else {}
+
 
-    lock_file.seek(0)
-    lock_file.truncate()
-    lock_file.write(f"{os.getpid()} {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-    lock_file.flush()
-    return lock_path, lock_file
+def _save_state(path: str, state: dict, now: float, logger: logging.Logger):
+    state = {host: entry for host, entry in state.items() if now - entry.get("sent", 0) < STATE_MAX_AGE}
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"{YELLOW}Falha ao gravar estado de envio em {path}: {e}{NC}")
 
 
-def _get_cmd_path(cmd: str, fallback: str) -> str:
-    return shutil.which(cmd) or fallback
+def _pending(items: list[dict], state: dict, now: float, heartbeat: float) -> list[dict]:
+    """
+    Itens cujo valor mudou, que nunca foram enviados ou cujo último envio
+    passou do heartbeat.
+    """
+    pending = []
+    for item in items:
+        entry = state.get(item["host"])
+        if (
+            heartbeat <= 0
+            or entry is None
+            or entry.get("value") != item["value"]
+            or now - entry.get("sent", 0) >= heartbeat
+        ):
+            pending.append(item)
+    return pending
 
 
 def run_local(config: dict, logger: logging.Logger, args):
-    lock_info = _acquire_lock(logger)
-    if not lock_info:
+    lock = _acquire_lock(logger)
+    if not lock:
         return
-    _, lock_file = lock_info
 
+    sender = None
     try:
         remote_hosts = config.get("PARAM_IP_CONCENTRADORES") or []
         rede = config.get("PARAM_REDE")
         db_user = config.get("DB_PG_USER") or config.get("DB_USER")
         db_pass = config.get("DB_PG_PASS") or config.get("DB_PASS")
         db_name = config.get("DB_PG_DB")
-        db_port = str(config.get("DB_PG_PORT", 5432))
 
         if not remote_hosts:
             logger.error("PARAM_IP_CONCENTRADORES não configurado.")
@@ -97,46 +206,34 @@ def run_local(config: dict, logger: logging.Logger, args):
             logger.error("Credenciais do PostgreSQL ausentes (DB_PG_USER/DB_PG_PASS/DB_PG_DB).")
             return
 
-        psql_bin = _get_cmd_path("psql", "/usr/bin/psql")
-        sender_bin = _get_cmd_path("zabbix_sender", "/usr/bin/zabbix_sender")
-        logger.info(f"Usando psql em: {psql_bin}")
-        logger.info(f"Usando zabbix_sender em: {sender_bin}")
+        # TLSConnect=psk/cert no agente: envio pelo binário zabbix_sender
+        sender = sender_for_agent(config, ZABBIX_CONFIG, logger=logger)
+        logger.info(f"Enviando ao Zabbix via {sender.target}")
+        heartbeat = float(config.get("PARAM_STATUS_CAIXA_HEARTBEAT", DEFAULT_HEARTBEAT))
+        state_path = _state_path(config)
+        state = _load_state(state_path, logger)
+        state_changed = False
+
+        query = operador_query(config, logger)
+        logger.info(
+            f"Consultando {len(remote_hosts)} concentradores ({query.name}): {', '.join(remote_hosts)}"
+        )
+        results = query_all(config, remote_hosts, query, logger=logger)
 
         for host in remote_hosts:
-            logger.info(f"Conectando ao host remoto: {host}")
-            env = os.environ.copy()
-            env["PGPASSWORD"] = db_pass
-
-            cmd = [
-                psql_bin,
-                "-h", host,
-                "-U", db_user,
-                "-d", db_name,
-                "-p", db_port,
-                "-t", "-A", "-F", "|",
-                "-c", QUERY,
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-
-            if result.returncode != 0:
-                err_out = result.stderr.strip() or result.stdout.strip()
-                logger.error(f"{RED}Erro ao consultar {host}:{NC} {err_out}")
+            rows = results[host]
+            if isinstance(rows, Exception):
+                logger.error(f"{RED}Erro ao consultar {host}:{NC} {str(rows).strip()}")
                 continue
-
-            output = result.stdout.strip()
-            if not output:
+            if not rows:
                 logger.warning(f"{YELLOW}Sem resultados no host {host}.{NC}")
                 continue
 
-            for line in output.splitlines():
-                if not line.strip():
-                    continue
-                parts = [p.strip() for p in line.split("|")]
-                if len(parts) < 3:
-                    logger.warning(f"{YELLOW}Linha inválida: {line}{NC}")
-                    continue
-
-                codigo_loja, codigo_pdv, operadorid = parts[0], parts[1], parts[2]
+            items = []
+            for row in rows:
+                codigo_loja = str(row.codigo_loja).strip()
+                codigo_pdv = str(row.codigo_pdv).strip()
+                operadorid = "" if row.operadorid is None else str(row.operadorid).strip()
                 if not (codigo_loja.isdigit() and codigo_pdv.isdigit()):
                     logger.warning(
                         f"{YELLOW}Linha inválida: loja='{codigo_loja}' pdv='{codigo_pdv}' op='{operadorid}'{NC}"
@@ -147,27 +244,37 @@ def run_local(config: dict, logger: logging.Logger, args):
                 pdv_pad = f"{int(codigo_pdv):03d}"
                 host_name = f"{rede}-LOJA{loja_pad}-PDV{pdv_pad}"
 
-                sender_cmd = [
-                    sender_bin,
-                    "-c", ZABBIX_CONFIG,
-                    "-s", host_name,
-                    "-k", ZABBIX_KEY,
-                    "-o", operadorid,
-                ]
-                if args.debug:
-                    sender_cmd.append("-vv")
-
-                sender_res = subprocess.run(sender_cmd, capture_output=True, text=True)
-                if sender_res.returncode == 0:
-                    logger.info(
-                        f"{GREEN}Enviado com sucesso para {host_name}: operador_id={operadorid}{NC}"
-                    )
-                else:
-                    err_out = sender_res.stderr.strip() or sender_res.stdout.strip()
-                    logger.error(
-                        f"{RED}Erro ao enviar para {host_name}: operador_id={operadorid}{NC}"
-                    )
-                    if err_out:
-                        logger.error(err_out)
+                items.append({"host": host_name, "key": ZABBIX_KEY, "value": operadorid})
+                logger.debug(f"{host_name}: operador_id={operadorid}")
+
+            now = time.time()
+            pending = _pending(items, state, now, heartbeat)
+            if not pending:
+                logger.info(f"{len(items)} operadores do host {host} sem alteração; nada a enviar.")
+                continue
+            try:
+                sent = sender.send(pending)
+            except ZabbixSenderError as e:
+                logger.error(f"{RED}Erro ao enviar {len(pending)} itens do host {host} ao Zabbix:{NC} {e}")
+                continue
+            if sent.failed:
+                logger.warning(
+                    f"{YELLOW}Zabbix recusou {sent.failed} de {sent.total} itens do host {host} "
+                    f"(hosts/itens inexistentes ou não trapper).{NC}"
+                )
+            # A resposta não diz quais itens falharam; recusas são de configuração
+            # (host/item inexistente) e o heartbeat as reenvia de qualquer forma.
+            for item in pending:
+                state[item["host"]] = {"value": item["value"], "sent": now}
+            state_changed = True
+            logger.info(
+                f"{GREEN}Enviados {sent.processed}/{len(pending)} operadores do host {host} "
+                f"({len(items) - len(pending)} sem alteração omitidos; {sent}).{NC}"
+            )
+
+        if state_changed:
+            _save_state(state_path, state, time.time(), logger)
     finally:
-        lock_file.close()
+        if sender is not None:
+            sender.close()
+        lock.release()
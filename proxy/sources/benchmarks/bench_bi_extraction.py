@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# benchmarks/bench_bi_extraction.py
+"""
+Pico de memória (RSS) da extração de cupons: fetchall + loop (legado) x
+bi_pipeline (cursor não-bufferizado + fetchmany + geradores), sobre uma
+tabela nfce sintética servida por benchmarks/fake_mysql.py. Cada medição
+roda em um subprocesso próprio para que ru_maxrss seja independente.
+
+Uso: python3 benchmarks/bench_bi_extraction.py [--rows 100000,1000000,5000000] [--legacy-max 1000000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_mysql import FakeConnection  # noqa: E402
+from bi_pipeline import extract_batches  # noqa: E402
+
+BATCH_SIZE = 200
+
+
+def _row_to_item(row):
+    # Mesmo formato de actions/cupons.row_to_item, sem depender do mysql.connector
+    return {
+        "rede": "BENCH", "nroloja": row[0], "DataProc": row[1].isoformat(), "Pdv": int(row[2]),
+        "Chave": row[5], "modelo": int(row[5][20:22]), "emServidor": 1, "nCupom": row[3],
+        "vICMS": float(row[6]), "vICMS_ST": float(row[7]), "vPIS": float(row[8]), "vPIS_ST": float(row[9]),
+        "vCOFINS": float(row[10]), "vCOFINS_ST": float(row[11]), "vFCP": float(row[12]),
+        "vFCP_ST": float(row[13]), "LV": row[14], "estornado": int(row[4]), "dEmi": row[1].isoformat(),
+        "Status": str(row[15]),
+    }
+
+
+def _sink(batch):
+    return len(batch)
+
+
+def _run_legacy(rows: int) -> int:
+    conn = FakeConnection(rows)
+    cursor = conn.cursor()
+    cursor.execute("SELECT ... FROM nfce")
+    results = cursor.fetchall()
+    cursor.close()
+    sent = 0
+    batch = []
+    for row in results:
+        batch.append(_row_to_item(row))
+        if len(batch) >= BATCH_SIZE:
+            sent += _sink(batch)
+            batch = []
+    if batch:
+        sent += _sink(batch)
+    return sent
+
+
+def _run_streaming(rows: int) -> int:
+    conn = FakeConnection(rows)
+    sent = 0
+    for batch in extract_batches(conn, "SELECT ... FROM nfce", {}, _row_to_item, BATCH_SIZE):
+        sent += _sink(batch)
+    return sent
+
+
+def _child(mode: str, rows: int):
+    start = time.perf_counter()
+    sent = (_run_legacy if mode == "legacy" else _run_streaming)(rows)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{sent} {elapsed:.2f} {peak_kb}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de RSS da extração de cupons (legado x streaming).")
+    parser.add_argument("--rows", default="100000,1000000,5000000")
+    parser.add_argument("--legacy-max", type=int, default=1000000,
+                        help="Não roda o modo legado acima deste número de linhas (memória)")
+    parser.add_argument("--child", nargs=2, metavar=("MODO", "LINHAS"), help=argparse.SUPPRESS)
+    opts = parser.parse_args()
+
+    if opts.child:
+        _child(opts.child[0], int(opts.child[1]))
+        return
+
+    print(f"{'modo':<10} {'linhas':>9} {'segundos':>9} {'pico RSS (MB)':>14}")
+    for rows in [int(r) for r in opts.rows.split(",") if r.strip()]:
+        for mode in ("legacy", "streaming"):
+            if mode == "legacy" and rows > opts.legacy_max:
+                print(f"{mode:<10} {rows:>9} {'-':>9} {'(pulado)':>14}")
+                continue
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, str(rows)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            sent, elapsed, peak_kb = int(out[0]), float(out[1]), int(out[2])
+            assert sent == rows, f"{mode}: {sent} != {rows}"
+            print(f"{mode:<10} {rows:>9} {elapsed:>9.2f} {peak_kb / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# benchmarks/bench_fleet_engine.py
+"""
+Compara os engines 'threads' e 'async' do fleet_executor contra um servidor
+SSH falso local, reportando hosts/segundo para cada tamanho de frota.
+
+Uso: python3 benchmarks/bench_fleet_engine.py [--sizes 50,500,5000] [--latency 0.2]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ssh_server import FakeSSHServer  # noqa: E402
+from fleet_executor import run_async, run_threaded  # noqa: E402
+
+
+def _build_hosts(count: int, port: int) -> list[dict]:
+    return [
+        {
+            "host": f"BENCH-LOJA{(i // 30) + 1:03d}-PDV{(i % 30) + 201:03d}",
+            "ip": "127.0.0.1",
+            "user": "bench",
+            "password": "bench",
+            "port_ssh": port,
+            "port_zabbix": 10050,
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do executor de frota (threads x async).")
+    parser.add_argument("--sizes", default="50,500,5000", help="Tamanhos de frota separados por vírgula")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência simulada por comando (s)")
+    parser.add_argument("--max-threads", type=int, default=50, help="max_threads do engine threads")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="PARAM_ASYNC_MAX_INFLIGHT do engine async")
+    parser.add_argument("--engines", default="threads,async")
+    opts = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.CRITICAL)
+
+    server = FakeSSHServer(latency=opts.latency).start()
+    config = {
+        "max_threads": opts.max_threads,
+        "PARAM_ASYNC_MAX_INFLIGHT": opts.max_inflight,
+        "PARAM_COMPATIBILITY_MODE": "off",
+        "ssh": {"timeout": 60},
+    }
+    args = SimpleNamespace(
+        action="pdv_test_connection",
+        canonical_action="test_endpoint_connection",
+        provider="arius",
+        compat_mode="off",
+        debug=False,
+    )
+    runners = {"threads": run_threaded, "async": run_async}
+
+    print(f"{'engine':<8} {'hosts':>6} {'segundos':>9} {'hosts/s':>9}")
+    try:
+        for size in [int(s) for s in opts.sizes.split(",") if s.strip()]:
+            hosts = _build_hosts(size, server.port)
+            for engine in [e.strip() for e in opts.engines.split(",") if e.strip()]:
+                start = time.perf_counter()
+                runners[engine](hosts, config, args, logger)
+                elapsed = time.perf_counter() - start
+                print(f"{engine:<8} {size:>6} {elapsed:>9.2f} {size / elapsed:>9.1f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# benchmarks/bench_import_time.py
+"""
+Tempo de import do main.py (CLI chamado pelo cron via run_action.sh), medido
+com 'python -X importtime' em subprocessos novos. Mostra a mediana do tempo
+cumulativo de 'main', os módulos mais caros abaixo dele, e falha (status 1)
+quando o orçamento é estourado ou quando um módulo pesado (paramiko,
+requests, psutil...) é carregado no caminho das ações locais.
+
+Uso: python3 benchmarks/bench_import_time.py [--runs 7] [--budget-ms 80] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SOURCES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Não podem ser importados só por carregar o main.py
+FORBIDDEN = ("paramiko", "requests", "urllib3", "psutil", "mysql", "zabbix_client", "pdv_asset_manager",
+             "ssh_manager", "process_one")
+DEFAULT_BUDGET_MS = 80.0
+
+_PROBE = (
+    "import sys; sys.argv = ['main.py', 'sat_config']; import main; "
+    "print(','.join(sorted(m for m in sys.modules)))"
+)
+
+
+def parse_importtime(stderr: str) -> list[tuple]:
+    """
+    Linhas do -X importtime -> [(módulo, self_us, cumulativo_us, profundidade)].
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line.split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].split(":", 1)[1])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def _subtree(rows: list[tuple], root: str) -> list[tuple]:
+    """
+    Módulos importados por 'root' (o -X importtime lista os filhos antes do pai).
+    """
+    for i, (name, _, _, depth) in enumerate(rows):
+        if name == root:
+            children = []
+            for row in reversed(rows[:i]):
+                if row[3] <= depth:
+                    break
+                children.append(row)
+            return [rows[i]] + children
+    return []
+
+
+def measure_once() -> tuple[float, list[tuple], set]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=SOURCES_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = _subtree(parse_importtime(proc.stderr), "main")
+    if not rows:
+        raise RuntimeError("'main' não apareceu na saída do -X importtime")
+    modules = set(proc.stdout.strip().split(","))
+    return rows[0][2] / 1000, rows, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de import do main.py com orçamento.")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    opts = parser.parse_args()
+
+    totals = []
+    last_rows, modules = [], set()
+    for _ in range(max(1, opts.runs)):
+        total_ms, last_rows, modules = measure_once()
+        totals.append(total_ms)
+
+    median_ms = statistics.median(totals)
+    print(f"import main: mediana {median_ms:.1f} ms (min {min(totals):.1f}, max {max(totals):.1f}, {len(totals)} execuções)")
+    print(f"\n{'módulo':<40} {'self (ms)':>10} {'cumul. (ms)':>12}")
+    for name, self_us, cumulative_us, _ in sorted(last_rows[1:], key=lambda r: -r[2])[:opts.top]:
+        print(f"{name:<40} {self_us / 1000:>10.1f} {cumulative_us / 1000:>12.1f}")
+
+    failures = []
+    loaded = sorted({m.split(".")[0] for m in modules} & set(FORBIDDEN))
+    if loaded:
+        failures.append(f"módulos pesados carregados no import do main: {', '.join(loaded)}")
+    if median_ms > opts.budget_ms:
+        failures.append(f"mediana {median_ms:.1f} ms acima do orçamento de {opts.budget_ms:.0f} ms")
+
+    if failures:
+        print("\nFALHA: " + "; ".join(failures))
+        sys.exit(1)
+    print(f"\nOK: dentro do orçamento de {opts.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
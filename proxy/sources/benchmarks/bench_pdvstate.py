@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# benchmarks/bench_pdvstate.py
+"""
+Carga no pdvstate: --lojas x --pdvs PDVs simultâneos, cada um fazendo
+--vendas vendas completas (INICIO_VENDA, VENDA_CUPOM, VENDA_DETALHES,
+PAGAMENTO_FORMA, FIM_VENDA; a cada --erro-cada vendas um ERRO_TEF antes do
+fim) entre um UPDATE_OPERADOR e um OPERADOR_LOGOFF. Mede eventos/s, a
+latência (p50/p99/máx.) das requisições e as idas ao Redis por evento
+(total_reads_processed do INFO stats: um EVALSHA ou um pipeline contam
+uma vez) e confere, por PDV, o
+contador_vendas_dia em /stats e uma venda em /venda/{cupom}.
+
+Com --lote N cada PDV acumula N eventos e os envia em POST /pdv/events
+(array JSON, ou NDJSON com --ndjson); a latência passa a ser por
+requisição.
+
+Por padrão roda a aplicação em processo (httpx + ASGITransport, sem o log
+INFO por evento) contra o Redis de --redis-url; --app aponta outro main.py
+(ex.: a versão anterior, via git show) para comparar. Com --url o teste vai
+por HTTP para um pdvstate já no ar. As chaves de teste (lojas a partir de
+--loja-base, cupons BENCH-*) são apagadas antes e depois.
+
+Uso: python3 benchmarks/bench_pdvstate.py [--lojas 5 --pdvs 20 --vendas 20] [--app /tmp/main_old.py]
+        [--lote 6 [--ndjson]]
+        [--url http://localhost:8000] [--redis-url redis://localhost:6379/0]
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import redis
+
+PDVSTATE_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdvstate", "main.py")
+
+
+def _load_app(path: str):
+    spec = importlib.util.spec_from_file_location("pdvstate_bench_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    logging.getLogger().setLevel(logging.WARNING)
+    return module.app
+
+
+def _cleanup(redis_url: str, lojas: range):
+    client = redis.Redis.from_url(redis_url)
+    patterns = [f"pdv:{loja}:*" for loja in lojas] + ["venda:BENCH-*"]
+    for pattern in patterns:
+        keys = list(client.scan_iter(pattern, count=1000))
+        for i in range(0, len(keys), 500):
+            client.delete(*keys[i:i + 500])
+    client.close()
+
+
+def _cupom(loja: int, pdv: int, venda: int) -> str:
+    return f"BENCH-{loja}-{pdv}-{venda}"
+
+
+async def _send_batch(client: httpx.AsyncClient, batch: list, opts) -> list[str]:
+    if opts.ndjson:
+        resp = await client.post("/pdv/events", content="\n".join(json.dumps(e) for e in batch),
+                                 headers={"Content-Type": "application/x-ndjson"})
+    else:
+        resp = await client.post("/pdv/events", json=batch)
+    if resp.status_code != 200:
+        return [f"lote de {len(batch)}: HTTP {resp.status_code} {resp.text[:200]}"]
+    return [f"{e['event_type']}: {r['erro']}" for e, r in zip(batch, resp.json()["resultados"]) if "erro" in r]
+
+
+async def _pdv(client: httpx.AsyncClient, loja: int, pdv: int, opts, latencies: list, errors: list):
+    batch = []
+
+    async def flush():
+        start = time.perf_counter()
+        try:
+            errors.extend(await _send_batch(client, batch, opts))
+        except httpx.HTTPError as e:
+            errors.append(f"lote {loja}-{pdv}: {e}")
+        latencies.append(time.perf_counter() - start)
+        batch.clear()
+
+    async def post(event_type: str, data: dict | None = None):
+        event = {"loja_id": loja, "pdv_id": pdv, "event_type": event_type, "data": data or {}}
+        if opts.lote:
+            batch.append(event)
+            if len(batch) >= opts.lote:
+                await flush()
+            return
+        start = time.perf_counter()
+        try:
+            resp = await client.post("/pdv/event", json=event)
+            if resp.status_code != 200:
+                errors.append(f"{event_type} {loja}-{pdv}: HTTP {resp.status_code}")
+        except httpx.HTTPError as e:
+            errors.append(f"{event_type} {loja}-{pdv}: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    await post("UPDATE_OPERADOR", {"operador_id": str(pdv * 10)})
+    for venda in range(opts.vendas):
+        await post("INICIO_VENDA")
+        await post("VENDA_CUPOM", {"cupom_fiscal": _cupom(loja, pdv, venda)})
+        await post("VENDA_DETALHES", {"valor_total": round(10 + venda * 1.5, 2), "qtd_itens": venda + 1})
+        await post("PAGAMENTO_FORMA", {"forma_pagamento": "DINHEIRO"})
+        if opts.erro_cada and venda % opts.erro_cada == opts.erro_cada - 1:
+            await post("ERRO_TEF", {"rc": -1, "msg": "transacao negada"})
+        await post("FIM_VENDA")
+    await post("OPERADOR_LOGOFF")
+    if batch:
+        await flush()
+
+
+async def _check(client: httpx.AsyncClient, lojas: range, opts) -> list[str]:
+    problems = []
+    falhas = opts.vendas // opts.erro_cada if opts.erro_cada else 0
+    for loja in lojas:
+        for pdv in range(1, opts.pdvs + 1):
+            stats = (await client.get(f"/pdv/{loja}/{pdv}/stats")).json()
+            if stats.get("total_vendas") != opts.vendas - falhas:
+                problems.append(f"PDV {loja}-{pdv}: {stats.get('total_vendas')} vendas, esperado {opts.vendas - falhas}")
+    if opts.vendas:
+        venda = (await client.get(f"/venda/{_cupom(lojas[0], 1, 0)}")).json()
+        esperado = {"status": "CONCLUIDA", "valor_total": 10.0, "qtd_itens": 1, "forma_pagamento": "DINHEIRO",
+                    "operador_id": "10", "loja_id": lojas[0], "pdv_id": 1}
+        diferente = {k: venda.get(k) for k, v in esperado.items() if venda.get(k) != v}
+        if diferente:
+            problems.append(f"venda {_cupom(lojas[0], 1, 0)} divergente: {diferente}")
+    return problems
+
+
+def _redis_reads(redis_url: str) -> int:
+    client = redis.Redis.from_url(redis_url)
+    total = client.info("stats")["total_reads_processed"]
+    client.close()
+    return total
+
+
+async def _run(opts, lojas: range):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=opts.lojas * opts.pdvs)
+    if opts.url:
+        client = httpx.AsyncClient(base_url=opts.url, limits=limits, timeout=30)
+        lifespan = None
+    else:
+        app = _load_app(opts.app)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://pdvstate", timeout=30)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+    try:
+        reads = _redis_reads(opts.redis_url)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _pdv(client, loja, pdv, opts, latencies, errors)
+            for loja in lojas for pdv in range(1, opts.pdvs + 1)
+        ))
+        elapsed = time.perf_counter() - start
+        # -1: o próprio INFO da primeira leitura
+        reads = _redis_reads(opts.redis_url) - reads - 1
+        problems = await _check(client, lojas, opts)
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return elapsed, latencies, reads, errors, problems
+
+
+def _event_count(opts) -> int:
+    falhas = opts.vendas // opts.erro_cada if opts.erro_cada else 0
+    return opts.lojas * opts.pdvs * (2 + opts.vendas * 5 + falhas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do pdvstate (POST /pdv/event).")
+    parser.add_argument("--app", default=PDVSTATE_MAIN, help="main.py do pdvstate a testar em processo")
+    parser.add_argument("--url", help="pdvstate já no ar (em vez de --app em processo)")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0", help="Redis para limpar as chaves de teste")
+    parser.add_argument("--lojas", type=int, default=5)
+    parser.add_argument("--pdvs", type=int, default=20, help="PDVs por loja (todos simultâneos)")
+    parser.add_argument("--vendas", type=int, default=20, help="Vendas por PDV")
+    parser.add_argument("--erro-cada", type=int, default=10, help="ERRO_TEF a cada N vendas (0 desliga)")
+    parser.add_argument("--loja-base", type=int, default=90000)
+    parser.add_argument("--lote", type=int, default=0, help="Eventos por POST /pdv/events (0: um POST /pdv/event por evento)")
+    parser.add_argument("--ndjson", action="store_true", help="Envia os lotes como NDJSON")
+    opts = parser.parse_args()
+
+    lojas = range(opts.loja_base, opts.loja_base + opts.lojas)
+    _cleanup(opts.redis_url, lojas)
+    try:
+        elapsed, latencies, reads, errors, problems = asyncio.run(_run(opts, lojas))
+    finally:
+        _cleanup(opts.redis_url, lojas)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    events = _event_count(opts)
+    mode = f"lotes de {opts.lote}{' NDJSON' if opts.ndjson else ''}" if opts.lote else "um evento por requisição"
+    print(f"{opts.url or opts.app} ({mode})")
+    print(f"{opts.lojas * opts.pdvs} PDVs, {events} eventos em {len(latencies)} requisições, {elapsed:.2f} s: "
+          f"{events / elapsed:.0f} eventos/s, p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {p99 * 1000:.1f} ms, máx. {latencies[-1] * 1000:.1f} ms, {len(errors)} erros")
+    print(f"Redis: {reads} idas, {reads / events:.2f} por evento")
+    problems = errors[:5] + problems
+    if problems:
+        print("FALHA: " + "; ".join(problems[:10]))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
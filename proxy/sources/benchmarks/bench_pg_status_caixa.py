@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# benchmarks/bench_pg_status_caixa.py
+"""
+Ponta a ponta contra um PostgreSQL local: cria o banco bench_status_caixa
+(loja, pdv, pdvvalor com --stores x --pdvs PDVs e --coupons registros por
+PDV), roda a consulta de operador do status_caixa em cada endereço de
+--hosts e compara:
+
+  psql  - um subprocesso psql por concentrador, texto separado por '|'
+  cold  - pg_client com pools novos (conexão + PREPARE), como um tick do cron
+  warm  - pg_client com pools e statement preparados reaproveitados
+
+O padrão de --hosts são aliases de loopback (127.0.0.1-4) do mesmo servidor,
+que fazem o papel de 4 concentradores distintos (o pg_hba.conf precisa
+aceitar 127.0.0.0/8). Sai com código 1 se os modos devolverem linhas
+diferentes. O banco é removido no fim, a menos que --keep seja usado.
+
+Uso: python3 benchmarks/bench_pg_status_caixa.py --user postgres --password ... [--port 5432]
+        [--hosts 127.0.0.1,127.0.0.2] [--stores 50 --pdvs 20 --coupons 50] [--runs 5]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+
+import pg_client  # noqa: E402
+from actions.status_caixa import OPERADOR_QUERIES, QUERY  # noqa: E402
+
+BENCH_DB = "bench_status_caixa"
+
+SCHEMA = """
+CREATE TABLE loja (id serial PRIMARY KEY, codigo integer NOT NULL);
+CREATE TABLE pdv (id serial PRIMARY KEY, lojaid integer NOT NULL REFERENCES loja(id), codigo integer NOT NULL);
+CREATE TABLE pdvvalor (pdvid integer NOT NULL REFERENCES pdv(id), coo integer NOT NULL,
+                       tipo integer NOT NULL, operadorid integer);
+INSERT INTO loja (codigo) SELECT g FROM generate_series(1, %(stores)s) g;
+INSERT INTO pdv (lojaid, codigo) SELECT l.id, g FROM loja l, generate_series(1, %(pdvs)s) g;
+INSERT INTO pdvvalor (pdvid, coo, tipo, operadorid)
+SELECT p.id, g, CASE WHEN g %% 3 = 0 THEN 1 ELSE 5 END, (p.id * 7 + g) %% 1000
+FROM pdv p, generate_series(1, %(coupons)s) g;
+ANALYZE;
+"""
+
+
+def _connect(opts, dbname: str):
+    conn = psycopg2.connect(host=opts.hosts[0], port=opts.port, user=opts.user,
+                            password=opts.password, dbname=dbname)
+    conn.autocommit = True
+    return conn
+
+
+def _setup(opts):
+    admin = _connect(opts, opts.maintenance_db)
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+        cur.execute(f"CREATE DATABASE {BENCH_DB}")
+    admin.close()
+    conn = _connect(opts, BENCH_DB)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA, {"stores": opts.stores, "pdvs": opts.pdvs, "coupons": opts.coupons})
+    conn.close()
+
+
+def _teardown(opts):
+    pg_client.close_all()
+    admin = _connect(opts, opts.maintenance_db)
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    admin.close()
+
+
+def _normalize(rows) -> list[tuple]:
+    return [tuple("" if v is None else str(v) for v in row) for row in rows]
+
+
+def run_psql(opts, psql_bin: str) -> list:
+    env = dict(os.environ, PGPASSWORD=opts.password or "")
+    results = []
+    for host in opts.hosts:
+        proc = subprocess.run(
+            [psql_bin, "-h", host, "-U", opts.user, "-d", BENCH_DB, "-p", str(opts.port),
+             "-t", "-A", "-F", "|", "-c", QUERY],
+            capture_output=True, text=True, env=env, check=True,
+        )
+        results.append([tuple(p.strip() for p in line.split("|"))
+                        for line in proc.stdout.splitlines() if line.strip()])
+    return results
+
+
+def run_pg_client(config: dict, hosts: list[str], cold: bool) -> list:
+    if cold:
+        pg_client.close_all()
+    results = pg_client.query_all(config, hosts, OPERADOR_QUERIES["legacy"])
+    for rows in results.values():
+        if isinstance(rows, Exception):
+            raise rows
+    return [_normalize(rows) for rows in results.values()]
+
+
+def _time(fn, runs: int) -> tuple[float, object]:
+    timings, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="status_caixa: psql em subprocesso x pg_client.")
+    parser.add_argument("--hosts", default="127.0.0.1,127.0.0.2,127.0.0.3,127.0.0.4",
+                        help="Concentradores separados por vírgula (o primeiro recebe o banco de teste)")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--maintenance-db", default="postgres")
+    parser.add_argument("--psql", default=shutil.which("psql"), help="Binário do psql (omitido se ausente)")
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--pdvs", type=int, default=20)
+    parser.add_argument("--coupons", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Não remove o banco de teste no fim")
+    opts = parser.parse_args()
+    opts.hosts = [h.strip() for h in opts.hosts.split(",") if h.strip()]
+
+    config = {
+        "DB_PG_USER": opts.user,
+        "DB_PG_PASS": opts.password,
+        "DB_PG_DB": BENCH_DB,
+        "DB_PG_PORT": opts.port,
+    }
+
+    _setup(opts)
+    try:
+        print(f"{opts.stores * opts.pdvs} PDVs, {opts.stores * opts.pdvs * opts.coupons} linhas em pdvvalor, "
+              f"{len(opts.hosts)} concentradores, mediana de {opts.runs} execuções")
+        outputs = {}
+        if opts.psql:
+            elapsed, outputs["psql"] = _time(lambda: run_psql(opts, opts.psql), opts.runs)
+            print(f"psql (subprocesso):       {elapsed * 1000:8.1f} ms")
+        else:
+            print("psql não encontrado; modo psql omitido")
+        elapsed, outputs["cold"] = _time(lambda: run_pg_client(config, opts.hosts, cold=True), opts.runs)
+        print(f"pg_client (pool novo):    {elapsed * 1000:8.1f} ms")
+        elapsed, outputs["warm"] = _time(lambda: run_pg_client(config, opts.hosts, cold=False), opts.runs)
+        print(f"pg_client (pool quente):  {elapsed * 1000:8.1f} ms")
+    finally:
+        if not opts.keep:
+            _teardown(opts)
+
+    reference = outputs["cold"]
+    diverged = [mode for mode, rows in outputs.items() if rows != reference]
+    if diverged:
+        print(f"FALHA: linhas divergentes em {', '.join(diverged)}")
+        sys.exit(1)
+    print(f"OK: {len(reference[0])} PDVs por concentrador, mesmas linhas em todos os modos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# benchmarks/bench_zabbix_sender.py
+"""
+Envia N itens (um por PDV, como o status_caixa) ao trapper falso com o
+ZabbixSender e confere os contadores da resposta; como referência, mede o
+custo só do fork/exec de N processos (o que o zabbix_sender por linha
+pagava antes mesmo de abrir a conexão). Sai com código 1 se algum contador
+divergir.
+
+Uso: python3 benchmarks/bench_zabbix_sender.py [--items 3000] [--unknown 10] [--keep-open]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zabbix_sender import ZabbixSender  # noqa: E402
+from benchmarks.fake_zabbix_trapper import FakeZabbixTrapper  # noqa: E402
+
+
+def _items(count: int) -> list[dict]:
+    return [
+        {"host": f"REDE-LOJA{i // 40 + 1:03d}-PDV{i % 40 + 1:03d}", "key": "pdv.neo.operador_id", "value": str(i)}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZabbixSender em lote contra trapper falso.")
+    parser.add_argument("--items", type=int, default=3000)
+    parser.add_argument("--unknown", type=int, default=10, help="Itens de hosts inexistentes (devem falhar)")
+    parser.add_argument("--batch", type=int, default=250)
+    parser.add_argument("--keep-open", action="store_true", help="Trapper mantém a conexão aberta")
+    parser.add_argument("--fork-baseline", type=int, default=200,
+                        help="Quantos processos 'true' disparar para estimar o custo por fork/exec")
+    opts = parser.parse_args()
+
+    items = _items(opts.items)
+    known = {item["host"] for item in items[opts.unknown:]}
+    trapper = FakeZabbixTrapper(known_hosts=known, keep_open=opts.keep_open).start()
+    host, port = trapper.address
+    try:
+        sender = ZabbixSender(host, port, batch_size=opts.batch)
+        start = time.perf_counter()
+        result = sender.send(items)
+        elapsed = time.perf_counter() - start
+        sender.close()
+    finally:
+        trapper.stop()
+
+    print(f"ZabbixSender: {len(items)} itens em {elapsed * 1000:.1f} ms "
+          f"({result.requests} requisições, {trapper.connections} conexões) -> {result}")
+
+    if opts.fork_baseline > 0:
+        start = time.perf_counter()
+        for _ in range(opts.fork_baseline):
+            subprocess.run(["true"], check=False)
+        per_fork = (time.perf_counter() - start) / opts.fork_baseline
+        print(f"Referência fork/exec: {per_fork * 1000:.2f} ms por processo, "
+              f"~{per_fork * len(items):.1f} s para {len(items)} processos (sem rede)")
+
+    expected_requests = -(-len(items) // max(1, opts.batch))
+    problems = []
+    if (result.processed, result.failed, result.total) != (len(items) - opts.unknown, opts.unknown, len(items)):
+        problems.append(f"contadores inesperados: {result}")
+    if result.requests != expected_requests:
+        problems.append(f"{result.requests} requisições, esperado {expected_requests}")
+    if len(trapper.items) != len(items) - opts.unknown:
+        problems.append(f"trapper recebeu {len(trapper.items)} itens aceitos")
+    if opts.keep_open and trapper.connections != 1:
+        problems.append(f"{trapper.connections} conexões com keep-open, esperado 1")
+    if problems:
+        print("FALHA: " + "; ".join(problems))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# benchmarks/compare_host_query.py
+"""
+Compara a consulta planejada de get_hosts (um host.get) com a legada (três
+etapas) contra um servidor Zabbix falso alimentado por um fixture gravado.
+Sai com código 1 se as listas de hosts divergirem.
+
+Gravar fixture a partir do servidor real (usa /ariusmonitor/config_bot.json):
+    python3 benchmarks/compare_host_query.py --record fixture.json
+Comparar:
+    python3 benchmarks/compare_host_query.py --fixture fixture.json [--loja 001] [--pdv 201]
+Sem --fixture, gera uma rede sintética (--synthetic N hosts).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zabbix_client  # noqa: E402
+from benchmarks.fake_zabbix_server import FakeZabbixServer  # noqa: E402
+
+CONFIG_PATH = "/ariusmonitor/config_bot.json"
+
+
+def _record(path: str):
+    with open(CONFIG_PATH) as f:
+        config = json.load(f)
+    config["PARAM_ZABBIX_CACHE_TTL"] = 0
+    response = zabbix_client.get_client(config).call("host.get", {
+        "output": ["hostid", "host", "status", "available"],
+        "selectParentTemplates": ["templateid"],
+        "selectInterfaces": ["ip", "port"],
+        "selectInventory": ["notes"],
+    }, use_cache=False)
+    hosts = response.get("result", [])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rede": config.get("PARAM_REDE", ""),
+                   "exclude_template_ids": config.get("EXCLUDE_TEMPLATE_IDS", []),
+                   "hosts": hosts}, f)
+    print(f"{len(hosts)} hosts gravados em {path}")
+
+
+def _synthetic(count: int) -> dict:
+    hosts = []
+    kinds = ["PDV", "SELF", "CONCENTRADOR", "SERVIDOR", "BALANCA"]
+    for i in range(count):
+        loja = (i // 40) + 1
+        kind = kinds[i % len(kinds)]
+        hosts.append({
+            "hostid": str(10000 + i),
+            "host": f"REDE-LOJA{loja:03d}-{kind}{(i % 40) + 201:03d}",
+            "status": "0" if i % 17 else "1",
+            "available": "1" if i % 11 else "2",
+            "parentTemplates": [{"templateid": "10543"}] + ([{"templateid": "99999"}] if i % 13 == 0 else []),
+            "interfaces": [{"ip": f"10.{loja % 250}.0.{i % 250}", "port": "10050"}],
+            "inventory": {"notes": "root,senha,22"},
+        })
+    return {"rede": "REDE", "exclude_template_ids": ["99999"], "hosts": hosts}
+
+
+def _run(strategy: str, server: FakeZabbixServer, config: dict, filters: dict):
+    config = dict(config, PARAM_ZABBIX_HOST_QUERY=strategy)
+    server.reset_counters()
+    start = time.perf_counter()
+    hosts = zabbix_client.get_hosts(config, filters)
+    elapsed = time.perf_counter() - start
+    return hosts, elapsed, server.requests, server.response_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta planejada x legada do get_hosts.")
+    parser.add_argument("--record", metavar="ARQUIVO", help="Grava fixture a partir do Zabbix real")
+    parser.add_argument("--fixture", help="Fixture JSON gravado com --record")
+    parser.add_argument("--synthetic", type=int, default=5000, help="Hosts sintéticos quando não há fixture")
+    parser.add_argument("--loja")
+    parser.add_argument("--pdv")
+    parser.add_argument("--agent-status", type=int, choices=[0, 1, 2])
+    opts = parser.parse_args()
+
+    if opts.record:
+        _record(opts.record)
+        return
+
+    logging.basicConfig(level=logging.CRITICAL)
+    if opts.fixture:
+        with open(opts.fixture, encoding="utf-8") as f:
+            fixture = json.load(f)
+    else:
+        fixture = _synthetic(opts.synthetic)
+
+    server = FakeZabbixServer(fixture["hosts"]).start()
+    config = {
+        "PARAM_ZABBIX_SERVER": "fake",
+        "PARAM_TOKEN": "fake",
+        "PARAM_REDE": fixture.get("rede", ""),
+        "EXCLUDE_TEMPLATE_IDS": fixture.get("exclude_template_ids", []),
+    }
+    zabbix_client._clients[("fake", "fake")] = zabbix_client.ZabbixClient(server.url, "fake", cache_ttl=0)
+    filters = {"loja": opts.loja, "pdv": opts.pdv, "agent_status": opts.agent_status}
+
+    try:
+        results = {}
+        print(f"{'estrategia':<10} {'hosts':>6} {'reqs':>5} {'bytes':>10} {'segundos':>9}")
+        for strategy in ("legacy", "planned"):
+            hosts, elapsed, reqs, size = _run(strategy, server, config, filters)
+            results[strategy] = hosts
+            print(f"{strategy:<10} {len(hosts):>6} {reqs:>5} {size:>10} {elapsed:>9.3f}")
+    finally:
+        server.stop()
+
+    key = lambda h: h["host"]  # noqa: E731
+    if sorted(results["legacy"], key=key) != sorted(results["planned"], key=key):
+        legacy_names = {h["host"] for h in results["legacy"]}
+        planned_names = {h["host"] for h in results["planned"]}
+        print(f"DIVERGENCIA: só legacy={sorted(legacy_names - planned_names)[:20]} "
+              f"só planned={sorted(planned_names - legacy_names)[:20]}")
+        sys.exit(1)
+    print("OK: resultados idênticos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# benchmarks/explain_status_caixa.py
+"""
+Confere o índice de apoio do status_caixa e compara as estratégias de
+consulta (PARAM_STATUS_CAIXA_QUERY) com EXPLAIN (ANALYZE, BUFFERS) em cada
+concentrador: tempo de execução (mediana de --runs), blocos lidos do cache
+e do disco, linhas e custo estimado. Também confere que todas as
+estratégias devolvem o mesmo operador por PDV.
+
+Por padrão lê concentradores e credenciais de /ariusmonitor/config_bot.json
+(PARAM_IP_CONCENTRADORES, DB_PG_*); --hosts/--user/--password/--db/--port
+sobrescrevem. EXPLAIN ANALYZE executa a consulta de verdade: em produção o
+custo é o de uma execução do status_caixa por estratégia e por --runs.
+
+Uso:
+    python3 benchmarks/explain_status_caixa.py --check-index    # só o índice; status 1 se faltar
+    python3 benchmarks/explain_status_caixa.py [--strategies legacy,lateral] [--runs 3] [--no-analyze]
+Índice: proxy/postgresql/status_caixa.pdvvalor_index.sql
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+
+from actions.status_caixa import OPERADOR_QUERIES  # noqa: E402
+
+CONFIG_PATH = "/ariusmonitor/config_bot.json"
+
+INDEX_SQL = """
+SELECT c.relname,
+       i.indisvalid,
+       ARRAY(
+           SELECT a.attname::text
+           FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+           JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+           ORDER BY k.ord
+       ),
+       pg_get_expr(i.indpred, i.indrelid)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_class t ON t.oid = i.indrelid
+WHERE t.relname = 'pdvvalor'
+  AND pg_table_is_visible(t.oid)
+"""
+
+
+def supporting_indexes(cur) -> tuple[list, list]:
+    """
+    ([índices válidos que atendem distinct_on/lateral], [todos os índices do pdvvalor]).
+    """
+    cur.execute(INDEX_SQL)
+    indexes = cur.fetchall()
+    usable = [
+        (name, columns, predicate)
+        for name, valid, columns, predicate in indexes
+        if valid and (columns[:2] == ["pdvid", "coo"] or columns[:3] == ["tipo", "pdvid", "coo"])
+    ]
+    return usable, indexes
+
+
+def explain(cur, sql: str, analyze: bool, runs: int) -> dict:
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    samples = []
+    for _ in range(max(1, runs if analyze else 1)):
+        cur.execute(f"EXPLAIN ({options}) {sql}")
+        raw = cur.fetchone()[0]
+        samples.append(raw[0] if isinstance(raw, list) else json.loads(raw)[0])
+    plan = samples[-1]["Plan"]
+    result = {"cost": plan.get("Total Cost"), "node": plan.get("Node Type")}
+    if analyze:
+        result.update(
+            ms=statistics.median(s["Execution Time"] for s in samples),
+            rows=plan.get("Actual Rows"),
+            hit=plan.get("Shared Hit Blocks", 0),
+            read=plan.get("Shared Read Blocks", 0),
+        )
+    return result
+
+
+def operators(cur, sql: str) -> dict:
+    cur.execute(sql)
+    return {(str(loja), str(pdv)): op for loja, pdv, op in cur.fetchall()}
+
+
+def _check_host(cur, opts, strategies: list[str]) -> list[str]:
+    failures = []
+    usable, indexes = supporting_indexes(cur)
+    for name, columns, predicate in usable:
+        print(f"   índice OK: {name} ({', '.join(columns)}){f' WHERE {predicate}' if predicate else ''}")
+    if not usable:
+        print("   índice de apoio AUSENTE (proxy/postgresql/status_caixa.pdvvalor_index.sql)")
+        print(f"   índices existentes: {', '.join(i[0] for i in indexes) or 'nenhum'}")
+        failures.append("índice ausente")
+    if opts.check_index:
+        return failures
+
+    print(f"   {'estratégia':<12} {'exec (ms)':>10} {'hit':>9} {'read':>9} {'linhas':>7} {'custo':>12}  nó")
+    reference = None
+    for strategy in strategies:
+        sql = OPERADOR_QUERIES[strategy].statement
+        try:
+            stats = explain(cur, sql, analyze=not opts.no_analyze, runs=opts.runs)
+        except psycopg2.Error as e:
+            print(f"   {strategy:<12} erro: {str(e).strip()}")
+            failures.append(f"{strategy} falhou")
+            continue
+        if opts.no_analyze:
+            print(f"   {strategy:<12} {'-':>10} {'-':>9} {'-':>9} {'-':>7} {stats['cost']:>12.0f}  {stats['node']}")
+            continue
+        print(
+            f"   {strategy:<12} {stats['ms']:>10.1f} {stats['hit']:>9} {stats['read']:>9} "
+            f"{stats['rows']:>7} {stats['cost']:>12.0f}  {stats['node']}"
+        )
+        result = operators(cur, sql)
+        if reference is None:
+            reference = (strategy, result)
+        elif result != reference[1]:
+            print(f"   {strategy}: resultado DIFERENTE de {reference[0]}")
+            failures.append(f"{strategy} diverge")
+    return failures
+
+
+def _load_config(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice e EXPLAIN das consultas do status_caixa.")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--hosts", help="Concentradores separados por vírgula")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--db")
+    parser.add_argument("--strategies", default=",".join(OPERADOR_QUERIES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-analyze", action="store_true", help="Só o plano estimado, sem executar")
+    parser.add_argument("--check-index", action="store_true", help="Só confere o índice (status 1 se faltar)")
+    parser.add_argument("--statement-timeout", type=int, default=300, help="Segundos por consulta")
+    opts = parser.parse_args()
+
+    config = _load_config(opts.config)
+    hosts = [h.strip() for h in opts.hosts.split(",")] if opts.hosts else config.get("PARAM_IP_CONCENTRADORES") or []
+    strategies = [s.strip() for s in opts.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in OPERADOR_QUERIES]
+    if not hosts or unknown:
+        parser.error(f"sem concentradores ou estratégia desconhecida: {unknown}")
+
+    failures = []
+    for host in hosts:
+        print(f"== {host}")
+        try:
+            conn = psycopg2.connect(
+                host=host,
+                port=opts.port or int(config.get("DB_PG_PORT", 5432)),
+                user=opts.user or config.get("DB_PG_USER") or config.get("DB_USER"),
+                password=opts.password if opts.password is not None else (config.get("DB_PG_PASS") or config.get("DB_PASS")),
+                dbname=opts.db or config.get("DB_PG_DB"),
+                connect_timeout=10,
+                options=f"-c statement_timeout={opts.statement_timeout * 1000}",
+            )
+        except psycopg2.Error as e:
+            print(f"   falha de conexão: {str(e).strip()}")
+            failures.append(f"{host}: conexão")
+            continue
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                failures.extend(f"{host}: {f}" for f in _check_host(cur, opts, strategies))
+        finally:
+            conn.close()
+
+    if failures:
+        print("\nFALHA: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
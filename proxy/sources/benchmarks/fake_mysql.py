@@ -0,0 +1,65 @@
+# benchmarks/fake_mysql.py
+"""
+Conexão MySQL falsa para benchmarks do pipeline de BI. Gera as linhas da
+tabela nfce sob demanda, como um servidor entregando um resultado em stream;
+com buffered=True (padrão do mysql.connector) o cursor materializa tudo no
+execute, como o driver real faz.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BASE_TS = datetime(2024, 1, 1)
+
+
+def nfce_row(i: int) -> tuple:
+    ts = BASE_TS + timedelta(seconds=i)
+    chave = f"35240112345678000190{65:02d}{i:024d}"[:44]
+    return (
+        100 + i % 50, ts, 1 + i % 30, 100000 + i, 0,
+        chave, Decimal("1.10"), Decimal("0.00"), Decimal("0.20"), Decimal("0.00"),
+        Decimal("0.90"), Decimal("0.00"), Decimal("0.00"), Decimal("0.00"), 0, 100,
+    )
+
+
+class FakeCursor:
+    def __init__(self, rows: int, buffered: bool, make_row=nfce_row):
+        self._rows = rows
+        self._buffered = buffered
+        self._make_row = make_row
+        self._iter = None
+        self._buffer = None
+
+    def execute(self, sql: str, params=None):
+        if sql.lstrip().upper().startswith("SET "):
+            return
+        self._iter = (self._make_row(i) for i in range(self._rows))
+        if self._buffered:
+            self._buffer = list(self._iter)
+            self._iter = iter(self._buffer)
+
+    def fetchall(self) -> list:
+        return list(self._iter)
+
+    def fetchmany(self, size: int = 1) -> list:
+        out = []
+        for row in self._iter:
+            out.append(row)
+            if len(out) >= size:
+                break
+        return out
+
+    def close(self):
+        self._iter = None
+        self._buffer = None
+
+
+class FakeConnection:
+    def __init__(self, rows: int, make_row=nfce_row):
+        self.rows = rows
+        self.make_row = make_row
+
+    def cursor(self, buffered: bool = True, dictionary: bool = False):
+        return FakeCursor(self.rows, buffered, self.make_row)
+
+    def close(self):
+        pass
@@ -0,0 +1,114 @@
+# benchmarks/fake_ssh_server.py
+"""
+Servidor SSH falso (paramiko) para benchmarks locais do executor de frota.
+Aceita qualquer usuário/senha e responde a 'exec' com saída fixa ou, com
+execute_local=True, executando o comando via 'sh -c' na própria máquina.
+"""
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+
+class _FakeServer(paramiko.ServerInterface):
+    def __init__(self):
+        self.command = None
+        self.event = threading.Event()
+
+    def check_channel_request(self, kind, chanid):
+        if kind in ("session",):
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_subsystem_request(self, channel, name):
+        return super().check_channel_subsystem_request(channel, name)
+
+    def check_channel_exec_request(self, channel, command):
+        self.command = command.decode(errors="ignore")
+        self.event.set()
+        return True
+
+
+class FakeSSHServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 execute_local: bool = False, backlog: int = 4096):
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.latency = latency
+        self.execute_local = execute_local
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(backlog)
+        self.address = self._sock.getsockname()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        try:
+            transport.start_server(server=_FakeServer())
+            while transport.is_active():
+                channel = transport.accept(timeout=30)
+                if channel is None:
+                    break
+                threading.Thread(target=self._serve_channel, args=(channel,), daemon=True).start()
+        except Exception:
+            pass
+        finally:
+            transport.close()
+
+    def _serve_channel(self, channel):
+        server = channel.get_transport().server_object
+        if not server.event.wait(10):
+            channel.close()
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if self.execute_local:
+            result = subprocess.run(["sh", "-c", server.command], capture_output=True)
+            channel.sendall(result.stdout)
+            channel.sendall_stderr(result.stderr)
+            channel.send_exit_status(result.returncode)
+        else:
+            channel.sendall(b"ok\n")
+            channel.send_exit_status(0)
+        server.event.clear()
+        try:
+            channel.close()
+        except EOFError:
+            pass
@@ -0,0 +1,118 @@
+# benchmarks/fake_zabbix_server.py
+"""
+Servidor JSON-RPC falso que responde host.get a partir de um fixture gravado
+(lista de hosts com parentTemplates, interfaces e inventory), aplicando
+hostids, filter, search (com ou sem searchWildcardsEnabled) e os selects.
+Conta requisições e bytes de resposta para comparar estratégias de consulta.
+"""
+import fnmatch
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SELECTS = {
+    "selectParentTemplates": "parentTemplates",
+    "selectInterfaces": "interfaces",
+    "selectInventory": "inventory",
+}
+
+
+def _project(obj, fields):
+    if fields == "extend":
+        return dict(obj)
+    if isinstance(obj, list):
+        return [_project(item, fields) for item in obj]
+    if isinstance(obj, dict):
+        return {k: v for k, v in obj.items() if k in fields}
+    return obj
+
+
+def _matches_search(value: str, patterns, wildcards: bool) -> bool:
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    value = (value or "").lower()
+    for pattern in patterns:
+        pattern = pattern.lower()
+        if wildcards:
+            if fnmatch.fnmatchcase(value, pattern):
+                return True
+        elif pattern in value:
+            return True
+    return False
+
+
+def host_get(hosts: list[dict], params: dict) -> list[dict]:
+    result = []
+    hostids = {str(h) for h in params.get("hostids", [])} or None
+    wildcards = bool(params.get("searchWildcardsEnabled"))
+    for host in hosts:
+        if hostids is not None and str(host.get("hostid")) not in hostids:
+            continue
+        if any(str(host.get(k)) not in ([str(x) for x in v] if isinstance(v, list) else [str(v)])
+               for k, v in params.get("filter", {}).items()):
+            continue
+        if any(not _matches_search(host.get(k, ""), v, wildcards) for k, v in params.get("search", {}).items()):
+            continue
+        item = _project(host, params.get("output", ["hostid"]))
+        for select, key in SELECTS.items():
+            if select in params:
+                item[key] = _project(host.get(key, [] if key != "inventory" else {}), params[select])
+        result.append(item)
+    return result
+
+
+class FakeZabbixServer:
+    def __init__(self, hosts: list[dict], host: str = "127.0.0.1", port: int = 0):
+        self.hosts = hosts
+        self.requests = 0
+        self.response_bytes = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                payload = json.loads(body)
+                if payload.get("method") == "host.get":
+                    response = {"jsonrpc": "2.0", "result": host_get(server.hosts, payload.get("params", {}))}
+                else:
+                    response = {"jsonrpc": "2.0", "error": {"code": -32601, "message": "Method not found."}}
+                response["id"] = payload.get("id")
+                out = json.dumps(response).encode("utf-8")
+                with server._lock:
+                    server.requests += 1
+                    server.response_bytes += len(out)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api_jsonrpc.php"
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.response_bytes = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,83 @@
+# benchmarks/fake_zabbix_trapper.py
+"""
+Trapper Zabbix falso (protocolo ZBXD "sender data") para benchmarks e
+verificação do zabbix_sender.py. Aceita itens só de hosts em 'known_hosts'
+(None = todos) e responde com a linha "processed/failed/total" do servidor
+real. Com keep_open=False fecha a conexão após cada resposta, como o
+trapper do Zabbix faz; com True atende várias requisições por conexão.
+"""
+import json
+import socketserver
+import struct
+import threading
+import time
+
+_HEADER = struct.Struct("<4sBQ")
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return b""
+        data += chunk
+    return data
+
+
+class FakeZabbixTrapper:
+    def __init__(self, known_hosts: set | None = None, keep_open: bool = False,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.known_hosts = known_hosts
+        self.keep_open = keep_open
+        self.items = []
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        trapper = self
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with trapper._lock:
+                    trapper.connections += 1
+                while True:
+                    header = _recv_exact(self.request, _HEADER.size)
+                    if not header:
+                        return
+                    magic, _, length = _HEADER.unpack(header)
+                    if magic != b"ZBXD":
+                        return
+                    payload = json.loads(_recv_exact(self.request, length))
+                    self.request.sendall(trapper._answer(payload))
+                    if not trapper.keep_open:
+                        return
+
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _answer(self, payload: dict) -> bytes:
+        start = time.perf_counter()
+        data = payload.get("data", []) if payload.get("request") == "sender data" else []
+        accepted = [d for d in data if self.known_hosts is None or d.get("host") in self.known_hosts]
+        with self._lock:
+            self.requests += 1
+            self.items.extend(accepted)
+        info = (
+            f"processed: {len(accepted)}; failed: {len(data) - len(accepted)}; "
+            f"total: {len(data)}; seconds spent: {time.perf_counter() - start:.6f}"
+        )
+        body = json.dumps({"response": "success", "info": info}).encode("utf-8")
+        return _HEADER.pack(b"ZBXD", 1, len(body)) + body
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
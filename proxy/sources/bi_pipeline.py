@@ -0,0 +1,339 @@
+# bi_pipeline.py
+"""
+Pipeline de extração dos concentradores (MySQL retag) para o BI.
+
+As consultas rodam em cursor não-bufferizado e são lidas com fetchmany, em
+geradores encadeados: linhas -> itens -> lotes de tamanho fixo. Só um bloco
+de fetch e um lote ficam em memória, qualquer que seja o intervalo de datas.
+
+run_concentrators extrai de vários concentradores em paralelo e entrega os
+lotes a uma fila limitada consumida pelos workers de envio, de modo que um
+concentrador lento não segura os demais. O envio é feito pelo BIUploader,
+numa sessão HTTPS persistente compartilhada pelos workers.
+"""
+import gzip
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Timeout
+
+from utils import config_flag
+
+DEFAULT_FETCH_SIZE = 1000
+# Com cursor não-bufferizado o servidor espera o cliente consumir o resultado;
+# o envio de um lote ao BI pode passar do net_write_timeout padrão (60s).
+DEFAULT_NET_WRITE_TIMEOUT = 600
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CONCENTRATOR_TIMEOUT = 900
+DEFAULT_UPLOAD_QUEUE_SIZE = 8
+DEFAULT_UPLOAD_WORKERS = 2
+DEFAULT_UPLOAD_TIMEOUT = 30
+_QUEUE_POLL = 1.0
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class ConcentratorTimeout(Exception):
+    pass
+
+
+class UploadResult(NamedTuple):
+    """
+    Resultado de BIUploader.send; vale como bool (True somente com 200).
+    status é None quando não houve resposta (timeout, conexão).
+    """
+    ok: bool
+    status: int | None = None
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def permanent(self) -> bool:
+        # 4xx, exceto timeout (408) e limite de taxa (429): reenviar não adianta
+        return self.status is not None and 400 <= self.status < 500 and self.status not in (408, 429)
+
+
+class Batch(list):
+    """
+    Lote de itens. Com row_mark, 'mark' guarda a marca (ts, chave) da última
+    linha do lote e 'seq' a ordem de extração (ver bi_watermark).
+    """
+    mark = None
+    seq = None
+
+
+def fetch_size(config: dict) -> int:
+    return max(1, int(config.get("PARAM_BI_FETCH_SIZE", DEFAULT_FETCH_SIZE)))
+
+
+def stream_rows(conn, sql: str, config: dict, dictionary: bool = False, params=None) -> Iterator:
+    """
+    Executa 'sql' em cursor não-bufferizado e produz as linhas em blocos de
+    PARAM_BI_FETCH_SIZE. O cursor é fechado ao esgotar ou abandonar o gerador.
+    """
+    net_write_timeout = int(config.get("PARAM_BI_NET_WRITE_TIMEOUT", DEFAULT_NET_WRITE_TIMEOUT))
+    size = fetch_size(config)
+
+    cursor = conn.cursor(buffered=False, dictionary=dictionary)
+    try:
+        if net_write_timeout > 0:
+            cursor.execute(f"SET SESSION net_write_timeout = {net_write_timeout}")
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            # Resultado não consumido (gerador abandonado); a conexão é descartada pelo chamador.
+            pass
+
+
+def map_rows(rows: Iterable, row_to_item: Callable, on_error: Callable | None = None,
+             row_mark: Callable | None = None) -> Iterator:
+    """
+    Converte linhas em itens. Sem 'on_error', erros de conversão propagam;
+    com 'on_error(row, exc)', a linha é descartada e o fluxo continua.
+    Com 'row_mark', produz pares (item, marca).
+    """
+    for row in rows:
+        try:
+            item = row_to_item(row)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(row, e)
+            continue
+        yield (item, row_mark(row)) if row_mark else item
+
+
+def batched(items: Iterable, batch_size: int, marked: bool = False) -> Iterator[Batch]:
+    batch = Batch()
+    for item in items:
+        if marked:
+            item, batch.mark = item
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = Batch()
+    if batch:
+        yield batch
+
+
+def extract_batches(conn, sql: str, config: dict, row_to_item: Callable, batch_size: int,
+                    dictionary: bool = False, on_error: Callable | None = None,
+                    params=None, row_mark: Callable | None = None) -> Iterator[Batch]:
+    """
+    Atalho para stream_rows -> map_rows -> batched.
+    """
+    rows = stream_rows(conn, sql, config, dictionary=dictionary, params=params)
+    return batched(map_rows(rows, row_to_item, on_error, row_mark), batch_size, marked=row_mark is not None)
+
+
+def upload_workers(config: dict) -> int:
+    return max(1, int(config.get("PARAM_BI_UPLOAD_WORKERS", DEFAULT_UPLOAD_WORKERS)))
+
+
+class UploadDeadline(Exception):
+    pass
+
+
+class _DeadlineBody:
+    """
+    Corpo do POST entregue em blocos ao urllib3 (com Content-Length, sem
+    chunked); interrompe o envio quando o prazo do lote acaba.
+    """
+
+    def __init__(self, data: bytes, deadline: float):
+        self._data = io.BytesIO(data)
+        self._length = len(data)
+        self.deadline = deadline
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if time.monotonic() > self.deadline:
+            raise UploadDeadline("prazo esgotado durante o envio do lote")
+        return self._data.read(size if size and size > 0 else UPLOAD_BLOCK_SIZE)
+
+
+class BIUploader:
+    """
+    Envio de lotes ao BI numa sessão keep-alive (certificado PARAM_BI_CERTI_PATH),
+    segura para uso simultâneo pelos PARAM_BI_UPLOAD_WORKERS workers de
+    run_concentrators. PARAM_BI_GZIP=true comprime o corpo (Content-Encoding: gzip).
+
+    'timeout' é um prazo de relógio por lote, sem subprocesso: conexão e espera
+    pelo cabeçalho da resposta ficam no Timeout(total) do urllib3, que desconta
+    o tempo já gasto; o envio do corpo e a leitura da resposta são conferidos
+    contra o prazo a cada bloco. Uma operação de socket parada no meio de um
+    bloco só é cortada pelo próprio timeout dela (conexão: até 10s).
+    """
+
+    def __init__(self, config: dict, path: str, logger: logging.Logger,
+                 timeout: float = DEFAULT_UPLOAD_TIMEOUT, debug: bool = False):
+        self.url = f"https://{config['PARAM_BI_SERVER']}{path}"
+        self.logger = logger
+        self.debug = debug
+        self.gzip_body = config_flag(config, "PARAM_BI_GZIP")
+        self.timeout = Timeout(connect=min(10.0, timeout), read=timeout, total=timeout)
+        self.timeout_seconds = timeout
+
+        pool_size = upload_workers(config)
+        self.session = requests.Session()
+        self.session.verify = config["PARAM_BI_CERTI_PATH"]
+        self.session.headers.update({
+            "Authorization": f"Bearer {config['PARAM_TOKEN_BI']}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+
+    def send(self, batch: list) -> UploadResult:
+        """
+        Envia um lote; o resultado é verdadeiro somente quando o BI responde 200.
+        """
+        if self.debug:
+            self.logger.debug("Lote enviado (debug): %s", json.dumps(batch, ensure_ascii=False)[:2000])
+
+        body = json.dumps(batch, ensure_ascii=False).encode("utf-8")
+        headers = {}
+        if self.gzip_body:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        deadline = time.monotonic() + self.timeout_seconds
+        try:
+            with self.session.post(self.url, data=_DeadlineBody(body, deadline), headers=headers,
+                                   timeout=self.timeout, stream=True) as r:
+                # read1 devolve o que já chegou (iter_content esperaria o bloco
+                # inteiro): uma resposta gotejada não segura o lote além do prazo
+                content = b""
+                while chunk := r.raw.read1(UPLOAD_BLOCK_SIZE, decode_content=True):
+                    if time.monotonic() > deadline:
+                        raise UploadDeadline("prazo esgotado lendo a resposta do BI")
+                    content += chunk
+                status = r.status_code
+                encoding = r.encoding or "utf-8"
+        except (requests.Timeout, UploadDeadline):
+            self.logger.error(f"Envio de lote excedeu o timeout de {self.timeout_seconds:.0f}s.")
+            return UploadResult(False)
+        except Exception as e:
+            self.logger.error(f"Falha ao enviar lote: {e}")
+            return UploadResult(False)
+
+        if status == 200:
+            self.logger.info(f"Lote enviado: {len(batch)} registros.")
+            return UploadResult(True, status)
+        self.logger.error(f"Erro {status} ao enviar lote: {content.decode(encoding, errors='replace')}")
+        return UploadResult(False, status)
+
+    def close(self):
+        self.session.close()
+
+
+def concurrency(config: dict, total: int) -> int:
+    return max(1, min(int(config.get("PARAM_BI_CONCURRENCY", DEFAULT_CONCURRENCY)), total or 1))
+
+
+def _put_until(q: queue.Queue, item, deadline: float):
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ConcentratorTimeout("tempo limite atingido aguardando a fila de envio")
+        try:
+            q.put(item, timeout=min(_QUEUE_POLL, remaining))
+            return
+        except queue.Full:
+            continue
+
+
+def run_concentrators(hosts: list, extract: Callable, send: Callable, config: dict,
+                      logger: logging.Logger, on_error: Callable | None = None) -> dict:
+    """
+    Executa extract(host) -> iterável de lotes para cada concentrador, com até
+    PARAM_BI_CONCURRENCY em paralelo, e chama send(host, lote) nos workers de
+    envio (PARAM_BI_UPLOAD_WORKERS) através de uma fila de PARAM_BI_UPLOAD_QUEUE
+    lotes.
+
+    PARAM_BI_CONCENTRATOR_TIMEOUT limita o tempo de cada concentrador; é
+    verificado entre lotes e na espera pela fila (a consulta em si é limitada
+    pelos timeouts da conexão). Erros e timeouts vão para on_error(host, exc).
+
+    Retorna {host: {"rows", "batches", "elapsed", "error"}}.
+    """
+    timeout = float(config.get("PARAM_BI_CONCENTRATOR_TIMEOUT", DEFAULT_CONCENTRATOR_TIMEOUT))
+    upload_queue = queue.Queue(maxsize=max(1, int(config.get("PARAM_BI_UPLOAD_QUEUE", DEFAULT_UPLOAD_QUEUE_SIZE))))
+    results = {host: {"rows": 0, "batches": 0, "elapsed": 0.0, "error": None} for host in hosts}
+
+    def _uploader():
+        while True:
+            item = upload_queue.get()
+            try:
+                if item is None:
+                    return
+                host, batch = item
+                send(host, batch)
+            except Exception as e:
+                logger.error(f"Falha inesperada no envio de lote: {e}")
+            finally:
+                upload_queue.task_done()
+
+    def _extract(host):
+        start = time.monotonic()
+        deadline = start + timeout if timeout > 0 else float("inf")
+        result = results[host]
+        batches = None
+        try:
+            batches = iter(extract(host))
+            for batch in batches:
+                if time.monotonic() > deadline:
+                    raise ConcentratorTimeout(f"tempo limite de {timeout:.0f}s excedido")
+                _put_until(upload_queue, (host, batch), deadline)
+                result["batches"] += 1
+                result["rows"] += len(batch)
+        except Exception as e:
+            result["error"] = str(e)
+            if on_error is not None:
+                on_error(host, e)
+            else:
+                logger.error(f"Erro no concentrador {host}: {e}")
+        finally:
+            # Fecha o gerador abandonado (cursor/conexão) no próprio worker
+            if hasattr(batches, "close"):
+                try:
+                    batches.close()
+                except Exception:
+                    pass
+            result["elapsed"] = time.monotonic() - start
+
+    workers = concurrency(config, len(hosts))
+    logger.info(f"Extraindo de {len(hosts)} concentradores com até {workers} em paralelo...")
+    uploaders = [
+        threading.Thread(target=_uploader, name=f"bi-upload-{i}", daemon=True)
+        for i in range(upload_workers(config))
+    ]
+    for t in uploaders:
+        t.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bi-extract") as executor:
+            list(executor.map(_extract, hosts))
+    finally:
+        for _ in uploaders:
+            upload_queue.put(None)
+        for t in uploaders:
+            t.join()
+    return results
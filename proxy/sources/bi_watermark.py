@@ -0,0 +1,257 @@
+# bi_watermark.py
+"""
+Marca d'água (high-water mark) por fluxo e concentrador para a coleta
+incremental do BI: (timestamp, chave de desempate) da última linha cujo lote
+o BI confirmou.
+
+Os lotes de um concentrador são enviados em paralelo e podem ser confirmados
+fora de ordem; o WatermarkTracker só avança sobre o prefixo contíguo de lotes
+confirmados, então uma falha no meio nunca pula linhas. Os lotes confirmados
+depois da falha são reenviados na próxima execução (o BI faz upsert).
+
+A retenção tem limite: um lote rejeitado de vez pelo BI (4xx que não seja
+408/429) é descartado na hora, e uma falha transitória só segura a marca por
+PARAM_BI_WATERMARK_MAX_ATTEMPTS execuções ou PARAM_BI_WATERMARK_MAX_HOLD
+segundos; depois disso o primeiro lote da janela é descartado. Todo descarte
+é logado como erro e alertado, com o período a reprocessar via --dtini/--dtfim.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from utils import config_flag
+
+DEFAULT_DB_NAME = "bi_watermarks.sqlite3"
+DEFAULT_LAG_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 24
+DEFAULT_MAX_HOLD_SECONDS = 6 * 3600
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class WatermarkStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " stream TEXT NOT NULL,"
+            " host TEXT NOT NULL,"
+            " ts TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (stream, host))"
+        )
+        # Execuções seguidas em que uma falha reteve a marca, e desde quando
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS holds ("
+            " stream TEXT NOT NULL,"
+            " host TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " since REAL NOT NULL,"
+            " PRIMARY KEY (stream, host))"
+        )
+        self._conn.commit()
+
+    def get(self, stream: str, host: str) -> tuple | None:
+        """
+        Retorna (ts, [chave...]) ou None se ainda não houver marca.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ts, key FROM watermarks WHERE stream = ? AND host = ?", (stream, host)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            return row[0], json.loads(row[1])
+        except ValueError:
+            return None
+
+    def put(self, stream: str, host: str, ts, key: list):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (stream, host, ts, key, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (stream, host, str(ts), json.dumps(key, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def get_hold(self, stream: str, host: str) -> tuple | None:
+        """
+        Retorna (execuções, desde) da retenção atual ou None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, since FROM holds WHERE stream = ? AND host = ?", (stream, host)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put_hold(self, stream: str, host: str, hold: tuple | None):
+        with self._lock:
+            if hold is None:
+                self._conn.execute("DELETE FROM holds WHERE stream = ? AND host = ?", (stream, host))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO holds (stream, host, attempts, since) VALUES (?, ?, ?, ?)",
+                    (stream, host, hold[0], hold[1]),
+                )
+            self._conn.commit()
+
+
+class WatermarkTracker:
+    """
+    Acompanha os lotes de um concentrador em uma execução. register() é chamado
+    na ordem de extração; ack() pelos workers de envio, em qualquer ordem.
+
+    'alert' recebe a mensagem de cada lote descartado (ex.: trap ao Zabbix).
+    """
+
+    def __init__(self, store: WatermarkStore, stream: str, host: str, logger: logging.Logger,
+                 config: dict | None = None, alert=None):
+        config = config or {}
+        self.store = store
+        self.stream = stream
+        self.host = host
+        self.logger = logger
+        self.alert = alert
+        self.max_attempts = max(1, int(config.get("PARAM_BI_WATERMARK_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)))
+        self.max_hold = max(0, int(config.get("PARAM_BI_WATERMARK_MAX_HOLD", DEFAULT_MAX_HOLD_SECONDS)))
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._committed_seq = -1
+        self._acked = {}
+        self._failed_seq = None
+        self._started = time.time()
+        try:
+            self._prior_hold = store.get_hold(stream, host)
+        except sqlite3.Error:
+            self._prior_hold = None
+        self._hold = self._prior_hold
+
+    def register(self, batch):
+        with self._lock:
+            batch.seq = self._next_seq
+            self._next_seq += 1
+
+    def _skip_reason(self, batch, ok) -> str | None:
+        """
+        Motivo para descartar um lote falho em vez de reter a marca, ou None.
+        """
+        if getattr(ok, "permanent", False):
+            return f"rejeitado pelo BI com HTTP {ok.status}"
+        # As linhas que seguraram a marca na execução anterior abrem a janela
+        # desta, no lote 0: só ele é descartado, então uma queda do BI esvazia
+        # a fila no máximo um lote por execução.
+        if batch.seq != 0 or self._prior_hold is None:
+            return None
+        attempts, since = self._prior_hold
+        if attempts >= self.max_attempts:
+            return f"não confirmado após {attempts + 1} execuções"
+        if self.max_hold and time.time() - since >= self.max_hold:
+            return f"marca retida há {(time.time() - since) / 60:.0f} min"
+        return None
+
+    def _sync_hold(self):
+        """
+        Grava a retenção desta execução: conta mais uma sobre a anterior se a
+        marca não andou, recomeça se andou e some quando nada a retém.
+        """
+        if self._failed_seq is None:
+            hold = None if self._committed_seq >= 0 else self._prior_hold
+        elif self._committed_seq >= 0 or self._prior_hold is None:
+            hold = (1, self._started)
+        else:
+            hold = (self._prior_hold[0] + 1, self._prior_hold[1])
+        if hold == self._hold:
+            return
+        self._hold = hold
+        try:
+            self.store.put_hold(self.stream, self.host, hold)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Falha ao gravar retenção da marca de {self.stream}/{self.host}: {e}")
+
+    def ack(self, batch, ok):
+        """
+        'ok' é o retorno de BIUploader.send (um UploadResult, ou bool).
+        """
+        skipped = None
+        with self._lock:
+            reason = None if ok else self._skip_reason(batch, ok)
+            if ok:
+                self._acked[batch.seq] = batch.mark
+            elif reason:
+                ts = batch.mark[0] if batch.mark else "?"
+                skipped = (
+                    f"Lote {batch.seq} de {self.stream}/{self.host} descartado ({reason}): "
+                    f"{len(batch)} registros até {ts} ficam fora do BI; reprocesse com --dtini/--dtfim."
+                )
+                self.logger.error(skipped)
+                self._acked[batch.seq] = batch.mark
+            elif self._failed_seq is None or batch.seq < self._failed_seq:
+                self.logger.warning(
+                    f"Marca d'água de {self.stream}/{self.host} retida: lote {batch.seq} não confirmado pelo BI."
+                )
+                self._failed_seq = batch.seq
+
+            mark = None
+            while True:
+                next_seq = self._committed_seq + 1
+                if self._failed_seq is not None and next_seq >= self._failed_seq:
+                    break
+                if next_seq not in self._acked:
+                    break
+                self._committed_seq = next_seq
+                mark = self._acked.pop(next_seq) or mark
+            if mark is not None:
+                ts, key = mark
+                try:
+                    self.store.put(self.stream, self.host, ts, list(key))
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Falha ao gravar marca d'água de {self.stream}/{self.host}: {e}")
+            self._sync_hold()
+
+        if skipped and self.alert:
+            self.alert(skipped)
+
+
+def _store_path(config: dict) -> str:
+    explicit = config.get("PARAM_BI_WATERMARK_DB")
+    if explicit:
+        return explicit
+    base_dir = config.get("PARAM_BASE_DIR", "/ariusmonitor")
+    return os.path.join(base_dir, "state", DEFAULT_DB_NAME)
+
+
+def get_store(config: dict) -> WatermarkStore | None:
+    """
+    Store compartilhado por processo. PARAM_BI_INCREMENTAL=false desabilita
+    a coleta incremental (volta às janelas fixas).
+    """
+    if not config_flag(config, "PARAM_BI_INCREMENTAL", True):
+        return None
+    path = _store_path(config)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            try:
+                store = WatermarkStore(path)
+            except (OSError, sqlite3.Error) as e:
+                logging.getLogger().warning(f"Marcas d'água do BI indisponíveis em {path}: {e}")
+                return None
+            _stores[path] = store
+        return store
+
+
+def lag_seconds(config: dict) -> int:
+    """
+    Linhas mais novas que NOW() - lag ficam para a próxima execução, para que
+    inserts atrasados com o mesmo timestamp não fiquem atrás da marca.
+    """
+    return max(0, int(config.get("PARAM_BI_WATERMARK_LAG", DEFAULT_LAG_SECONDS)))
@@ -5,6 +5,7 @@ import re
 from functools import lru_cache
 
 from actions import resolve_action_name
+from host_facts import get_host_facts
 
 LEVEL_RANK = {"L1": 3, "L2": 2, "L3": 1}
 DEFAULT_MODE = "warn"
@@ -49,37 +50,6 @@ def _safe_float(value: str):
         return None
 
 
-def _parse_os_release(raw: str) -> dict:
-    info = {}
-    for line in (raw or "").splitlines():
-        line = line.strip()
-        if not line or "=" not in line or line.startswith("#"):
-            continue
-        key, value = line.split("=", 1)
-        info[key.strip()] = value.strip().strip('"')
-    return info
-
-
-def _normalize_distro(os_release: dict) -> str:
-    distro = (os_release.get("ID") or "").strip().lower()
-    if distro in {"linuxmint", "mint"}:
-        return "mint"
-    if "slack" in distro:
-        return "slackware"
-    if distro == "ubuntu":
-        return "ubuntu"
-    return distro or "unknown"
-
-
-def _normalize_arch(raw_arch: str) -> str:
-    arch = (raw_arch or "").strip().lower()
-    if arch in {"x86_64", "amd64"}:
-        return "x86_64"
-    if arch in {"i386", "i486", "i586", "i686", "x86"}:
-        return "i686"
-    return arch or "unknown"
-
-
 def _version_matches(version: str, pattern: str) -> bool:
     version = (version or "").strip()
     pattern = (pattern or "").strip()
@@ -138,29 +108,6 @@ def _required_level_for_action(canonical_action: str) -> str:
     return rules.get(canonical_action, {}).get("minimum_level", defaults.get("minimum_level", "L2"))
 
 
-def _detect_host_facts(session) -> dict:
-    cmd = "sh -c 'uname -m 2>/dev/null; cat /etc/os-release 2>/dev/null || true'"
-    _, out, _ = session.run(cmd)
-    lines = (out or "").splitlines()
-    arch_raw = lines[0].strip() if lines else ""
-    os_release_raw = "\n".join(lines[1:]) if len(lines) > 1 else ""
-
-    os_release = _parse_os_release(os_release_raw)
-    distro = _normalize_distro(os_release)
-    version = (os_release.get("VERSION_ID") or "").strip().strip('"')
-    arch = _normalize_arch(arch_raw)
-
-    return {
-        "distro": distro,
-        "version": version,
-        "arch": arch,
-        "raw": {
-            "arch": arch_raw,
-            "os_release": os_release,
-        },
-    }
-
-
 def _resolve_mode(config: dict, args) -> str:
     arg_mode = getattr(args, "compat_mode", None)
     if arg_mode:
@@ -179,7 +126,7 @@ def run_compatibility_precheck(session, host: dict, action: str, config: dict, a
     resolved_action, canonical_action, _ = resolve_action_name(action)
     required_level = _required_level_for_action(canonical_action)
 
-    facts = _detect_host_facts(session)
+    facts = get_host_facts(session, host, config)
     support_level = _resolve_support_level(facts["distro"], facts["version"], facts["arch"])
 
     host_prefix = f"[{host.get('host', host.get('ip', 'host'))}]"
@@ -0,0 +1,228 @@
+# fleet_executor.py
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fleet_limiter import AdaptiveLimiter, store_limit
+from fleet_metrics import FleetMetrics
+from run_journal import open_journal, log_summary as log_journal_summary
+from store_relay import store_key
+
+# process_one/ssh_manager (paramiko), asyncio e preflight são importados
+# dentro das funções: o main.py importa este módulo (ENGINES) também para as
+# ações locais, que não usam nada disso.
+
+ENGINES = ("threads", "async", "adaptive")
+DEFAULT_ENGINE = "threads"
+
+# O engine async mantém milhares de hosts em voo; cada sessão paramiko ainda
+# precisa de uma thread para as partes bloqueantes, então reduzimos a pilha
+# (default do SO ~8 MB) para que o custo por host fique em algumas centenas de KB.
+DEFAULT_ASYNC_MAX_INFLIGHT = 1000
+ASYNC_THREAD_STACK_SIZE = 512 * 1024
+PROGRESS_EVERY = 100
+
+
+def resolve_engine(config: dict, args) -> str:
+    # Prioridade: CLI > config (PARAM_FLEET_ENGINE) > threads
+    engine = (getattr(args, "engine", None) or config.get("PARAM_FLEET_ENGINE") or DEFAULT_ENGINE)
+    engine = str(engine).strip().lower()
+    return engine if engine in ENGINES else DEFAULT_ENGINE
+
+
+def _log_progress(processed: int, total: int, logger: logging.Logger):
+    if processed % PROGRESS_EVERY == 0:
+        logger.info(f"{processed}/{total} hosts processados...")
+
+
+def run_threaded(hosts: list[dict], config: dict, args, logger: logging.Logger):
+    """
+    Engine original: um ThreadPoolExecutor com 'max_threads' workers.
+    """
+    from process_one import process_one
+
+    max_threads = int(config.get("max_threads", 50))
+    logger.info(f"Processando {len(hosts)} hosts com até {max_threads} threads...")
+
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        future_to_host = {
+            executor.submit(process_one, host, config, args, logger): host
+            for host in hosts
+        }
+
+        processed_count = 0
+        for future in as_completed(future_to_host):
+            host = future_to_host[future]
+            try:
+                future.result()
+            except Exception as e:
+                # Segurança extra; os erros já são tratados em process_one
+                logger.critical(f"Erro fatal não tratado no processamento do host {host.get('host')}: {e}")
+
+            processed_count += 1
+            _log_progress(processed_count, len(hosts), logger)
+
+
+async def _run_async(hosts: list[dict], config: dict, args, logger: logging.Logger, max_inflight: int):
+    import asyncio
+
+    from process_one import process_one
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_inflight)
+    processed = 0
+
+    # As actions continuam síncronas (run(session, host, config, logger, args));
+    # o adapter é o próprio process_one despachado no executor limitado.
+    executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="fleet")
+
+    async def _one(host: dict):
+        nonlocal processed
+        async with semaphore:
+            try:
+                await loop.run_in_executor(executor, process_one, host, config, args, logger)
+            except Exception as e:
+                logger.critical(f"Erro fatal não tratado no processamento do host {host.get('host')}: {e}")
+        processed += 1
+        _log_progress(processed, len(hosts), logger)
+
+    try:
+        await asyncio.gather(*(_one(host) for host in hosts))
+    finally:
+        executor.shutdown(wait=True)
+
+
+def run_async(hosts: list[dict], config: dict, args, logger: logging.Logger):
+    """
+    Engine asyncio: o event loop controla o fan-out e o paramiko roda num
+    executor limitado por PARAM_ASYNC_MAX_INFLIGHT, com pilha reduzida.
+    """
+    import asyncio
+
+    max_inflight = int(config.get("PARAM_ASYNC_MAX_INFLIGHT", DEFAULT_ASYNC_MAX_INFLIGHT))
+    max_inflight = max(1, min(max_inflight, len(hosts)))
+    logger.info(f"Processando {len(hosts)} hosts (engine async) com até {max_inflight} hosts em voo...")
+
+    previous_stack_size = threading.stack_size()
+    try:
+        threading.stack_size(int(config.get("PARAM_ASYNC_THREAD_STACK", ASYNC_THREAD_STACK_SIZE)))
+    except (ValueError, RuntimeError) as e:
+        logger.warning(f"Não foi possível ajustar a pilha das threads: {e}")
+    try:
+        asyncio.run(_run_async(hosts, config, args, logger, max_inflight))
+    finally:
+        threading.stack_size(previous_stack_size)
+
+
+def run_adaptive(hosts: list[dict], config: dict, args, logger: logging.Logger):
+    """
+    Engine adaptativo: a concorrência segue o AdaptiveLimiter (AIMD sobre
+    latência de connect/precheck e timeouts) e cada loja tem no máximo
+    PARAM_FLEET_STORE_LIMIT hosts em voo. Os hosts são despachados em
+    rodízio entre as lojas, então uma loja grande não bloqueia as demais.
+    """
+    from process_one import process_one
+
+    limiter = AdaptiveLimiter.from_config(config, logger)
+    per_store = store_limit(config)
+    logger.info(
+        f"Processando {len(hosts)} hosts (engine adaptive): limite inicial {limiter.limit}, "
+        f"entre {limiter.minimum} e {limiter.maximum}, até {per_store} por loja..."
+    )
+
+    pending = {}
+    for host in hosts:
+        pending.setdefault(store_key(host.get("host", "")), deque()).append(host)
+    order = deque(pending)
+    store_inflight = {store: 0 for store in pending}
+    cond = threading.Condition()
+    state = {"inflight": 0, "processed": 0}
+
+    def _next_host():
+        for _ in range(len(order)):
+            store = order[0]
+            order.rotate(-1)
+            # Hosts fora do padrão REDE-LOJAxxx-PDVyyy não têm sublimite
+            if store is not None and store_inflight[store] >= per_store:
+                continue
+            host = pending[store].popleft()
+            if not pending[store]:
+                order.remove(store)
+                del pending[store]
+            return store, host
+        return None, None
+
+    def _done(store, host, epoch, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = None
+            logger.critical(f"Erro fatal não tratado no processamento do host {host.get('host')}: {e}")
+        limiter.observe(result, epoch)
+        with cond:
+            state["inflight"] -= 1
+            store_inflight[store] -= 1
+            state["processed"] += 1
+            if state["processed"] % PROGRESS_EVERY == 0:
+                logger.info(
+                    f"{state['processed']}/{len(hosts)} hosts processados "
+                    f"(concorrência atual {limiter.limit})..."
+                )
+            cond.notify()
+
+    with ThreadPoolExecutor(max_workers=limiter.maximum, thread_name_prefix="fleet") as executor:
+        with cond:
+            while pending or state["inflight"]:
+                store, host = (None, None)
+                if pending and state["inflight"] < limiter.limit:
+                    store, host = _next_host()
+                if host is None:
+                    cond.wait()
+                    continue
+                state["inflight"] += 1
+                store_inflight[store] += 1
+                future = executor.submit(process_one, host, config, args, logger)
+                epoch = limiter.epoch()
+                future.add_done_callback(lambda f, s=store, h=host, e=epoch: _done(s, h, e, f))
+    logger.info(f"Concorrência final do engine adaptive: {limiter.limit}")
+
+
+def build_ssh_pool(config: dict):
+    from ssh_manager import SSHConnectionPool
+
+    return SSHConnectionPool(
+        timeout=config.get('ssh', {}).get('timeout', 30),
+        idle_timeout=float(config.get("PARAM_SSH_POOL_IDLE", 60)),
+        max_idle=int(config.get("PARAM_SSH_POOL_MAX_IDLE", 32)),
+    )
+
+
+def run_fleet(hosts: list[dict], config: dict, args, logger: logging.Logger):
+    engine = resolve_engine(config, args)
+    # Pool por execução: sessões devolvidas por process_one podem ser reaproveitadas
+    # por outro host com o mesmo (ip, porta, usuário) sem novo handshake.
+    args.ssh_pool = build_ssh_pool(config)
+    args.metrics = FleetMetrics(len(hosts), args.action, logger)
+    args.metrics.start(config)
+    args.journal = open_journal(config, args, logger)
+    try:
+        from preflight import filter_reachable
+
+        hosts = filter_reachable(hosts, config, args, logger)
+        if not hosts:
+            logger.warning("Nenhum host alcançável após a pré-verificação.")
+        elif engine == "async":
+            run_async(hosts, config, args, logger)
+        elif engine == "adaptive":
+            run_adaptive(hosts, config, args, logger)
+        else:
+            run_threaded(hosts, config, args, logger)
+    finally:
+        args.ssh_pool.close_all()
+        args.metrics.stop()
+        args.metrics.log_summary()
+        if args.journal is not None:
+            args.journal.close()
+            log_journal_summary(args.journal.path, args.journal.run_id, logger)
@@ -0,0 +1,109 @@
+# fleet_limiter.py
+"""
+Controle adaptativo de concorrência (AIMD) para o engine 'adaptive' da frota.
+
+O limite começa em max_threads e, como no TCP, cresce em slow start (+1 por
+host saudável) até o primeiro sinal de congestionamento ou até a latência
+passar da metade do alvo; depois cresce +1 a cada 'limite' hosts saudáveis. Um host é saudável quando connect + precheck
+ficam abaixo de PARAM_FLEET_LATENCY_TARGET e não houve timeout nem
+NoValidConnectionsError. Quando a fração de hosts não saudáveis nas últimas
+PARAM_FLEET_AIMD_WINDOW conclusões passa de PARAM_FLEET_AIMD_ERROR_RATE, o
+limite cai pela metade (no máximo uma vez por janela). PDVs desligados geram
+NoValidConnectionsError isolados, que sozinhos não reduzem o limite.
+"""
+import logging
+import threading
+from collections import deque
+
+DEFAULT_MIN_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 200
+DEFAULT_LATENCY_TARGET = 5.0
+DEFAULT_WINDOW = 20
+DEFAULT_ERROR_RATE = 0.3
+DEFAULT_STORE_LIMIT = 8
+
+CONGESTION_ERRORS = {"timeout", "NoValidConnectionsError"}
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int, minimum: int = DEFAULT_MIN_CONCURRENCY,
+                 maximum: int = DEFAULT_MAX_CONCURRENCY, latency_target: float = DEFAULT_LATENCY_TARGET,
+                 window: int = DEFAULT_WINDOW, error_rate: float = DEFAULT_ERROR_RATE,
+                 logger: logging.Logger | None = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_target = latency_target
+        self.error_rate = error_rate
+        self.logger = logger or logging.getLogger()
+        self._limit = float(min(self.maximum, max(self.minimum, initial)))
+        self._recent = deque(maxlen=max(1, window))
+        self._since_decrease = 0
+        self._slow_start = True
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, logger: logging.Logger) -> "AdaptiveLimiter":
+        return cls(
+            initial=int(config.get("max_threads", 50)),
+            minimum=int(config.get("PARAM_FLEET_MIN_CONCURRENCY", DEFAULT_MIN_CONCURRENCY)),
+            maximum=int(config.get("PARAM_FLEET_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            latency_target=float(config.get("PARAM_FLEET_LATENCY_TARGET", DEFAULT_LATENCY_TARGET)),
+            window=int(config.get("PARAM_FLEET_AIMD_WINDOW", DEFAULT_WINDOW)),
+            error_rate=float(config.get("PARAM_FLEET_AIMD_ERROR_RATE", DEFAULT_ERROR_RATE)),
+            logger=logger,
+        )
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def epoch(self) -> int:
+        """
+        Marca do despacho de um host; repassada a observe() na conclusão.
+        """
+        return self._epoch
+
+    def observe(self, result: dict | None, epoch: int):
+        """
+        Ajusta o limite com o resultado de process_one (None = exceção não
+        tratada). Hosts despachados antes da última redução não contam: já
+        estavam em voo com o limite antigo (uma redução por "RTT", como no TCP).
+        """
+        result = result or {}
+        if result.get("status") == "skipped" or epoch < self._epoch:
+            return
+        phases = result.get("phases") or {}
+        latency = phases.get("connect", 0.0) + phases.get("precheck", 0.0)
+        congested = result.get("error") in CONGESTION_ERRORS or latency > self.latency_target
+
+        with self._lock:
+            self._recent.append(congested)
+            self._since_decrease += 1
+            window = self._recent.maxlen
+            full = len(self._recent) == window
+            rate = sum(self._recent) / len(self._recent)
+
+            if full and rate > self.error_rate and self._since_decrease >= window:
+                previous = self.limit
+                self._limit = max(float(self.minimum), self._limit / 2)
+                self._since_decrease = 0
+                self._slow_start = False
+                self._epoch += 1
+                self._recent.clear()
+                if self.limit != previous:
+                    self.logger.info(
+                        f"Concorrência reduzida de {previous} para {self.limit} "
+                        f"({rate:.0%} de timeouts/falhas de conexão/lentidão nos últimos {window} hosts)."
+                    )
+            elif not congested:
+                # Como o HyStart: sai do slow start antes da perda, quando a
+                # latência já passou da metade do alvo.
+                if self._slow_start and latency > self.latency_target / 2:
+                    self._slow_start = False
+                step = 1.0 if self._slow_start else 1.0 / self._limit
+                self._limit = min(float(self.maximum), self._limit + step)
+
+
+def store_limit(config: dict) -> int:
+    return max(1, int(config.get("PARAM_FLEET_STORE_LIMIT", DEFAULT_STORE_LIMIT)))
@@ -0,0 +1,286 @@
+# fleet_metrics.py
+"""
+Métricas de uma execução da frota (run_fleet): tempos por fase de cada host
+(connect, precheck, action, close), contadores por resultado/classe de erro,
+hosts em voo e latência total por host (p50/p95/p99).
+
+Durante a execução o snapshot é gravado em JSON a cada
+PARAM_FLEET_METRICS_INTERVAL segundos, um arquivo por ação
+(state/fleet_metrics-<ação>.json ou PARAM_FLEET_METRICS_FILE, onde
+"{action}" é trocado pela ação: ações diferentes rodam ao mesmo tempo) e, com
+PARAM_FLEET_METRICS_PORT > 0, servido em formato texto do Prometheus em
+http://PARAM_FLEET_METRICS_BIND:porta/metrics. Ao final, um resumo vai para o log.
+"""
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ("connect", "precheck", "action", "close")
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_INTERVAL = 5
+DEFAULT_FILE_NAME = "fleet_metrics-{action}.json"
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """
+    Percentil por rank mais próximo; 0.0 para lista vazia.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _add_phase(result: dict, name: str, elapsed: float):
+    phases = result.setdefault("phases", {})
+    phases[name] = round(phases.get(name, 0.0) + elapsed, 3)
+
+
+class FleetMetrics:
+    def __init__(self, total: int, action: str, logger: logging.Logger):
+        self.total = total
+        self.action = action
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._phases = {name: [] for name in PHASES}
+        self._latencies = []
+        self._results = {}
+        self._inflight = 0
+        self._done = 0
+        self._stop = threading.Event()
+        self._writer = None
+        self._server = None
+        self.path = None
+
+    # --- Coleta ---
+
+    @contextmanager
+    def phase(self, name: str, result: dict | None = None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            if result is not None:
+                _add_phase(result, name, elapsed)
+            with self._lock:
+                self._phases.setdefault(name, []).append(elapsed)
+
+    @contextmanager
+    def host(self, result: dict):
+        """
+        Envolve o processamento de um host. 'result' é o registro de
+        process_one (status/error); ao sair recebe a duração e é contado por
+        classe de erro, ou pelo status quando não houve erro.
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._inflight += 1
+        try:
+            yield result
+        finally:
+            elapsed = time.monotonic() - start
+            result["duration"] = round(elapsed, 3)
+            key = result.get("error") or result.get("status") or "ok"
+            with self._lock:
+                self._inflight -= 1
+                self._done += 1
+                self._latencies.append(elapsed)
+                self._results[key] = self._results.get(key, 0) + 1
+
+    def count(self, result: dict):
+        """
+        Conta um host que não passou por process_one (ex.: pré-verificação).
+        """
+        key = result.get("error") or result.get("status") or "ok"
+        with self._lock:
+            self._done += 1
+            self._results[key] = self._results.get(key, 0) + 1
+
+    # --- Exposição ---
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            phases = {name: sorted(values) for name, values in self._phases.items()}
+            latencies = sorted(self._latencies)
+            results = dict(self._results)
+            inflight, done = self._inflight, self._done
+        elapsed = time.time() - self._started
+
+        def _summary(values):
+            return {
+                "count": len(values),
+                "sum": round(sum(values), 3),
+                **{f"p{int(q * 100)}": round(percentile(values, q), 3) for q in QUANTILES},
+            }
+
+        return {
+            "action": self.action,
+            "started_at": self._started,
+            "elapsed": round(elapsed, 3),
+            "total": self.total,
+            "done": done,
+            "inflight": inflight,
+            "hosts_per_second": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+            "results": results,
+            "latency": _summary(latencies),
+            "phases": {name: _summary(values) for name, values in phases.items()},
+        }
+
+    def prometheus(self) -> str:
+        snap = self.snapshot()
+        label = f'action="{snap["action"]}"'
+        lines = [
+            "# TYPE fleet_hosts_total gauge",
+            f"fleet_hosts_total{{{label}}} {snap['total']}",
+            "# TYPE fleet_hosts_done counter",
+            f"fleet_hosts_done{{{label}}} {snap['done']}",
+            "# TYPE fleet_hosts_inflight gauge",
+            f"fleet_hosts_inflight{{{label}}} {snap['inflight']}",
+            "# TYPE fleet_host_results counter",
+        ]
+        for result, count in sorted(snap["results"].items()):
+            lines.append(f'fleet_host_results{{{label},result="{result}"}} {count}')
+        lines.append("# TYPE fleet_host_latency_seconds summary")
+        for key in ("p50", "p95", "p99"):
+            q = int(key[1:]) / 100
+            lines.append(f'fleet_host_latency_seconds{{{label},quantile="{q}"}} {snap["latency"][key]}')
+        lines.append(f"fleet_host_latency_seconds_sum{{{label}}} {snap['latency']['sum']}")
+        lines.append(f"fleet_host_latency_seconds_count{{{label}}} {snap['latency']['count']}")
+        lines.append("# TYPE fleet_phase_seconds summary")
+        for name, summary in sorted(snap["phases"].items()):
+            phase_label = f'{label},phase="{name}"'
+            for key in ("p50", "p95", "p99"):
+                q = int(key[1:]) / 100
+                lines.append(f'fleet_phase_seconds{{{phase_label},quantile="{q}"}} {summary[key]}')
+            lines.append(f"fleet_phase_seconds_sum{{{phase_label}}} {summary['sum']}")
+            lines.append(f"fleet_phase_seconds_count{{{phase_label}}} {summary['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        if not self.path:
+            return
+        tmp_path = None
+        try:
+            # Temporário único: o stop() e o loop periódico podem gravar juntos
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                            prefix=f".{os.path.basename(self.path)}.", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Falha ao gravar métricas em {self.path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def start(self, config: dict):
+        base_dir = config.get("PARAM_BASE_DIR", "/ariusmonitor")
+        template = config.get("PARAM_FLEET_METRICS_FILE") or os.path.join(base_dir, "state", DEFAULT_FILE_NAME)
+        self.path = template.replace("{action}", self.action)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        except OSError as e:
+            self.logger.warning(f"Métricas em arquivo desabilitadas ({self.path}): {e}")
+            self.path = None
+
+        interval = max(1.0, float(config.get("PARAM_FLEET_METRICS_INTERVAL", DEFAULT_INTERVAL)))
+
+        def _loop():
+            while not self._stop.wait(interval):
+                self.write()
+
+        self._writer = threading.Thread(target=_loop, name="fleet-metrics", daemon=True)
+        self._writer.start()
+
+        port = int(config.get("PARAM_FLEET_METRICS_PORT", 0))
+        if port > 0:
+            self._serve(config.get("PARAM_FLEET_METRICS_BIND", "127.0.0.1"), port)
+
+    def _serve(self, bind: str, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, ctype = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/metrics.json":
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((bind, port), _Handler)
+        except OSError as e:
+            self.logger.warning(f"Endpoint de métricas indisponível em {bind}:{port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="fleet-metrics-http", daemon=True).start()
+        self.logger.info(f"Métricas da frota em http://{bind}:{port}/metrics")
+
+    def stop(self):
+        self._stop.set()
+        if self._writer:
+            self._writer.join(timeout=5)
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        self.write()
+
+    def log_summary(self):
+        snap = self.snapshot()
+        results = ", ".join(f"{k}={v}" for k, v in sorted(snap["results"].items())) or "nenhum"
+        lat = snap["latency"]
+        self.logger.info(
+            f"Métricas: {snap['done']}/{snap['total']} hosts em {snap['elapsed']:.1f}s "
+            f"({snap['hosts_per_second']:.2f} hosts/s) | resultados: {results} | "
+            f"latência p50={lat['p50']:.2f}s p95={lat['p95']:.2f}s p99={lat['p99']:.2f}s"
+        )
+        for name in PHASES:
+            phase = snap["phases"].get(name)
+            if phase and phase["count"]:
+                self.logger.info(
+                    f"Fase {name}: n={phase['count']} p50={phase['p50']:.2f}s "
+                    f"p95={phase['p95']:.2f}s p99={phase['p99']:.2f}s"
+                )
+
+
+class _NullMetrics:
+    """
+    Usado por process_one quando chamado fora de run_fleet.
+    """
+
+    @contextmanager
+    def phase(self, name: str, result: dict | None = None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if result is not None:
+                _add_phase(result, name, time.monotonic() - start)
+
+    @contextmanager
+    def host(self, result: dict):
+        start = time.monotonic()
+        try:
+            yield result
+        finally:
+            result["duration"] = round(time.monotonic() - start, 3)
+
+
+NULL_METRICS = _NullMetrics()
@@ -0,0 +1,185 @@
+# host_facts.py
+"""
+Fatos de host (distro/versão/arquitetura) compartilhados entre as actions.
+
+A sondagem remota (uname + os-release) é cacheada em SQLite sob
+PARAM_BASE_DIR, por nome de host, com TTL configurável (PARAM_HOST_FACTS_TTL)
+e invalidada quando o IP do host muda.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_DB_NAME = "host_facts.sqlite3"
+
+# os-release ausente (Slackware 13) cai no slackware-version, emitido no mesmo formato.
+FACTS_PROBE_CMD = (
+    "sh -c 'uname -m 2>/dev/null; "
+    "cat /etc/os-release 2>/dev/null "
+    "|| (test -f /etc/slackware-version "
+    "&& printf \"ID=slackware\\nVERSION_ID=%s\\n\" \"$(awk \"{print \\$2}\" /etc/slackware-version)\") "
+    "|| true'"
+)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _parse_os_release(raw: str) -> dict:
+    info = {}
+    for line in (raw or "").splitlines():
+        line = line.strip()
+        if not line or "=" not in line or line.startswith("#"):
+            continue
+        key, value = line.split("=", 1)
+        info[key.strip()] = value.strip().strip('"')
+    return info
+
+
+def _normalize_distro(os_release: dict) -> str:
+    distro = (os_release.get("ID") or "").strip().lower()
+    if distro in {"linuxmint", "mint"}:
+        return "mint"
+    if "slack" in distro:
+        return "slackware"
+    if distro == "ubuntu":
+        return "ubuntu"
+    return distro or "unknown"
+
+
+def _normalize_arch(raw_arch: str) -> str:
+    arch = (raw_arch or "").strip().lower()
+    if arch in {"x86_64", "amd64"}:
+        return "x86_64"
+    if arch in {"i386", "i486", "i586", "i686", "x86"}:
+        return "i686"
+    return arch or "unknown"
+
+
+def detect_host_facts(session) -> dict:
+    _, out, _ = session.run(FACTS_PROBE_CMD)
+    lines = (out or "").splitlines()
+    arch_raw = lines[0].strip() if lines else ""
+    os_release_raw = "\n".join(lines[1:]) if len(lines) > 1 else ""
+
+    os_release = _parse_os_release(os_release_raw)
+    distro = _normalize_distro(os_release)
+    version = (os_release.get("VERSION_ID") or "").strip().strip('"')
+    arch = _normalize_arch(arch_raw)
+
+    return {
+        "distro": distro,
+        "version": version,
+        "arch": arch,
+        "raw": {
+            "arch": arch_raw,
+            "os_release": os_release,
+        },
+    }
+
+
+class HostFactsStore:
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS host_facts ("
+            " host TEXT PRIMARY KEY,"
+            " ip TEXT NOT NULL,"
+            " facts TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, host_name: str, ip: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ip, facts, updated_at FROM host_facts WHERE host = ?", (host_name,)
+            ).fetchone()
+        if not row:
+            return None
+        cached_ip, facts_raw, updated_at = row
+        if cached_ip != ip or time.time() - updated_at > self.ttl_seconds:
+            return None
+        try:
+            return json.loads(facts_raw)
+        except ValueError:
+            return None
+
+    def put(self, host_name: str, ip: str, facts: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO host_facts (host, ip, facts, updated_at) VALUES (?, ?, ?, ?)",
+                (host_name, ip, json.dumps(facts), time.time()),
+            )
+            self._conn.commit()
+
+    def invalidate(self, host_name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM host_facts WHERE host = ?", (host_name,))
+            self._conn.commit()
+
+
+def _store_path(config: dict) -> str:
+    explicit = config.get("PARAM_HOST_FACTS_DB")
+    if explicit:
+        return explicit
+    base_dir = config.get("PARAM_BASE_DIR", "/ariusmonitor")
+    return os.path.join(base_dir, "cache", DEFAULT_DB_NAME)
+
+
+def get_store(config: dict) -> HostFactsStore | None:
+    """
+    Store compartilhado por processo. TTL <= 0 desabilita o cache.
+    """
+    ttl = float(config.get("PARAM_HOST_FACTS_TTL", DEFAULT_TTL_SECONDS))
+    if ttl <= 0:
+        return None
+    path = _store_path(config)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            try:
+                store = HostFactsStore(path, ttl_seconds=ttl)
+            except (OSError, sqlite3.Error) as e:
+                logging.getLogger().warning(f"Cache de fatos de host indisponível em {path}: {e}")
+                return None
+            _stores[path] = store
+        return store
+
+
+def get_cached_host_facts(host: dict, config: dict) -> dict | None:
+    store = get_store(config)
+    if store is None:
+        return None
+    try:
+        return store.get(host.get("host", ""), host.get("ip", ""))
+    except sqlite3.Error:
+        return None
+
+
+def get_host_facts(session, host: dict, config: dict) -> dict:
+    """
+    Retorna os fatos do host a partir do cache; em caso de miss, sonda via SSH
+    e grava o resultado.
+    """
+    facts = get_cached_host_facts(host, config)
+    if facts is not None:
+        return facts
+
+    facts = detect_host_facts(session)
+    store = get_store(config)
+    if store is not None and facts.get("distro") != "unknown":
+        try:
+            store.put(host.get("host", ""), host.get("ip", ""), facts)
+        except sqlite3.Error as e:
+            logging.getLogger().warning(f"Falha ao gravar fatos de {host.get('host')}: {e}")
+    return facts
@@ -0,0 +1,95 @@
+# instance_lock.py
+"""
+Trava de instância única por ação/script com fcntl.flock, em
+/run/lock/ariusmonitor-<nome>.lock (ou no diretório temporário quando
+/run/lock não é gravável). Ações diferentes rodam em paralelo; a mesma ação
+não. O kernel solta a trava quando o processo termina, então não existe
+lock "velho" para limpar. O arquivo guarda PID, início e comando de quem a
+detém, para diagnóstico.
+"""
+import fcntl
+import os
+import re
+import sys
+import tempfile
+import time
+
+DEFAULT_LOCK_DIR = "/run/lock"
+
+# Travas dos scripts standalone, mantidas até o fim do processo
+_held = []
+
+
+def lock_path_for(name: str, lock_dir: str | None = None) -> str:
+    if lock_dir is None:
+        lock_dir = DEFAULT_LOCK_DIR if os.access(DEFAULT_LOCK_DIR, os.W_OK) else tempfile.gettempdir()
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+    return os.path.join(lock_dir, f"ariusmonitor-{safe_name}.lock")
+
+
+class InstanceLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(
+            f"{os.getpid()} {time.strftime('%Y-%m-%d %H:%M:%S')} {' '.join(sys.argv)}\n"
+        )
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def holder(self) -> str:
+        """
+        Conteúdo gravado pela instância que detém a trava ("PID início comando").
+        """
+        try:
+            with open(self.path) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def acquire_instance_lock(name: str, path: str | None = None) -> InstanceLock | None:
+    """
+    Trava 'name' (ou o arquivo 'path') para este processo. Retorna None se
+    outra instância já a detém; o chamador deve manter a referência enquanto
+    roda.
+    """
+    lock = InstanceLock(path or lock_path_for(name))
+    return lock if lock.acquire() else None
+
+
+def exit_if_running(name: str):
+    """
+    Atalho para scripts standalone: encerra com status 1 se 'name' já estiver
+    em execução. A trava fica presa ao processo até ele terminar.
+    """
+    lock = acquire_instance_lock(name)
+    if lock is None:
+        holder = InstanceLock(lock_path_for(name)).holder()
+        print(f"Script já está em execução em outro processo ({holder or 'PID desconhecido'}).")
+        sys.exit(1)
+    _held.append(lock)
+
@@ -5,20 +5,14 @@ import os
 import sys
 import argparse
 import logging
-import psutil
 import importlib
 from textwrap import dedent
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pdv_asset_manager import download_assets_for_action
 
+# Só módulos leves no topo: paramiko/requests (SSH, Zabbix, assets) são
+# importados em main() depois do despacho das ações locais, que não os usam.
 from utils import setup_logging
-from zabbix_client import (
-    get_hosts,
-    get_triggers,
-    get_hosts_by_trigger_ids,
-    get_hosts_by_trigger_name,
-)
-from process_one import process_one
+from instance_lock import InstanceLock, acquire_instance_lock, lock_path_for
+from fleet_executor import ENGINES
 from provider_adapter import (
     resolve_provider,
     translate_action_for_provider,
@@ -48,12 +42,15 @@ def parse_args():
     """
     Analisa os argumentos da linha de comando. Agora espera uma ação posicional.
     """
-    available_actions = list_available_actions()
-    actions_help = (
-        "Ações disponíveis:\n- " + "\n- ".join(available_actions)
-        if available_actions
-        else "Nenhuma ação encontrada em 'actions/'."
-    )
+    # A lista de ações só é montada quando a ajuda vai ser exibida
+    actions_help = None
+    if {"-h", "--help"} & set(sys.argv[1:]):
+        available_actions = list_available_actions()
+        actions_help = (
+            "Ações disponíveis:\n- " + "\n- ".join(available_actions)
+            if available_actions
+            else "Nenhuma ação encontrada em 'actions/'."
+        )
 
     parser = argparse.ArgumentParser(
         description=dedent(
@@ -120,49 +117,62 @@ def parse_args():
         help="Provider alvo da execução (ex: arius, zanthus). Default via config PARAM_PROVIDER ou 'arius'.",
     )
     
+    parser.add_argument(
+        "--chain",
+        type=str,
+        help="Ações adicionais (separadas por vírgula) executadas em sequência na mesma sessão SSH de cada host.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(ENGINES),
+        help="Engine de execução da frota: 'threads' (default), 'async' ou 'adaptive' (default via config: PARAM_FLEET_ENGINE).",
+    )
+
+    parser.add_argument(
+        "--skip-preflight",
+        dest="skip_preflight",
+        action="store_true",
+        help="Não faz a pré-verificação TCP da porta SSH antes de processar os hosts.",
+    )
+
+    resume_group = parser.add_mutually_exclusive_group()
+    resume_group.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Retoma a execução RUN_ID, pulando os hosts já concluídos com sucesso (diário em PARAM_BASE_DIR/runs).",
+    )
+    resume_group.add_argument(
+        "--retry-failed",
+        dest="retry_failed",
+        metavar="RUN_ID",
+        help="Reprocessa apenas os hosts que falharam na execução RUN_ID.",
+    )
+
     parser.add_argument("--dry-run", action="store_true", help="Não altera nada nos hosts; apenas resolve templates e mostra o conteúdo que seria aplicado.")
 
     return parser.parse_args()
 
 
+def _parse_chain(raw_value: str | None, provider: str, logger: logging.Logger) -> list[tuple[str, str]]:
+    chain = []
+    if not raw_value:
+        return chain
+    for part in raw_value.split(","):
+        name = part.strip()
+        if not name:
+            continue
+        translated, _ = translate_action_for_provider(name, provider, logger)
+        resolved, canonical, _ = resolve_action_name(translated)
+        chain.append((resolved, canonical))
+    return chain
+
+
 def _parse_trigger_ids(raw_value: str | None) -> list[str]:
     if not raw_value:
         return []
     return [part.strip() for part in raw_value.split(",") if part.strip()]
 
 
-def is_already_running():
-    """
-    Verifica se já existe outra instância deste mesmo script em execução,
-    comparando o interpretador e o caminho do script.
-    """
-    try:
-        current_process = psutil.Process()
-        my_script_path = sys.argv[0]
-        my_interpreter_path = sys.executable
-
-        # Itera sobre todos os processos
-        for proc in psutil.process_iter(['pid', 'exe', 'cmdline']):
-            # Ignora o processo atual e processos 'zumbis' que não podem ser lidos
-            if proc.pid == current_process.pid or proc.status() == psutil.STATUS_ZOMBIE:
-                continue
-
-            # Critério 1: O processo está usando o mesmo interpretador Python?
-            if proc.info.get('exe') == my_interpreter_path:
-                cmdline = proc.info.get('cmdline')
-                
-                # Critério 2: O processo está executando o mesmo arquivo de script?
-                if cmdline and len(cmdline) > 1 and cmdline[1] == my_script_path:
-                    # Encontramos outra instância exata do nosso script.
-                    return True
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
-        # Ignora erros de processos que morrem durante a iteração
-        pass
-        
-    # Se o loop terminar sem encontrar outra instância, retorna False
-    return False
-
-
 def main():
     # Carrega a configuração principal
     try:
@@ -175,11 +185,6 @@ def main():
     args = parse_args()
     logger = setup_logging(config, debug=args.debug)
 
-    # Verifica instâncias concorrentes
-    if is_already_running():
-        logger.error("Outra instância do bot_ariusmonitor já está em execução.")
-        sys.exit(1)
-
     requested_action = args.action
     args.provider = resolve_provider(config, args)
     provider_translated_action, translated_by_provider = translate_action_for_provider(
@@ -205,6 +210,16 @@ def main():
             f"(canônica: '{canonical_action}', provider: '{args.provider}')."
         )
 
+    # Uma instância por ação: ações diferentes podem rodar em paralelo
+    instance_lock = acquire_instance_lock(f"bot_ariusmonitor-{args.action}")
+    if instance_lock is None:
+        holder = InstanceLock(lock_path_for(f"bot_ariusmonitor-{args.action}")).holder()
+        logger.error(
+            f"Outra instância do bot_ariusmonitor já está executando a ação '{args.action}'"
+            f" ({holder or 'PID desconhecido'})."
+        )
+        sys.exit(1)
+
     logger.info(f"Ação '{args.action}' versão {get_action_version(args.action)}")
     if args.debug:
         logger.debug(
@@ -249,12 +264,34 @@ def main():
         logger.info(f"=== FIM DA EXECUÇÃO | AÇÃO LOCAL '{args.action}' ===")
         sys.exit(0)
 
-    # Só executa o download se a ação estiver na lista de pré-requisitos.
-    if args.action in ACTIONS_REQUIRING_ASSETS:
-        logger.info(f"Ação '{args.action}' requer assets. Iniciando preparação...")
-        if not download_assets_for_action(args.action, config):
-            logger.critical("Não foi possível baixar os arquivos necessários. Abortando a execução.")
-            sys.exit(1)
+    args.chain_actions = _parse_chain(args.chain, args.provider, logger)
+    chained_local = [resolved for resolved, _ in args.chain_actions if resolved in LOCAL_ONLY_ACTIONS]
+    if chained_local:
+        logger.critical(f"Ações locais não podem ser encadeadas via --chain: {', '.join(chained_local)}")
+        sys.exit(1)
+    if args.chain_actions:
+        logger.info(
+            "Modo chain: " + " -> ".join([args.action] + [resolved for resolved, _ in args.chain_actions])
+            + " na mesma sessão SSH."
+        )
+
+    from pdv_asset_manager import download_assets_for_action
+    from zabbix_client import (
+        get_hosts,
+        get_triggers,
+        get_hosts_by_trigger_ids,
+        get_hosts_by_trigger_name,
+    )
+    from fleet_executor import run_fleet
+    from run_journal import select_hosts
+
+    # Só executa o download se alguma ação (principal ou encadeada) estiver na lista de pré-requisitos.
+    for asset_action in [args.action] + [resolved for resolved, _ in args.chain_actions]:
+        if asset_action in ACTIONS_REQUIRING_ASSETS:
+            logger.info(f"Ação '{asset_action}' requer assets. Iniciando preparação...")
+            if not download_assets_for_action(asset_action, config):
+                logger.critical("Não foi possível baixar os arquivos necessários. Abortando a execução.")
+                sys.exit(1)
 
     # Prepara o dicionário de filtros
     filters = {
@@ -292,29 +329,16 @@ def main():
         logger.warning("Nenhum host encontrado para processar. Encerrando.")
         sys.exit(0)
 
-    max_threads = int(config.get("max_threads", 50))
-    logger.info(f"Processando {len(hosts)} hosts com até {max_threads} threads...")
-
-    # Multithreading para processar os hosts
-    with ThreadPoolExecutor(max_workers=max_threads) as executor:
-        # Cria um futuro para cada host, passando a ação a ser executada via 'args'
-        future_to_host = {
-            executor.submit(process_one, host, config, args, logger): host
-            for host in hosts
-        }
-        
-        processed_count = 0
-        for future in as_completed(future_to_host):
-            host = future_to_host[future]
-            try:
-                future.result()  # Pega o resultado (ou exceção) da thread
-            except Exception as e:
-                # Este 'except' é uma segurança extra, mas os erros já são tratados em process_one
-                logger.critical(f"Erro fatal não tratado no processamento do host {host.get('host')}: {e}")
-            
-            processed_count += 1
-            if processed_count % 100 == 0:
-                logger.info(f"{processed_count}/{len(hosts)} hosts processados...")
+    try:
+        hosts = select_hosts(hosts, config, args, logger)
+    except FileNotFoundError as e:
+        logger.critical(str(e))
+        sys.exit(1)
+    if not hosts:
+        logger.info(f"Nenhum host pendente na execução '{args.run_id}'. Encerrando.")
+        sys.exit(0)
+
+    run_fleet(hosts, config, args, logger)
 
     logger.info(f"=== FIM DA EXECUÇÃO | {len(hosts)} HOSTS PROCESSADOS ===")
 
@@ -1,24 +1,224 @@
 # pdv_asset_manager.py
+"""
+Prepara os assets enviados aos PDVs em PARAM_LOCAL_ASSET_DIR.
+
+- Manifesto remoto ({repo}/manifest.json): {"files": [{"name", "size",
+  "sha256", "etag"}]}. Sem manifesto, cada arquivo é consultado com HEAD
+  (tamanho/ETag/Last-Modified), em paralelo.
+- Downloads em paralelo (PARAM_ASSET_DOWNLOAD_WORKERS), em streaming para
+  '<arquivo>.part', retomados com Range/If-Range e movidos com rename atômico.
+- Índice local de hashes (.asset_index.json) por (inode, mtime, tamanho):
+  arquivos inalterados não são lidos de novo.
+"""
 import os
+import json
 import logging
 import requests
 import hashlib
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from utils import GREEN, RED, NC
 
 # This dictionary will be populated by the download function and used by other modules.
 LOCAL_CHECKSUMS = {}
 
+INDEX_NAME = ".asset_index.json"
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = (15, 120)
+
+_index_lock = threading.Lock()
+
+
 def _calculate_local_checksum(file_path: str) -> str:
     sha256_hash = hashlib.sha256()
     try:
         with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
+            for byte_block in iter(lambda: f.read(CHUNK_SIZE), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
     except FileNotFoundError:
         return None
 
+
+def _load_index(local_dir: str) -> dict:
+    try:
+        with open(os.path.join(local_dir, INDEX_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(local_dir: str, index: dict):
+    path = os.path.join(local_dir, INDEX_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _file_identity(path: str) -> list | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def _indexed_checksum(index: dict, filename: str, path: str) -> str | None:
+    """
+    sha256 do arquivo, reaproveitando o índice enquanto (inode, mtime, tamanho)
+    não mudarem.
+    """
+    identity = _file_identity(path)
+    if identity is None:
+        return None
+    with _index_lock:
+        entry = index.get(filename) or {}
+        if entry.get("identity") == identity and entry.get("sha256"):
+            return entry["sha256"]
+    checksum = _calculate_local_checksum(path)
+    with _index_lock:
+        entry = index.setdefault(filename, {})
+        entry.update({"identity": identity, "sha256": checksum})
+    return checksum
+
+
+def _fetch_manifest(session: requests.Session, repo_url: str, filenames: list, workers: int) -> dict:
+    """
+    {nome: {"size", "sha256", "etag", "last_modified"}}; campos ausentes ficam None.
+    """
+    logger = logging.getLogger()
+    try:
+        response = session.get(f"{repo_url}/{MANIFEST_NAME}", timeout=DOWNLOAD_TIMEOUT)
+        if response.status_code == 200:
+            data = response.json()
+            entries = data.get("files", []) if isinstance(data, dict) else data
+            manifest = {e["name"]: e for e in entries if isinstance(e, dict) and e.get("name")}
+            if all(name in manifest for name in filenames):
+                return manifest
+            logger.debug("Manifesto remoto incompleto; completando com HEAD.")
+        else:
+            logger.debug(f"Manifesto remoto indisponível (HTTP {response.status_code}); usando HEAD.")
+            manifest = {}
+    except (requests.RequestException, ValueError) as e:
+        logger.debug(f"Manifesto remoto indisponível ({e}); usando HEAD.")
+        manifest = {}
+
+    def _head(name):
+        try:
+            response = session.head(f"{repo_url}/{name}", timeout=DOWNLOAD_TIMEOUT, allow_redirects=True)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            # Repositório fora do ar: entrada vazia mantém a cópia local já
+            # indexada; só falha depois, se o arquivo faltar de fato.
+            logger.warning(f"Não foi possível consultar {name} no repositório ({e}).")
+            return name, {"name": name, "size": None, "etag": None, "last_modified": None}
+        length = response.headers.get("Content-Length")
+        return name, {
+            "name": name,
+            "size": int(length) if length and length.isdigit() else None,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    missing = [name for name in filenames if name not in manifest]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing) or 1))) as executor:
+        for name, entry in executor.map(_head, missing):
+            manifest[name] = entry
+    return manifest
+
+
+def _needs_download(index: dict, filename: str, local_path: str, remote: dict) -> bool:
+    local_checksum = _indexed_checksum(index, filename, local_path)
+    if local_checksum is None:
+        return True
+    if remote.get("sha256"):
+        return local_checksum != remote["sha256"]
+    entry = index.get(filename, {})
+    if remote.get("size") is not None and os.path.getsize(local_path) != remote["size"]:
+        return True
+    for field in ("etag", "last_modified"):
+        # Só compara o que foi registrado num download anterior
+        if remote.get(field) and entry.get(field) and remote[field] != entry[field]:
+            return True
+    return False
+
+
+def _discard_partial(part_path: str, validator_path: str):
+    for path in (part_path, validator_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _download(session: requests.Session, url: str, local_path: str, remote: dict) -> str:
+    """
+    Baixa para '<local_path>.part' retomando de onde parou quando o validador
+    (ETag/Last-Modified) do parcial ainda vale, confere o sha256 do manifesto
+    e renomeia atomicamente. Retorna o sha256 do arquivo final.
+    """
+    part_path = f"{local_path}.part"
+    validator_path = f"{part_path}.validator"
+    validator = remote.get("etag") or remote.get("last_modified")
+
+    headers = {}
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and offset == remote.get("size"):
+        # Parcial já completo (queda entre o fsync e o rename): o Range daria 416
+        _discard_partial(part_path, validator_path)
+        offset = 0
+    previous_validator = None
+    if os.path.exists(validator_path):
+        with open(validator_path) as f:
+            previous_validator = f.read().strip() or None
+    if offset and previous_validator:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = previous_validator
+    else:
+        offset = 0
+
+    with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 416 and "Range" in headers:
+            # Parcial não cabe mais no arquivo remoto: descarta e baixa do zero
+            _discard_partial(part_path, validator_path)
+            return _download(session, url, local_path, remote)
+        response.raise_for_status()
+        resumed = response.status_code == 206
+        if validator:
+            with open(validator_path, "w") as f:
+                f.write(validator)
+        sha = hashlib.sha256()
+        if resumed:
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(block)
+        with open(part_path, "ab" if resumed else "wb") as f:
+            for block in response.iter_content(chunk_size=CHUNK_SIZE):
+                sha.update(block)
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+    checksum = sha.hexdigest()
+    if remote.get("sha256") and checksum != remote["sha256"]:
+        os.remove(part_path)
+        raise ValueError(f"sha256 divergente do manifesto para {os.path.basename(local_path)}")
+    os.replace(part_path, local_path)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    return checksum
+
+
+def _copy_from_source(source_path: str, local_path: str):
+    # Nome próprio: um '.part' de cópia interrompida não pode ser retomado
+    # como download HTTP
+    tmp_path = f"{local_path}.relay.tmp"
+    shutil.copy2(source_path, tmp_path)
+    os.replace(tmp_path, local_path)
+
+
 def download_assets_for_action(action: str, config: dict) -> bool:
     """
     Verifica a ação e baixa os arquivos necessários, calculando e populando
@@ -30,7 +230,8 @@ def download_assets_for_action(action: str, config: dict) -> bool:
     source_dir = config.get("PARAM_LOCAL_REPO_DIR")
     if not source_dir and os.path.isdir("/ariusmonitor/repositorio"):
         source_dir = "/ariusmonitor/repositorio"
-    
+    workers = max(1, int(config.get("PARAM_ASSET_DOWNLOAD_WORKERS", DEFAULT_DOWNLOAD_WORKERS)))
+
     files_to_download = []
     if action == "pdv_install":
         files_to_download.append("ariusmonitor.tar.gz")
@@ -39,37 +240,65 @@ def download_assets_for_action(action: str, config: dict) -> bool:
             "geral.conf", "MonitoraSATc", "MonitoraSATc64",
             "MonitoraSAT.sh", "MonitoraImpressora", "libs.tar.gz"
         ])
-    
+
     if not files_to_download:
         return True
-        
+
     logger.info(f"Preparando assets para a ação '{action}'...")
     try:
         os.makedirs(local_dir, exist_ok=True)
+        index = _load_index(local_dir)
+        filenames = sorted(set(files_to_download))
+
+        local_sources = {}
         if source_dir:
             logger.info(f"Usando assets locais de '{source_dir}' como fonte primária.")
-        for filename in set(files_to_download):
+            for filename in filenames:
+                source_path = os.path.join(source_dir, filename)
+                if os.path.exists(source_path):
+                    local_sources[filename] = source_path
+
+        for filename, source_path in local_sources.items():
             local_path = os.path.join(local_dir, filename)
-            logger.info(f"Baixando/Verificando asset: {filename}...")
-            source_path = os.path.join(source_dir, filename) if source_dir else None
-            if source_path and os.path.exists(source_path):
-                if os.path.abspath(source_path) != os.path.abspath(local_path):
-                    source_checksum = _calculate_local_checksum(source_path)
-                    local_checksum = _calculate_local_checksum(local_path) if os.path.exists(local_path) else None
-                    if local_checksum != source_checksum:
-                        shutil.copy2(source_path, local_path)
-            else:
-                # Simple check to avoid re-downloading if file exists. A more robust check
-                # could involve checking a manifest file from the repo first.
-                if not os.path.exists(local_path):
-                    response = requests.get(f"{repo_url}/{filename}", timeout=120)
-                    response.raise_for_status()
-                    with open(local_path, 'wb') as f:
-                        f.write(response.content)
-
-            # Always calculate and store the checksum of the local file
-            LOCAL_CHECKSUMS[filename] = _calculate_local_checksum(local_path)
-        
+            if os.path.abspath(source_path) == os.path.abspath(local_path):
+                continue
+            source_checksum = _indexed_checksum(index, f"source:{filename}", source_path)
+            if _indexed_checksum(index, filename, local_path) != source_checksum:
+                logger.info(f"Copiando asset local: {filename}...")
+                _copy_from_source(source_path, local_path)
+
+        remote_files = [f for f in filenames if f not in local_sources]
+        if remote_files:
+            with requests.Session() as session:
+                manifest = _fetch_manifest(session, repo_url, remote_files, workers)
+                to_download = [
+                    f for f in remote_files
+                    if _needs_download(index, f, os.path.join(local_dir, f), manifest.get(f, {}))
+                ]
+                for filename in remote_files:
+                    if filename not in to_download:
+                        logger.info(f"Asset {filename} já está atualizado.")
+
+                def _fetch(filename):
+                    logger.info(f"Baixando asset: {filename}...")
+                    local_path = os.path.join(local_dir, filename)
+                    remote = manifest.get(filename, {})
+                    _download(session, f"{repo_url}/{filename}", local_path, remote)
+                    with _index_lock:
+                        entry = index.setdefault(filename, {})
+                        entry["etag"] = remote.get("etag")
+                        entry["last_modified"] = remote.get("last_modified")
+
+                if to_download:
+                    with ThreadPoolExecutor(max_workers=min(workers, len(to_download))) as executor:
+                        list(executor.map(_fetch, to_download))
+
+        # Checksums vêm do índice; só arquivos novos/alterados são relidos
+        for filename in filenames:
+            local_path = os.path.join(local_dir, filename)
+            LOCAL_CHECKSUMS[filename] = _indexed_checksum(index, filename, local_path)
+        _save_index(local_dir, index)
+
         logger.info(f"{GREEN}Todos os assets necessários estão prontos.{NC}")
         return True
     except Exception as e:
@@ -1,9 +1,11 @@
-import redis
+import os
 import time
+import asyncio
 import json
 import logging # Import the logging library
-from fastapi import FastAPI, HTTPException, Response
-from pydantic import BaseModel, Field
+import redis.asyncio as redis
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field, ValidationError
 from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any
 
@@ -19,28 +21,180 @@ class PdvEvent(BaseModel):
     data: Dict[str, Any] = {}
 
 # --- Conexão com Redis ---
+# Cliente assíncrono com pool: os handlers não bloqueiam mais o event loop.
+REDIS_URL = os.environ.get("PDVSTATE_REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("PDVSTATE_REDIS_MAX_CONNECTIONS", "128"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("PDVSTATE_REDIS_POOL_TIMEOUT", "10"))
+
 redis_client = None
 
+# --- Vendas em hash (venda:{cupom}) ---
+# Campos numéricos guardados como texto e convertidos na leitura; os que vêm
+# livres do PDV (valor, itens, erro TEF) ficam em JSON para manter o tipo.
+VENDA_INT_FIELDS = {"loja_id", "pdv_id", "timestamp_inicio", "timestamp_fim", "duracao_segundos"}
+VENDA_JSON_FIELDS = {"valor_total", "qtd_itens", "erro_tef"}
+
+# Vendas gravadas pela versão anterior são strings JSON: o prelúdio converte
+# para hash na primeira escrita, sem perder a venda em andamento.
+_LUA_PRELUDE = """
+local INT_FIELDS = {loja_id=true, pdv_id=true, timestamp_inicio=true, timestamp_fim=true, duracao_segundos=true}
+local JSON_FIELDS = {valor_total=true, qtd_itens=true, erro_tef=true}
+local function venda_existe(key)
+  local tipo = redis.call('TYPE', key)['ok']
+  if tipo == 'string' then
+    local data = cjson.decode(redis.call('GET', key))
+    redis.call('DEL', key)
+    for campo, valor in pairs(data) do
+      if JSON_FIELDS[campo] then
+        redis.call('HSET', key, campo, cjson.encode(valor))
+      elseif valor ~= cjson.null then
+        if INT_FIELDS[campo] then valor = string.format('%d', valor) end
+        redis.call('HSET', key, campo, tostring(valor))
+      end
+    end
+    return true
+  end
+  return tipo == 'hash'
+end
+"""
+
+# KEYS[1]=pdv  ARGV[1]=operador_id
+LUA_UPDATE_OPERADOR = """
+redis.call('HSET', KEYS[1], 'operador_id', ARGV[1])
+local estado = redis.call('HGET', KEYS[1], 'estado_atual')
+if not estado or estado == 'FECHADO' then
+  redis.call('HSET', KEYS[1], 'estado_atual', 'LIVRE')
+end
+return 1
+"""
+
+# KEYS[1]=pdv KEYS[2]=venda  ARGV: cupom, loja_id, pdv_id, agora
+LUA_VENDA_CUPOM = """
+redis.call('HSET', KEYS[1], 'venda_atual_cupom', ARGV[1])
+local operador = redis.call('HGET', KEYS[1], 'operador_id')
+redis.call('DEL', KEYS[2])
+redis.call('HSET', KEYS[2], 'cupom_fiscal', ARGV[1], 'loja_id', ARGV[2], 'pdv_id', ARGV[3],
+           'timestamp_inicio', ARGV[4], 'status', 'EM_ANDAMENTO')
+if operador then
+  redis.call('HSET', KEYS[2], 'operador_id', operador)
+end
+return 1
+"""
+
+# KEYS[1]=venda  ARGV: campo, valor, ...  -> 1 se a venda existe
+LUA_ATUALIZA_VENDA = _LUA_PRELUDE + """
+if not venda_existe(KEYS[1]) then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV))
+return 1
+"""
+
+# KEYS[1]=pdv  ARGV: campo, valor, ...  -> cupom da venda em andamento (ou false)
+# A chave da venda sai do próprio hash do PDV (instância única, sem cluster).
+LUA_ATUALIZA_VENDA_ATUAL = _LUA_PRELUDE + """
+local cupom = redis.call('HGET', KEYS[1], 'venda_atual_cupom')
+if not cupom or cupom == '' then return false end
+local venda = 'venda:' .. cupom
+if venda_existe(venda) then
+  redis.call('HSET', venda, unpack(ARGV))
+end
+return cupom
+"""
+
+# KEYS[1]=pdv  ARGV[1]=agora  -> cupom finalizado (ou false)
+LUA_FIM_VENDA = _LUA_PRELUDE + """
+local cupom = redis.call('HGET', KEYS[1], 'venda_atual_cupom')
+if cupom and cupom ~= '' then
+  local venda = 'venda:' .. cupom
+  if venda_existe(venda) then
+    local agora = tonumber(ARGV[1])
+    local status = redis.call('HGET', venda, 'status') or ''
+    if status == 'EM_ANDAMENTO' then
+      status = 'CONCLUIDA'
+    end
+    local inicio = tonumber(redis.call('HGET', venda, 'timestamp_inicio') or agora) or agora
+    local duracao = agora - inicio
+    redis.call('HSET', venda, 'status', status, 'timestamp_fim', ARGV[1], 'duracao_segundos', duracao)
+    if status == 'CONCLUIDA' then
+      redis.call('HINCRBY', KEYS[1], 'contador_vendas_dia', 1)
+      redis.call('HINCRBYFLOAT', KEYS[1], 'duracao_total_vendas_dia', duracao)
+    end
+  end
+end
+redis.call('HSET', KEYS[1], 'estado_atual', 'LIVRE', 'venda_atual_cupom', '')
+return cupom
+"""
+
+scripts = {}
+
+
+def register_scripts(client):
+    # register_script usa EVALSHA e recarrega o script sozinho após NOSCRIPT
+    scripts["update_operador"] = client.register_script(LUA_UPDATE_OPERADOR)
+    scripts["venda_cupom"] = client.register_script(LUA_VENDA_CUPOM)
+    scripts["atualiza_venda"] = client.register_script(LUA_ATUALIZA_VENDA)
+    scripts["atualiza_venda_atual"] = client.register_script(LUA_ATUALIZA_VENDA_ATUAL)
+    scripts["fim_venda"] = client.register_script(LUA_FIM_VENDA)
+
+
+def encode_venda_fields(fields: dict) -> list:
+    """
+    {campo: valor} -> [campo, valor, ...] no formato dos hashes de venda.
+    """
+    args = []
+    for campo, valor in fields.items():
+        if campo in VENDA_JSON_FIELDS:
+            valor = json.dumps(valor)
+        elif valor is None:
+            valor = ""
+        args.extend([campo, str(valor)])
+    return args
+
+
+def decode_venda(data: dict) -> dict:
+    venda = {}
+    for campo, valor in data.items():
+        if campo in VENDA_JSON_FIELDS:
+            try:
+                valor = json.loads(valor)
+            except ValueError:
+                pass
+        elif campo in VENDA_INT_FIELDS:
+            try:
+                valor = int(valor)
+            except ValueError:
+                pass
+        venda[campo] = valor
+    venda.setdefault("operador_id", None)
+    return venda
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global redis_client
+    # Pool bloqueante: com todas as conexões em uso a requisição espera uma
+    # livre (até REDIS_POOL_TIMEOUT) em vez de falhar com "Too many connections".
+    pool = redis.BlockingConnectionPool.from_url(
+        REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT, decode_responses=True
+    )
     try:
-        redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
-        redis_client.ping()
+        redis_client = redis.Redis(connection_pool=pool)
+        await redis_client.ping()
+        register_scripts(redis_client)
         logging.info("Conexão com o Redis estabelecida com sucesso!")
-    except redis.exceptions.ConnectionError as e:
+    except redis.ConnectionError as e:
         logging.error(f"ERRO CRÍTICO: Não foi possível conectar ao Redis. {e}")
         redis_client = None
     yield
     if redis_client:
         logging.info("Encerrando a conexão com o Redis.")
-        redis_client.close()
+        await redis_client.aclose()
+    await pool.aclose()
 
 # --- Configuração da Aplicação ---
 app = FastAPI(
     title="PDVState API",
     description="API avançada para monitoramento em tempo real dos PDVs e transações.",
-    version="2.3.0", # Version incremented with better logging
+    version="2.5.0", # /pdv/events: lotes por PDV em um pipeline
     lifespan=lifespan
 )
 
@@ -76,153 +230,220 @@ async def get_config_rules():
 
 
 # --- Endpoint de Eventos ---
-@app.post("/pdv/event")
-async def process_pdv_event(event: PdvEvent):
-    if not redis_client:
-        raise HTTPException(status_code=503, detail="Serviço indisponível: Sem conexão com o Redis.")
-    
+# Cada transição é um único comando ou script Lua: atômica e com uma ida ao Redis.
+# apply_event recebe o cliente (executa na hora) ou um pipeline (só enfileira, usado
+# pelo /pdv/events) e devolve (resultado, responder): responder(resultado) monta a
+# resposta. NO_COMMAND indica evento que não toca o Redis.
+NO_COMMAND = object()
+
+
+def _message(text: str):
+    return lambda result: {"message": text}
+
+
+async def apply_event(target, event: PdvEvent):
     pdv_key = f"pdv:{event.loja_id}:{event.pdv_id}"
-    
+
     # Roteador de eventos
     if event.event_type == "UPDATE_OPERADOR":
         operador_id = event.data.get("operador_id", "desconhecido")
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Operador {operador_id} logado.")
-        estado_atual = redis_client.hget(pdv_key, "estado_atual")
-        pipe = redis_client.pipeline()
-        pipe.hset(pdv_key, "operador_id", operador_id)
-        if estado_atual == "FECHADO" or estado_atual is None:
-             pipe.hset(pdv_key, "estado_atual", "LIVRE")
-        pipe.execute()
-        return {"message": "Operador logado."}
+        result = await scripts["update_operador"](keys=[pdv_key], args=[operador_id], client=target)
+        return result, _message("Operador logado.")
 
     elif event.event_type == "OPERADOR_LOGOFF":
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Operador deslogou.")
-        redis_client.hset(pdv_key, mapping={"estado_atual": "FECHADO", "operador_id": ""})
-        return {"message": "Operador deslogou."}
+        result = await target.hset(pdv_key, mapping={"estado_atual": "FECHADO", "operador_id": ""})
+        return result, _message("Operador deslogou.")
 
     elif event.event_type == "INICIO_VENDA":
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Venda iniciada.")
-        redis_client.hset(pdv_key, "estado_atual", "VENDENDO")
-        return {"message": "PDV em estado de venda."}
+        result = await target.hset(pdv_key, "estado_atual", "VENDENDO")
+        return result, _message("PDV em estado de venda.")
 
     elif event.event_type == "VENDA_CUPOM":
         cupom = event.data.get("cupom_fiscal")
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Venda criada com Cupom Fiscal {cupom}.")
         if not cupom: raise HTTPException(status_code=400, detail="Cupom fiscal não informado.")
-        venda_key = f"venda:{cupom}"
-        redis_client.hset(pdv_key, "venda_atual_cupom", cupom)
-        venda_data = {
-            "cupom_fiscal": cupom, "loja_id": event.loja_id, "pdv_id": event.pdv_id,
-            "operador_id": redis_client.hget(pdv_key, "operador_id"),
-            "timestamp_inicio": int(time.time()), "status": "EM_ANDAMENTO"
-        }
-        redis_client.set(venda_key, json.dumps(venda_data))
-        return {"message": f"Venda {cupom} iniciada."}
+        result = await scripts["venda_cupom"](
+            keys=[pdv_key, f"venda:{cupom}"],
+            args=[cupom, event.loja_id, event.pdv_id, int(time.time())],
+            client=target,
+        )
+        return result, _message(f"Venda {cupom} iniciada.")
 
     elif event.event_type == "VENDA_DETALHES":
-        cupom = redis_client.hget(pdv_key, "venda_atual_cupom")
         valor = event.data.get('valor_total')
         itens = event.data.get('qtd_itens')
-        logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Detalhes da Venda {cupom} recebidos. Valor: R$ {valor}, Itens: {itens}.")
-        if not cupom: return {"message": "Detalhes recebidos sem venda em andamento."}
-        venda_key = f"venda:{cupom}"
-        venda_str = redis_client.get(venda_key)
-        if venda_str:
-            venda_data = json.loads(venda_str)
-            venda_data["valor_total"] = valor
-            venda_data["qtd_itens"] = itens
-            redis_client.set(venda_key, json.dumps(venda_data))
-        return {"message": f"Detalhes da venda {cupom} atualizados."}
+        result = await scripts["atualiza_venda_atual"](
+            keys=[pdv_key], args=encode_venda_fields({"valor_total": valor, "qtd_itens": itens}), client=target
+        )
+
+        def responder(cupom):
+            logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Detalhes da Venda {cupom} recebidos. Valor: R$ {valor}, Itens: {itens}.")
+            if not cupom: return {"message": "Detalhes recebidos sem venda em andamento."}
+            return {"message": f"Detalhes da venda {cupom} atualizados."}
+        return result, responder
 
     elif event.event_type == "PAGAMENTO":
         cupom = event.data.get("cupom_fiscal")
         forma_pagamento = event.data.get('forma_pagamento')
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Pagamento para Venda {cupom} recebido. Forma: {forma_pagamento}.")
-        if not cupom: return {"message": "Pagamento recebido sem cupom."}
-        venda_key = f"venda:{cupom}"
-        venda_str = redis_client.get(venda_key)
-        if venda_str:
-            venda_data = json.loads(venda_str)
-            venda_data["forma_pagamento"] = forma_pagamento
-            redis_client.set(venda_key, json.dumps(venda_data))
-        return {"message": f"Pagamento da venda {cupom} atualizado."}
+        if not cupom: return NO_COMMAND, _message("Pagamento recebido sem cupom.")
+        result = await scripts["atualiza_venda"](
+            keys=[f"venda:{cupom}"], args=encode_venda_fields({"forma_pagamento": forma_pagamento}), client=target
+        )
+        return result, _message(f"Pagamento da venda {cupom} atualizado.")
 
     # NOVO: Associa o cupom do TEF à venda em andamento
     elif event.event_type == "PAGAMENTO_CUPOM":
         cupom = event.data.get("cupom_fiscal")
-        if not cupom: return {"message": "Cupom de pagamento sem ID."}
+        if not cupom: return NO_COMMAND, _message("Cupom de pagamento sem ID.")
 
         # Apenas atualiza o cupom na venda que já deve existir
-        venda_key = f"venda:{cupom}"
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Associando TEF à Venda {cupom}.")
         # Se necessário, você pode adicionar o cupom do TEF à venda aqui.
-        return {"message": f"Cupom TEF {cupom} associado."}
+        return NO_COMMAND, _message(f"Cupom TEF {cupom} associado.")
 
     # NOVO: Atualiza a forma de pagamento na venda em andamento
     elif event.event_type == "PAGAMENTO_FORMA":
         forma_pagamento = event.data.get("forma_pagamento", "desconhecida").strip()
-        # Pega a venda que está em andamento neste PDV
-        cupom = redis_client.hget(pdv_key, "venda_atual_cupom")
-        if not cupom: return {"message": "Forma de pagamento recebida, mas nenhuma venda em andamento."}
-        
-        logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Pagamento para Venda {cupom}. Forma: {forma_pagamento}.")
-        venda_key = f"venda:{cupom}"
-        venda_str = redis_client.get(venda_key)
-        if venda_str:
-            venda_data = json.loads(venda_str)
-            venda_data["forma_pagamento"] = forma_pagamento
-            redis_client.set(venda_key, json.dumps(venda_data))
-        return {"message": f"Pagamento da venda {cupom} atualizado."}
+        # Atualiza a venda que está em andamento neste PDV
+        result = await scripts["atualiza_venda_atual"](
+            keys=[pdv_key], args=encode_venda_fields({"forma_pagamento": forma_pagamento}), client=target
+        )
+
+        def responder(cupom):
+            if not cupom: return {"message": "Forma de pagamento recebida, mas nenhuma venda em andamento."}
+            logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Pagamento para Venda {cupom}. Forma: {forma_pagamento}.")
+            return {"message": f"Pagamento da venda {cupom} atualizado."}
+        return result, responder
 
     elif event.event_type == "ERRO_TEF":
         rc = event.data.get('rc')
         msg = event.data.get('msg')
         logging.warning(f"PDV {event.loja_id}-{event.pdv_id}: ERRO DE PAGAMENTO! Código: {rc}, Mensagem: '{msg}'.")
-        cupom = redis_client.hget(pdv_key, "venda_atual_cupom")
-        if cupom:
-            venda_key = f"venda:{cupom}"
-            venda_str = redis_client.get(venda_key)
-            if venda_str:
-                venda_data = json.loads(venda_str)
-                venda_data["status"] = "FALHA_PAGAMENTO"
-                venda_data["erro_tef"] = event.data
-                redis_client.set(venda_key, json.dumps(venda_data))
-        return {"message": "Erro TEF registrado."}
+        result = await scripts["atualiza_venda_atual"](
+            keys=[pdv_key], args=encode_venda_fields({"status": "FALHA_PAGAMENTO", "erro_tef": event.data}),
+            client=target,
+        )
+        return result, _message("Erro TEF registrado.")
 
     elif event.event_type == "FIM_VENDA":
         logging.info(f"PDV {event.loja_id}-{event.pdv_id}: Fim da operação de venda.")
-        cupom = redis_client.hget(pdv_key, "venda_atual_cupom")
-        if cupom:
-            venda_key = f"venda:{cupom}"
-            venda_str = redis_client.get(venda_key)
-            if venda_str:
-                venda_data = json.loads(venda_str)
-                if venda_data.get("status") == "EM_ANDAMENTO":
-                    venda_data["status"] = "CONCLUIDA"
-                venda_data["timestamp_fim"] = int(time.time())
-                duracao = venda_data["timestamp_fim"] - venda_data.get("timestamp_inicio", venda_data["timestamp_fim"])
-                venda_data["duracao_segundos"] = duracao
-                redis_client.set(venda_key, json.dumps(venda_data))
-                if venda_data["status"] == "CONCLUIDA":
-                    pipe = redis_client.pipeline()
-                    pipe.hincrby(pdv_key, "contador_vendas_dia", 1)
-                    pipe.hincrbyfloat(pdv_key, "duracao_total_vendas_dia", duracao)
-                    pipe.execute()
-        redis_client.hset(pdv_key, mapping={"estado_atual": "LIVRE", "venda_atual_cupom": ""})
-        return {"message": "Venda finalizada."}
-        
+        result = await scripts["fim_venda"](keys=[pdv_key], args=[int(time.time())], client=target)
+        return result, _message("Venda finalizada.")
+
     logging.warning(f"PDV {event.loja_id}-{event.pdv_id}: Recebido evento desconhecido: '{event.event_type}'.")
-    return {"message": "Tipo de evento desconhecido."}
+    return NO_COMMAND, _message("Tipo de evento desconhecido.")
+
+
+@app.post("/pdv/event")
+async def process_pdv_event(event: PdvEvent):
+    if not redis_client:
+        raise HTTPException(status_code=503, detail="Serviço indisponível: Sem conexão com o Redis.")
+    result, responder = await apply_event(redis_client, event)
+    return responder(result)
+
+
+# --- Endpoint de Eventos em Lote ---
+# Corpo: array JSON de eventos ou NDJSON (um evento por linha, Content-Type
+# application/x-ndjson), em ordem. Os eventos de cada PDV vão num único
+# pipeline, na ordem recebida; PDVs diferentes rodam em paralelo.
+BATCH_MAX_EVENTS = int(os.environ.get("PDVSTATE_BATCH_MAX_EVENTS", "1000"))
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+
+async def read_batch(request: Request) -> list:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        # Lido conforme chega: o PDV pode transmitir o lote sem montar o corpo inteiro
+        items, buffer = [], b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(json.loads(line) for line in lines if line.strip())
+            if len(items) > BATCH_MAX_EVENTS:
+                break
+        if buffer.strip():
+            items.append(json.loads(buffer))
+        return items
+    items = json.loads(await request.body())
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Lote deve ser um array JSON ou NDJSON.")
+    return items
+
+
+async def apply_pdv_batch(events: list) -> list:
+    """
+    Aplica os eventos de um PDV (já em ordem) num pipeline. Retorna uma
+    resposta por evento: a mesma do /pdv/event ou {"erro": ...}.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    queued = []
+    for event in events:
+        try:
+            result, responder = await apply_event(pipe, event)
+        except HTTPException as e:
+            queued.append((False, lambda result, detail=e.detail: {"erro": detail}))
+            continue
+        queued.append((result is not NO_COMMAND, responder))
+    results = iter(await pipe.execute(raise_on_error=False)) if pipe.command_stack else iter(())
+    responses = []
+    for has_command, responder in queued:
+        result = next(results) if has_command else None
+        if isinstance(result, Exception):
+            logging.error(f"Falha ao aplicar evento em lote: {result}")
+            responses.append({"erro": str(result)})
+        else:
+            responses.append(responder(result))
+    return responses
+
+
+@app.post("/pdv/events")
+async def process_pdv_events(request: Request):
+    if not redis_client:
+        raise HTTPException(status_code=503, detail="Serviço indisponível: Sem conexão com o Redis.")
+    try:
+        items = await read_batch(request)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Lote inválido: {e}")
+    if len(items) > BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {BATCH_MAX_EVENTS} eventos.")
+
+    # Valida tudo antes de aplicar: um evento malformado recusa o lote inteiro
+    events = []
+    for index, item in enumerate(items):
+        try:
+            events.append(PdvEvent.model_validate(item))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Evento {index} inválido: {e.errors()}")
+
+    by_pdv = {}
+    for index, event in enumerate(events):
+        by_pdv.setdefault((event.loja_id, event.pdv_id), []).append(index)
+
+    responses = [None] * len(events)
+    outcomes = await asyncio.gather(
+        *(apply_pdv_batch([events[i] for i in indexes]) for indexes in by_pdv.values()),
+        return_exceptions=True,
+    )
+    for (loja_id, pdv_id), indexes, outcome in zip(by_pdv, by_pdv.values(), outcomes):
+        if isinstance(outcome, Exception):
+            logging.error(f"PDV {loja_id}-{pdv_id}: falha ao aplicar lote de {len(indexes)} eventos. {outcome}")
+            outcome = [{"erro": str(outcome)}] * len(indexes)
+        for index, response in zip(indexes, outcome):
+            responses[index] = response
+    return {"eventos": len(events), "resultados": responses}
 
 # --- Endpoints de Consulta ---
-# (Os endpoints de consulta não precisam de alteração)
 
 @app.get("/pdv/{loja_id}/{pdv_id}/status")
 async def get_pdv_status(loja_id: int, pdv_id: int):
     if not redis_client:
         raise HTTPException(status_code=503, detail="Serviço indisponível.")
     redis_key = f"pdv:{loja_id}:{pdv_id}"
-    data = redis_client.hgetall(redis_key)
+    data = await redis_client.hgetall(redis_key)
     if not data:
         raise HTTPException(status_code=404, detail="PDV não encontrado")
     return {
@@ -236,7 +457,7 @@ async def get_pdv_stats(loja_id: int, pdv_id: int):
     if not redis_client:
         raise HTTPException(status_code=503, detail="Serviço indisponível.")
     redis_key = f"pdv:{loja_id}:{pdv_id}"
-    data = redis_client.hgetall(redis_key)
+    data = await redis_client.hgetall(redis_key)
     if not data:
         raise HTTPException(status_code=404, detail="PDV não encontrado")
     total_vendas = int(data.get("contador_vendas_dia", 0))
@@ -253,7 +474,10 @@ async def get_venda_details(cupom_fiscal: str):
     if not redis_client:
         raise HTTPException(status_code=503, detail="Serviço indisponível.")
     venda_key = f"venda:{cupom_fiscal}"
-    venda_str = redis_client.get(venda_key)
-    if not venda_str:
+    # Vendas antigas (JSON em string) ainda não migradas para hash
+    if await redis_client.type(venda_key) == "string":
+        return json.loads(await redis_client.get(venda_key))
+    data = await redis_client.hgetall(venda_key)
+    if not data:
         raise HTTPException(status_code=404, detail="Venda não encontrada.")
-    return json.loads(venda_str)
\ No newline at end of file
+    return decode_venda(data)
@@ -0,0 +1,188 @@
+# pg_client.py
+"""
+Acesso aos concentradores PostgreSQL com psycopg2, no lugar do psql em
+subprocesso: um pool de conexões por concentrador (compartilhado pelo
+processo, então a conexão e o PREPARE são reaproveitados em todas as
+consultas da mesma execução e em processos de longa duração), linhas
+tipadas (NamedTuple) e consultas em paralelo entre concentradores.
+
+As consultas frequentes são PreparedQuery: preparadas uma vez por conexão
+(PREPARE) e executadas com EXECUTE, sem replanejar a cada chamada.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+DEFAULT_PORT = 5432
+DEFAULT_POOL_SIZE = 2
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_STATEMENT_TIMEOUT = 60
+DEFAULT_PARALLEL = 8
+APPLICATION_NAME = "ariusmonitor-proxy"
+
+# Conexão quebrada (concentrador reiniciado, timeout de rede): descarta e tenta de novo
+_RECONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PreparedQuery(NamedTuple):
+    name: str
+    sql: str
+    row_type: type = tuple
+
+    @property
+    def statement(self) -> str:
+        return self.sql.strip().rstrip(";")
+
+
+class _Connection(extensions.connection):
+    """
+    Conexão que lembra os statements já preparados nela ({nome: sql}).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+
+class ConcentratorPool:
+    def __init__(self, host: str, user: str, password: str, dbname: str, port: int = DEFAULT_PORT,
+                 pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: int = DEFAULT_CONNECT_TIMEOUT,
+                 statement_timeout: int = DEFAULT_STATEMENT_TIMEOUT):
+        self.host = host
+        self.port = int(port)
+        # O pool do psycopg2 só guarda 'minconn' conexões ociosas: uma fica
+        # aberta entre consultas, as extras (consultas simultâneas no mesmo
+        # concentrador) são fechadas ao voltar.
+        self._pool = pool.ThreadedConnectionPool(
+            1, max(1, int(pool_size)),
+            host=host,
+            port=self.port,
+            user=user,
+            password=password,
+            dbname=dbname,
+            connect_timeout=int(connect_timeout),
+            application_name=APPLICATION_NAME,
+            options=f"-c statement_timeout={int(statement_timeout) * 1000}",
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3,
+            connection_factory=_Connection,
+        )
+
+    @classmethod
+    def from_config(cls, config: dict, host: str) -> "ConcentratorPool":
+        return cls(
+            host=host,
+            user=config.get("DB_PG_USER") or config.get("DB_USER"),
+            password=config.get("DB_PG_PASS") or config.get("DB_PASS"),
+            dbname=config.get("DB_PG_DB"),
+            port=int(config.get("DB_PG_PORT", DEFAULT_PORT)),
+            pool_size=int(config.get("PARAM_PG_POOL_SIZE", DEFAULT_POOL_SIZE)),
+            connect_timeout=int(config.get("PARAM_PG_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+            statement_timeout=int(config.get("PARAM_PG_STATEMENT_TIMEOUT", DEFAULT_STATEMENT_TIMEOUT)),
+        )
+
+    def _getconn(self) -> _Connection:
+        conn = self._pool.getconn()
+        if conn.closed:
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        # Só leitura: sem transação aberta ("idle in transaction") entre consultas
+        conn.autocommit = True
+        return conn
+
+    def _execute(self, conn: _Connection, query: PreparedQuery, params: tuple) -> list:
+        with conn.cursor() as cur:
+            if conn.prepared.get(query.name) != query.statement:
+                if query.name in conn.prepared:
+                    cur.execute(f"DEALLOCATE {query.name}")
+                cur.execute(f"PREPARE {query.name} AS {query.statement}")
+                conn.prepared[query.name] = query.statement
+            placeholders = f"({', '.join(['%s'] * len(params))})" if params else ""
+            cur.execute(f"EXECUTE {query.name}{placeholders}", params)
+            rows = cur.fetchall()
+        if query.row_type is tuple:
+            return rows
+        return [query.row_type(*row) for row in rows]
+
+    def query(self, query: PreparedQuery, params: tuple = ()) -> list:
+        """
+        Executa 'query' e devolve as linhas como query.row_type. Se a conexão
+        do pool estava quebrada, tenta uma vez com uma conexão nova.
+        """
+        for attempt in (1, 2):
+            conn = self._getconn()
+            try:
+                rows = self._execute(conn, query, tuple(params))
+            except _RECONNECT_ERRORS:
+                broken = conn.closed != 0
+                self._pool.putconn(conn, close=True)
+                if attempt == 2 or not broken:
+                    raise
+                continue
+            except Exception:
+                self._pool.putconn(conn, close=conn.closed != 0)
+                raise
+            self._pool.putconn(conn)
+            return rows
+
+    def close(self):
+        self._pool.closeall()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: dict, host: str) -> ConcentratorPool:
+    """
+    Pool compartilhado por processo para o concentrador 'host'.
+    """
+    key = (host, config.get("DB_PG_PORT", DEFAULT_PORT), config.get("DB_PG_DB"),
+           config.get("DB_PG_USER") or config.get("DB_USER"))
+    with _pools_lock:
+        concentrator = _pools.get(key)
+    if concentrator is not None:
+        return concentrator
+    # Conecta fora da trava: um concentrador fora do ar não segura os outros
+    created = ConcentratorPool.from_config(config, host)
+    with _pools_lock:
+        concentrator = _pools.setdefault(key, created)
+    if concentrator is not created:
+        created.close()
+    return concentrator
+
+
+def query_all(config: dict, hosts: list[str], query: PreparedQuery, params: tuple = (),
+              logger: logging.Logger | None = None) -> dict:
+    """
+    Executa 'query' em todos os concentradores em paralelo
+    (PARAM_PG_PARALLEL). Retorna {host: linhas} ou {host: exceção} para os
+    que falharam, na ordem de 'hosts'.
+    """
+    logger = logger or logging.getLogger()
+
+    def _run(host: str):
+        try:
+            return get_pool(config, host).query(query, params)
+        except (psycopg2.Error, pool.PoolError) as e:
+            logger.debug(f"Consulta {query.name} falhou em {host}: {e}")
+            return e
+
+    if not hosts:
+        return {}
+    workers = max(1, min(len(hosts), int(config.get("PARAM_PG_PARALLEL", DEFAULT_PARALLEL))))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(hosts, executor.map(_run, hosts)))
+
+
+def close_all():
+    with _pools_lock:
+        for concentrator in _pools.values():
+            concentrator.close()
+        _pools.clear()
@@ -0,0 +1,108 @@
+# preflight.py
+"""
+Varredura de alcançabilidade antes do fan-out SSH: um connect TCP em
+ip:port_ssh de cada host, todos em paralelo num event loop, com timeout
+curto (PARAM_FLEET_PREFLIGHT_TIMEOUT). Hosts que não respondem são
+registrados como 'skipped' (error=unreachable) e não ocupam um worker pelos
+30s do timeout do paramiko. Desabilitável com --skip-preflight ou
+PARAM_FLEET_PREFLIGHT=false.
+"""
+import asyncio
+import errno
+import logging
+import resource
+import time
+
+from run_journal import ERROR_UNREACHABLE, STATUS_SKIPPED
+from utils import config_flag
+
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_CONCURRENCY = 1000
+# Descritores reservados para logs, sessões SSH já abertas, etc.
+_FD_RESERVE = 128
+
+
+async def _probe(ip: str, port: int, timeout: float, semaphore: asyncio.Semaphore) -> str | None:
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except asyncio.TimeoutError:
+            return "timeout"
+        except ConnectionRefusedError:
+            return "refused"
+        except OSError as e:
+            return errno.errorcode.get(e.errno, type(e).__name__) if e.errno else type(e).__name__
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return None
+
+
+async def _sweep(targets: list[tuple], timeout: float, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(_probe(ip, port, timeout, semaphore) for ip, port in targets))
+
+
+def _max_concurrency(requested: int) -> int:
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (OSError, ValueError):
+        return requested
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - _FD_RESERVE))
+
+
+def sweep(hosts: list[dict], timeout: float = DEFAULT_TIMEOUT,
+          concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """
+    Retorna {nome do host: motivo} para os hosts que não aceitaram conexão
+    TCP na porta SSH (timeout, refused, EHOSTUNREACH...).
+    """
+    targets = [(h.get("ip", ""), int(h.get("port_ssh") or 22)) for h in hosts]
+    errors = asyncio.run(_sweep(targets, timeout, _max_concurrency(concurrency)))
+    return {h["host"]: err for h, err in zip(hosts, errors) if err}
+
+
+def filter_reachable(hosts: list[dict], config: dict, args, logger: logging.Logger) -> list[dict]:
+    """
+    Executa a varredura e devolve só os hosts alcançáveis; os demais vão
+    para o diário (args.journal) e para as métricas (args.metrics).
+    """
+    if getattr(args, "skip_preflight", False) or not config_flag(config, "PARAM_FLEET_PREFLIGHT", True):
+        return hosts
+    timeout = float(config.get("PARAM_FLEET_PREFLIGHT_TIMEOUT", DEFAULT_TIMEOUT))
+    concurrency = int(config.get("PARAM_FLEET_PREFLIGHT_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+    start = time.monotonic()
+    unreachable = sweep(hosts, timeout, concurrency)
+    logger.info(
+        f"Pré-verificação TCP: {len(hosts) - len(unreachable)}/{len(hosts)} hosts alcançáveis "
+        f"em {time.monotonic() - start:.1f}s."
+    )
+    if not unreachable:
+        return hosts
+
+    journal = getattr(args, "journal", None)
+    metrics = getattr(args, "metrics", None)
+    for host in hosts:
+        reason = unreachable.get(host["host"])
+        if not reason:
+            continue
+        logger.warning(f"[{host['host']}] Ignorado: porta SSH {host.get('ip')}:{host.get('port_ssh')} inacessível ({reason}).")
+        result = {
+            "host": host["host"],
+            "action": args.action,
+            "status": STATUS_SKIPPED,
+            "error": ERROR_UNREACHABLE,
+            "reason": reason,
+            "step": "preflight",
+            "duration": 0.0,
+        }
+        if journal is not None:
+            journal.record(result)
+        if metrics is not None:
+            metrics.count(result)
+    return [h for h in hosts if h["host"] not in unreachable]
@@ -8,11 +8,80 @@ import socket
 from paramiko.ssh_exception import SSHException, AuthenticationException, NoValidConnectionsError
 from compatibility_guard import run_compatibility_precheck
 from provider_adapter import resolve_effective_action_for_host, normalize_provider
+from fleet_metrics import NULL_METRICS
+from run_journal import STATUS_OK, STATUS_FAILED, STATUS_SKIPPED
+
+def _load_action_module(action: str, logger: logging.Logger):
+    try:
+        return importlib.import_module(f"actions.{action}")
+    except ImportError:
+        logger.error(
+            f"{RED}Ação '{action}' não encontrada. "
+            f"Verifique se o arquivo 'actions/{action}.py' existe.{NC}"
+        )
+        return None
+
+
+def _resolve_chain(host: dict, config: dict, args, provider: str, logger: logging.Logger) -> list[str]:
+    """
+    Resolve as ações do modo 'chain' (--chain) para este host, aplicando
+    rollout e overrides do provider como na ação principal.
+    """
+    chain = []
+    for resolved, canonical in getattr(args, "chain_actions", None) or []:
+        effective, skip_reason = resolve_effective_action_for_host(
+            resolved_action=resolved,
+            canonical_action=canonical,
+            provider=provider,
+            config=config,
+            host=host,
+            logger=logger,
+        )
+        if skip_reason:
+            logger.info(f"[{host['host']}] Chain '{resolved}': {skip_reason}")
+            continue
+        chain.append(effective)
+    return chain
+
 
 def process_one(host: dict, config: dict, args, logger: logging.Logger):
     """
     Conecta-se ao host e executa a ação carregada dinamicamente.
+    Com --chain, as ações adicionais rodam em sequência sobre a mesma sessão SSH.
+
+    Retorna o resultado do host: {"host", "action", "status" (ok/failed/skipped),
+    "error" (classe do erro), "step" (última etapa alcançada), "duration",
+    "phases" (segundos por fase)}.
+    Tempos por fase vão para args.metrics e o resultado para args.journal.
     """
+    metrics = getattr(args, "metrics", None) or NULL_METRICS
+    result = {
+        "host": host.get("host"),
+        "action": args.action,
+        "status": STATUS_OK,
+        "error": None,
+        "step": "resolve",
+    }
+    try:
+        with metrics.host(result):
+            try:
+                _process_one(host, config, args, logger, metrics, result)
+            except Exception as e:
+                _fail(result, type(e).__name__)
+                raise
+    finally:
+        journal = getattr(args, "journal", None)
+        if journal is not None:
+            journal.record(result)
+    return result
+
+
+def _fail(result: dict, error: str):
+    result["status"] = STATUS_FAILED
+    result["error"] = error
+
+
+def _process_one(host: dict, config: dict, args, logger: logging.Logger, metrics, result: dict):
     provider = normalize_provider(host.get("provider") or getattr(args, "provider", None))
     effective_action, skip_reason = resolve_effective_action_for_host(
         resolved_action=args.action,
@@ -23,50 +92,82 @@ def process_one(host: dict, config: dict, args, logger: logging.Logger):
         logger=logger,
     )
     if skip_reason:
+        result["status"] = STATUS_SKIPPED
+        result["reason"] = skip_reason
         logger.info(f"[{host['host']}] {skip_reason}")
         return
 
+    actions_to_run = [effective_action] + _resolve_chain(host, config, args, provider, logger)
     logger.info(
-        f"Processando {host['host']} ({host['ip']}) para a ação '{effective_action}' "
+        f"Processando {host['host']} ({host['ip']}) para a ação '{' -> '.join(actions_to_run)}' "
         f"(provider={provider}, canônica={getattr(args, 'canonical_action', 'unknown')})"
     )
-    
-    # Tenta carregar o módulo da ação dinamicamente
-    try:
-        action_module = importlib.import_module(f"actions.{effective_action}")
-    except ImportError:
-        logger.error(
-            f"{RED}Ação '{effective_action}' não encontrada. "
-            f"Verifique se o arquivo 'actions/{effective_action}.py' existe.{NC}"
-        )
-        return
 
+    # Tenta carregar os módulos das ações dinamicamente
+    action_modules = []
+    for action_name in actions_to_run:
+        action_module = _load_action_module(action_name, logger)
+        if action_module is None:
+            _fail(result, "action_not_found")
+            return
+        action_modules.append((action_name, action_module))
+
+    pool = getattr(args, "ssh_pool", None)
     session = None
+    healthy = True
     try:
-        session = SSHSession(
-            host=host['ip'],
-            port=host['port_ssh'],
-            user=host['user'],
-            password=host['password'],
-            timeout=config.get('ssh', {}).get('timeout', 30)
-        )
+        result["step"] = "connect"
+        with metrics.phase("connect", result):
+            if pool is not None:
+                session = pool.acquire(host)
+            else:
+                session = SSHSession(
+                    host=host['ip'],
+                    port=host['port_ssh'],
+                    user=host['user'],
+                    password=host['password'],
+                    timeout=config.get('ssh', {}).get('timeout', 30)
+                )
 
-        # Guardrail de compatibilidade por SO/arquitetura.
-        if not run_compatibility_precheck(session, host, effective_action, config, args, logger):
-            logger.error(f"{RED}[{host['host']}] Ação bloqueada por incompatibilidade de ambiente.{NC}")
-            return
-        
-        # Executa a função 'run' do módulo carregado
-        action_module.run(session, host, config, logger, args)
+        for action_name, action_module in action_modules:
+            # Guardrail de compatibilidade por SO/arquitetura.
+            result["step"] = f"precheck:{action_name}"
+            with metrics.phase("precheck", result):
+                compatible = run_compatibility_precheck(session, host, action_name, config, args, logger)
+            if not compatible:
+                _fail(result, "compat_blocked")
+                logger.error(f"{RED}[{host['host']}] Ação '{action_name}' bloqueada por incompatibilidade de ambiente.{NC}")
+                return
+
+            # Executa a função 'run' do módulo carregado; False indica falha
+            result["step"] = f"action:{action_name}"
+            with metrics.phase("action", result):
+                ok = action_module.run(session, host, config, logger, args)
+            if ok is False:
+                _fail(result, "action_failed")
+                return
+        result["step"] = "done"
 
     except NoValidConnectionsError:
+        healthy = False
+        _fail(result, "NoValidConnectionsError")
         logger.error(f"{RED}Falha de conexão em {host['host']}{NC} - Host offline ou porta bloqueada.")
     except AuthenticationException:
+        healthy = False
+        _fail(result, "AuthenticationException")
         logger.error(f"{RED}Falha de autenticação em {host['host']}{NC} - Credenciais incorretas.")
     except (socket.timeout, TimeoutError):
+        healthy = False
+        _fail(result, "timeout")
         logger.error(f"{RED}Timeout ao conectar em {host['host']}{NC}.")
     except Exception as e:
+        healthy = False
+        _fail(result, type(e).__name__)
         logger.error(f"{RED}Erro inesperado em {host['host']}{NC}: {type(e).__name__} - {e}")
     finally:
         if session:
-            session.close()
+            with metrics.phase("close", result):
+                if pool is not None:
+                    pool.release(session, reuse=healthy)
+                else:
+                    session.close()
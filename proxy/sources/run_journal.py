@@ -0,0 +1,135 @@
+# run_journal.py
+"""
+Diário de execução da frota em JSON-lines: uma linha por host processado
+({"run_id", "host", "action", "status", "error", "step", "duration", "ts"}),
+em PARAM_RUN_JOURNAL_DIR/<run-id>.jsonl (padrão PARAM_BASE_DIR/runs).
+
+--resume <run-id> reprocessa os hosts que não terminaram com sucesso nessa
+execução (inclusive os que nem chegaram a rodar); --retry-failed <run-id>
+reprocessa apenas os que falharam ou estavam inacessíveis na pré-verificação.
+Nos dois casos as novas linhas são acrescentadas ao mesmo diário, e vale o
+último registro de cada host.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+ERROR_UNREACHABLE = "unreachable"
+
+
+def journal_dir(config: dict) -> str:
+    explicit = config.get("PARAM_RUN_JOURNAL_DIR")
+    if explicit:
+        return explicit
+    return os.path.join(config.get("PARAM_BASE_DIR", "/ariusmonitor"), "runs")
+
+
+def journal_path(config: dict, run_id: str) -> str:
+    return os.path.join(journal_dir(config), f"{run_id}.jsonl")
+
+
+def new_run_id(action: str) -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{action}-{os.getpid()}"
+
+
+def load_results(path: str) -> dict:
+    """
+    Último registro de cada host no diário. Linhas truncadas (queda no meio
+    da escrita) são ignoradas.
+    """
+    results = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("host"):
+                results[record["host"]] = record
+    return results
+
+
+class RunJournal:
+    def __init__(self, path: str, run_id: str):
+        self.path = path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+
+    def record(self, result: dict):
+        line = json.dumps({"run_id": self.run_id, "ts": round(time.time(), 3), **result}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _retryable(record: dict | None) -> bool:
+    if not record:
+        return False
+    return record.get("status") == STATUS_FAILED or record.get("error") == ERROR_UNREACHABLE
+
+
+def select_hosts(hosts: list[dict], config: dict, args, logger: logging.Logger) -> list[dict]:
+    """
+    Aplica --resume/--retry-failed à lista de hosts e define args.run_id
+    (novo ou o da execução retomada).
+    """
+    resume = getattr(args, "resume", None)
+    retry_failed = getattr(args, "retry_failed", None)
+    run_id = resume or retry_failed
+    if not run_id:
+        args.run_id = new_run_id(args.action)
+        return hosts
+
+    path = journal_path(config, run_id)
+    try:
+        previous = load_results(path)
+    except OSError as e:
+        raise FileNotFoundError(f"Diário da execução '{run_id}' não encontrado em {path}: {e}") from e
+    args.run_id = run_id
+
+    if resume:
+        selected = [h for h in hosts if previous.get(h["host"], {}).get("status") != STATUS_OK]
+        logger.info(
+            f"Retomando execução '{run_id}': {len(hosts) - len(selected)} hosts já concluídos, "
+            f"{len(selected)} a processar."
+        )
+    else:
+        selected = [h for h in hosts if _retryable(previous.get(h["host"]))]
+        logger.info(f"Reprocessando {len(selected)} hosts que falharam na execução '{run_id}'.")
+    return selected
+
+
+def open_journal(config: dict, args, logger: logging.Logger) -> RunJournal | None:
+    run_id = getattr(args, "run_id", None) or new_run_id(args.action)
+    path = journal_path(config, run_id)
+    try:
+        journal = RunJournal(path, run_id)
+    except OSError as e:
+        logger.warning(f"Diário de execução indisponível em {path}: {e}")
+        return None
+    logger.info(f"Execução '{run_id}' registrada em {path}")
+    return journal
+
+
+def log_summary(path: str, run_id: str, logger: logging.Logger):
+    try:
+        results = load_results(path)
+    except OSError:
+        return
+    counts = {}
+    for record in results.values():
+        counts[record.get("status")] = counts.get(record.get("status"), 0) + 1
+    summary = ", ".join(f"{k}={v}" for k, v in sorted(counts.items(), key=lambda kv: str(kv[0])))
+    logger.info(f"Execução '{run_id}': {summary or 'nenhum host'}")
+    if any(_retryable(record) for record in results.values()):
+        logger.info(f"Para reprocessar apenas as falhas: --retry-failed {run_id}")
@@ -2,9 +2,14 @@
 
 import paramiko
 import socket
+import hashlib
 import os
 import logging
+import shlex
+import uuid
+import threading
 import time
+from contextlib import contextmanager
 
 class SSHSession:
     def __init__(self, host: str, port: int, user: str, password: str, timeout: int = 30):
@@ -14,6 +19,7 @@ class SSHSession:
         self.password = password
         self.timeout  = timeout
         self._client  = None
+        self._sftp    = None
         self._connect()
 
     def _connect(self):
@@ -29,6 +35,31 @@ class SSHSession:
             allow_agent=False
         )
 
+    def is_active(self) -> bool:
+        transport = self._client.get_transport() if self._client else None
+        return bool(transport and transport.is_active())
+
+    def _get_sftp(self):
+        """
+        Reaproveita o canal SFTP da sessão; só abre um novo se o anterior caiu.
+        """
+        if self._sftp is not None:
+            channel = self._sftp.get_channel()
+            if channel is not None and not channel.closed:
+                return self._sftp
+            self._close_sftp()
+        self._sftp = self._client.open_sftp()
+        self._sftp.get_channel().settimeout(self.timeout)
+        return self._sftp
+
+    def _close_sftp(self):
+        if self._sftp is not None:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+            self._sftp = None
+
     def run(
         self,
         cmd: str,
@@ -79,32 +110,68 @@ class SSHSession:
             err = f"Timeout de {effective_timeout}s excedido ao aguardar a saida do comando."
             stdout.channel.close()
 
-        # --- INÍCIO DA MELHORIA DE LOG ---
         if logger:
-            # Verifica se o logger está configurado para o nível DEBUG
-            is_debug_mode = logger.isEnabledFor(logging.DEBUG)
-
-            if exit_status == 0:
-                logger.info(f"'{cmd}' -> SUCESSO (exit {exit_status})")
-                # Se estiver em modo debug e houver alguma saída, exibe-a.
-                if is_debug_mode and out.strip():
-                    logger.debug(f"STDOUT:\n---\n{out.strip()}\n---")
-            else:
-                logger.error(f"'{cmd}' -> FALHA (exit {exit_status})")
-                # Em caso de falha, sempre exibe a saída para facilitar a depuração.
-                if out.strip():
-                    logger.error(f"STDOUT:\n---\n{out.strip()}\n---")
-                if err.strip():
-                    logger.error(f"STDERR:\n---\n{err.strip()}\n---")
-        # --- FIM DA MELHORIA DE LOG ---
+            self._log_result(cmd, exit_status, out, err, logger)
 
         return exit_status, out, err
 
+    @staticmethod
+    def _log_result(cmd: str, exit_status: int, out: str, err: str, logger: logging.Logger):
+        # Verifica se o logger está configurado para o nível DEBUG
+        is_debug_mode = logger.isEnabledFor(logging.DEBUG)
+
+        if exit_status == 0:
+            logger.info(f"'{cmd}' -> SUCESSO (exit {exit_status})")
+            # Se estiver em modo debug e houver alguma saída, exibe-a.
+            if is_debug_mode and out.strip():
+                logger.debug(f"STDOUT:\n---\n{out.strip()}\n---")
+        else:
+            logger.error(f"'{cmd}' -> FALHA (exit {exit_status})")
+            # Em caso de falha, sempre exibe a saída para facilitar a depuração.
+            if out.strip():
+                logger.error(f"STDOUT:\n---\n{out.strip()}\n---")
+            if err.strip():
+                logger.error(f"STDERR:\n---\n{err.strip()}\n---")
+
+    def run_batch(
+        self,
+        cmds: list[str],
+        use_sudo: bool = False,
+        timeout: int = None,
+        logger: logging.Logger = None,
+    ) -> list[tuple[int, str, str]]:
+        """
+        Executa N comandos em um único canal/round-trip, como um script shell
+        delimitado, e devolve (exit, stdout, stderr) de cada comando na ordem.
+        Com use_sudo, a senha é enviada uma única vez para o lote inteiro.
+        """
+        if not cmds:
+            return []
+
+        token = f"__FM_BATCH_{uuid.uuid4().hex}"
+        script = _build_batch_script(cmds, token)
+        status, out, err = self.run(
+            f"sh -c {shlex.quote(script)}",
+            use_sudo=use_sudo,
+            timeout=timeout,
+            get_pty=False,
+        )
+        results = _parse_batch_output(out, token, len(cmds))
+
+        # Comandos sem marcador final não chegaram a rodar (timeout/queda do canal).
+        for index, (exit_status, _, _) in enumerate(results):
+            if exit_status is None:
+                results[index] = (-1, "", err or f"Comando não executado no lote (exit do lote {status}).")
+
+        if logger:
+            for cmd, (exit_status, cmd_out, cmd_err) in zip(cmds, results):
+                self._log_result(cmd, exit_status, cmd_out, cmd_err, logger)
+
+        return results
+
     def put(self, local_path: str, remote_path: str, use_sudo: bool = False):
-        sftp = None
         try:
-            sftp = self._client.open_sftp()
-            sftp.get_channel().settimeout(self.timeout)
+            sftp = self._get_sftp()
 
             if not use_sudo:
                 sftp.put(local_path, remote_path)
@@ -112,15 +179,162 @@ class SSHSession:
                 tmp = f"/tmp/{os.path.basename(remote_path)}"
                 sftp.put(local_path, tmp)
                 self.run(f"mv {tmp} {remote_path}", use_sudo=True)
-        
+
         except socket.timeout:
+            # Canal em estado indefinido após timeout; descarta para a próxima chamada.
+            self._close_sftp()
             raise TimeoutError(f"Timeout de {self.timeout}s excedido durante a transferencia do arquivo para {self.host}")
-        
-        finally:
-            if sftp:
-                sftp.close()
 
     def close(self):
+        self._close_sftp()
         if self._client:
             self._client.close()
-            self._client = None
\ No newline at end of file
+            self._client = None
+
+
+def _build_batch_script(cmds: list[str], token: str) -> str:
+    # Cada comando roda num subshell com stdin fechado (o stdin do canal carrega
+    # a senha do sudo); stdout segue direto e stderr vai para um arquivo temporário
+    # despejado entre marcadores próprios.
+    lines = ['__fm_err=$(mktemp 2>/dev/null || echo /tmp/.fm_batch_$$)']
+    for index, cmd in enumerate(cmds):
+        lines.extend([
+            f"printf '%s\\n' '{token}:{index}:OUT'",
+            f"( {cmd}\n) 2>\"$__fm_err\" </dev/null",
+            "__fm_rc=$?",
+            f"printf '\\n%s\\n' '{token}:{index}:ERR'",
+            'cat "$__fm_err" 2>/dev/null',
+            f"printf '\\n%s\\n' \"{token}:{index}:RC:$__fm_rc\"",
+        ])
+    lines.append('rm -f "$__fm_err"')
+    return "\n".join(lines) + "\n"
+
+
+def _parse_batch_output(out: str, token: str, count: int) -> list[tuple]:
+    results = []
+    for index in range(count):
+        out_marker = f"{token}:{index}:OUT\n"
+        err_marker = f"\n{token}:{index}:ERR\n"
+        rc_marker = f"\n{token}:{index}:RC:"
+
+        start = out.find(out_marker)
+        err_pos = out.find(err_marker, start) if start >= 0 else -1
+        rc_pos = out.find(rc_marker, err_pos) if err_pos >= 0 else -1
+        if rc_pos < 0:
+            results.append((None, "", ""))
+            continue
+
+        rc_end = out.find("\n", rc_pos + len(rc_marker))
+        rc_raw = out[rc_pos + len(rc_marker):rc_end if rc_end >= 0 else len(out)].strip()
+        cmd_out = out[start + len(out_marker):err_pos]
+        cmd_err = out[err_pos + len(err_marker):rc_pos]
+        try:
+            exit_status = int(rc_raw)
+        except ValueError:
+            exit_status = -1
+        results.append((exit_status, cmd_out, cmd_err))
+    return results
+
+
+class SSHConnectionPool:
+    """
+    Pool de sessões SSH por execução, chaveado por (ip, porta, usuário, hash
+    da senha): hosts com o mesmo endereço e credenciais diferentes não
+    compartilham sessão.
+
+    Uma sessão é entregue em regime de lease e, ao ser devolvida, fica ociosa
+    por até 'idle_timeout' segundos para ser reaproveitada (sem novo handshake)
+    por outro lease da mesma chave. No máximo 'max_idle' sessões ficam ociosas.
+    """
+    def __init__(self, timeout: int = 30, idle_timeout: float = 60, max_idle: int = 32):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(ip: str, port, user: str, password) -> tuple:
+        secret = hashlib.sha256(str(password or "").encode("utf-8")).hexdigest()
+        return (ip, int(port), user, secret)
+
+    @classmethod
+    def _key(cls, host: dict) -> tuple:
+        return cls._make_key(host["ip"], host["port_ssh"], host["user"], host.get("password"))
+
+    def _evict_locked(self, now: float) -> list:
+        expired = []
+        for key, entries in list(self._idle.items()):
+            alive = []
+            for session, released_at in entries:
+                if now - released_at > self.idle_timeout or not session.is_active():
+                    expired.append(session)
+                else:
+                    alive.append((session, released_at))
+            if alive:
+                self._idle[key] = alive
+            else:
+                self._idle.pop(key, None)
+
+        # Respeita o limite global descartando as sessões ociosas mais antigas.
+        flat = sorted(
+            ((released_at, key, session) for key, entries in self._idle.items() for session, released_at in entries),
+            key=lambda item: item[0],
+        )
+        while len(flat) > self.max_idle:
+            _, key, session = flat.pop(0)
+            self._idle[key] = [entry for entry in self._idle[key] if entry[0] is not session]
+            if not self._idle[key]:
+                self._idle.pop(key, None)
+            expired.append(session)
+        return expired
+
+    def acquire(self, host: dict) -> SSHSession:
+        key = self._key(host)
+        with self._lock:
+            expired = self._evict_locked(time.monotonic())
+            entries = self._idle.get(key) or []
+            session = entries.pop()[0] if entries else None
+            if not entries:
+                self._idle.pop(key, None)
+        for old in expired:
+            old.close()
+        if session is not None:
+            return session
+        return SSHSession(
+            host=host['ip'],
+            port=host['port_ssh'],
+            user=host['user'],
+            password=host['password'],
+            timeout=self.timeout
+        )
+
+    def release(self, session: SSHSession, reuse: bool = True):
+        if not reuse or self.idle_timeout <= 0 or not session.is_active():
+            session.close()
+            return
+        key = self._make_key(session.host, session.port, session.user, session.password)
+        with self._lock:
+            self._idle.setdefault(key, []).append((session, time.monotonic()))
+            expired = self._evict_locked(time.monotonic())
+        for old in expired:
+            old.close()
+
+    @contextmanager
+    def lease(self, host: dict):
+        session = self.acquire(host)
+        healthy = True
+        try:
+            yield session
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.release(session, reuse=healthy)
+
+    def close_all(self):
+        with self._lock:
+            sessions = [session for entries in self._idle.values() for session, _ in entries]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
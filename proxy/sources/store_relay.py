@@ -0,0 +1,158 @@
+# store_relay.py
+"""
+Distribuição do pacote por loja (PARAM_ASSET_RELAY=true).
+
+O primeiro PDV de cada loja (REDE-LOJAxxx-PDVyyy) que chega à etapa de envio
+vira 'semente': recebe o pacote do proxy pela WAN (ou já o tem) e o serve na
+LAN com um servidor HTTP de vida curta (python3/python/busybox, encerrado por
+'timeout' após PARAM_ASSET_RELAY_TTL segundos). Os demais PDVs da loja baixam
+da semente com wget/curl e conferem o sha256; qualquer falha volta ao envio
+direto pelo proxy.
+"""
+import logging
+import re
+import shlex
+import threading
+
+from utils import config_flag
+
+DEFAULT_PORT = 8765
+DEFAULT_TTL = 900
+DEFAULT_WAIT = 300
+RELAY_DIR = "/tmp/ariusmonitor-relay"
+
+_STORE_RE = re.compile(r"^(?P<store>.+?-LOJA\d+)-PDV\d+$", re.IGNORECASE)
+_relay_lock = threading.Lock()
+
+
+def store_key(host_name: str) -> str | None:
+    match = _STORE_RE.match(host_name or "")
+    return match.group("store").upper() if match else None
+
+
+class _StoreState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.seed = None
+        self.url = None
+
+
+class StoreRelay:
+    def __init__(self, config: dict, logger: logging.Logger):
+        self.logger = logger
+        self.port = int(config.get("PARAM_ASSET_RELAY_PORT", DEFAULT_PORT))
+        self.ttl = int(config.get("PARAM_ASSET_RELAY_TTL", DEFAULT_TTL))
+        self.wait = float(config.get("PARAM_ASSET_RELAY_WAIT", DEFAULT_WAIT))
+        self._lock = threading.Lock()
+        self._stores = {}
+
+    def _state(self, store: str, checksum: str) -> _StoreState:
+        with self._lock:
+            return self._stores.setdefault((store, checksum), _StoreState())
+
+    def _claim_seed(self, state: _StoreState, host: dict) -> bool:
+        with state.lock:
+            if state.seed is None:
+                state.seed = host["host"]
+                return True
+            return False
+
+    def offer_seed(self, session, host: dict, remote_path: str, checksum: str):
+        """
+        Chamado por um PDV que já tem o pacote atualizado: vira semente da
+        loja se ainda não houver uma.
+        """
+        store = store_key(host["host"])
+        if not store:
+            return
+        state = self._state(store, checksum)
+        if self._claim_seed(state, host):
+            self._serve(session, host, state, remote_path)
+
+    def deliver(self, session, host: dict, local_path: str, remote_path: str, checksum: str) -> bool:
+        """
+        Garante 'remote_path' com o sha256 'checksum' no host. Retorna False
+        quando o relay não se aplica ou falhou; o chamador envia direto.
+        """
+        store = store_key(host["host"])
+        if not store:
+            return False
+        prefix = f"[{host['host']}]"
+        state = self._state(store, checksum)
+
+        if self._claim_seed(state, host):
+            self.logger.info(f"{prefix} Semente da loja {store}: recebendo o pacote pela WAN.")
+            try:
+                session.put(local_path, remote_path)
+            except Exception:
+                state.ready.set()
+                raise
+            self._serve(session, host, state, remote_path)
+            return True
+
+        if not state.ready.wait(self.wait):
+            self.logger.warning(f"{prefix} Semente da loja {store} não ficou pronta em {self.wait:.0f}s.")
+            return False
+        if not state.url:
+            return False
+
+        tmp_path = f"{remote_path}.part"
+        q_tmp = shlex.quote(tmp_path)
+        q_url = shlex.quote(state.url)
+        cmd = (
+            f"(wget -q -T 60 -O {q_tmp} {q_url} || curl -fsS --connect-timeout 10 -o {q_tmp} {q_url})"
+            f" && [ \"$(sha256sum {q_tmp} | cut -d' ' -f1)\" = {shlex.quote(checksum)} ]"
+            f" && mv -f {q_tmp} {shlex.quote(remote_path)} || {{ rm -f {q_tmp}; exit 1; }}"
+        )
+        status, _, err = session.run(f"sh -c {shlex.quote(cmd)}")
+        if status != 0:
+            self.logger.warning(f"{prefix} Falha ao baixar da semente {state.seed} ({err.strip()}); enviando pela WAN.")
+            return False
+        self.logger.info(f"{prefix} Pacote obtido pela LAN da semente {state.seed}.")
+        return True
+
+    def _serve(self, session, host: dict, state: _StoreState, remote_path: str):
+        prefix = f"[{host['host']}]"
+        name = remote_path.rsplit("/", 1)[-1]
+        relay_dir = shlex.quote(RELAY_DIR)
+        port = self.port
+        probe = f"http://127.0.0.1:{port}/{name}"
+        cmd = (
+            f"mkdir -p {relay_dir} && (ln -f {shlex.quote(remote_path)} {relay_dir}/ 2>/dev/null"
+            f" || cp -f {shlex.quote(remote_path)} {relay_dir}/) && cd {relay_dir} || exit 1;"
+            f" [ -f server.pid ] && kill \"$(cat server.pid)\" 2>/dev/null;"
+            f" if command -v python3 >/dev/null 2>&1; then srv='python3 -m http.server {port}';"
+            f" elif command -v python >/dev/null 2>&1; then srv='python -m SimpleHTTPServer {port}';"
+            f" elif command -v busybox >/dev/null 2>&1; then srv='busybox httpd -f -p {port}';"
+            f" else exit 2; fi;"
+            f" nohup timeout {self.ttl} $srv >/dev/null 2>&1 </dev/null & echo $! > server.pid;"
+            f" for i in 1 2 3 4 5; do sleep 1;"
+            f" (wget -q -O /dev/null {probe} || curl -fs -o /dev/null {probe}) 2>/dev/null && exit 0; done; exit 3"
+        )
+        try:
+            status, _, _ = session.run(f"sh -c {shlex.quote(cmd)}")
+        except Exception as e:
+            status = -1
+            self.logger.warning(f"{prefix} Erro ao iniciar servidor da loja: {e}")
+        if status == 0:
+            state.url = f"http://{host['ip']}:{port}/{name}"
+            self.logger.info(f"{prefix} Servindo o pacote na LAN em {state.url} por até {self.ttl}s.")
+        else:
+            self.logger.warning(f"{prefix} Não foi possível servir o pacote na LAN (status {status}); "
+                                f"os demais PDVs da loja recebem pela WAN.")
+        state.ready.set()
+
+
+def get_relay(config: dict, args, logger: logging.Logger) -> StoreRelay | None:
+    """
+    Relay da execução atual (em args.asset_relay), ou None se desabilitado.
+    """
+    if not config_flag(config, "PARAM_ASSET_RELAY"):
+        return None
+    with _relay_lock:
+        relay = getattr(args, "asset_relay", None)
+        if relay is None:
+            relay = StoreRelay(config, logger)
+            args.asset_relay = relay
+        return relay
@@ -53,4 +53,16 @@ def setup_logging(config: dict, debug: bool = False) -> logging.Logger:
         file_handler.setFormatter(fmt)
         logger.addHandler(file_handler)
 
-    return logger
\ No newline at end of file
+    return logger
+
+def config_flag(config: dict, key: str, default: bool = False) -> bool:
+    """
+    Lê um parâmetro booleano do config. Os valores podem vir como string
+    ("false" é falso): só "1", "true", "yes" e "on" ligam a opção.
+    """
+    value = config.get(key)
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
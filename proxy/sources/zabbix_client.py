@@ -1,42 +1,282 @@
 # zabbix_client.py
 
+import gzip
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 
+from utils import config_flag
+
 # Desabilita warnings de SSL não verificado
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
+DEFAULT_TIMEOUT = 30
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CHUNK_SIZE = 500
+CACHEABLE_METHODS = {"host.get", "trigger.get"}
+DEFAULT_HOST_QUERY = "planned"
+HOST_NAME_KEYWORDS = ("PDV", "SELF", "CONCENTRADOR")
+
+
+class ZabbixClient:
+    """
+    Cliente da API JSON-RPC do Zabbix com sessão HTTP persistente (keep-alive),
+    corpo gzip opcional, paginação de 'hostids' em blocos e cache local de
+    curta duração para host.get/trigger.get (só dono lê; consultas com
+    selectInventory, que trazem credenciais SSH, não são gravadas).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        timeout: int = DEFAULT_TIMEOUT,
+        verify: bool = False,
+        gzip_requests: bool = False,
+        cache_dir: str | None = None,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        pool_size: int = 10,
+    ):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.gzip_requests = gzip_requests
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.chunk_size = max(1, int(chunk_size))
+        self._request_id = 0
+        self._id_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.headers.update({
+            "Content-Type": "application/json-rpc",
+            "Authorization": f"Bearer {token}",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ZabbixClient":
+        base_dir = config.get("PARAM_BASE_DIR", "/ariusmonitor")
+        return cls(
+            url=f"https://{config.get('PARAM_ZABBIX_SERVER')}/api_jsonrpc.php",
+            token=config.get("PARAM_TOKEN"),
+            gzip_requests=config_flag(config, "PARAM_ZABBIX_GZIP"),
+            cache_dir=config.get("PARAM_ZABBIX_CACHE_DIR") or os.path.join(base_dir, "cache", "zabbix"),
+            cache_ttl=float(config.get("PARAM_ZABBIX_CACHE_TTL", DEFAULT_CACHE_TTL)),
+            chunk_size=int(config.get("PARAM_ZABBIX_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)),
+        )
 
-def _call_api(url: str, token: str, payload: dict) -> dict:
-    logger = logging.getLogger()
-    headers = {
-        "Content-Type": "application/json-rpc",
-        "Authorization": f"Bearer {token}"
+    def _next_id(self) -> int:
+        with self._id_lock:
+            self._request_id += 1
+            return self._request_id
+
+    def _cache_path(self, method: str, params: dict) -> str | None:
+        if not self.cache_dir or self.cache_ttl <= 0 or method not in CACHEABLE_METHODS:
+            return None
+        # inventory.notes guarda usuário/senha SSH dos PDVs: não vai para o disco
+        if "selectInventory" in params:
+            return None
+        key_source = json.dumps([self.url, self.token, method, params], sort_keys=True, default=str)
+        return os.path.join(self.cache_dir, hashlib.sha256(key_source.encode("utf-8")).hexdigest() + ".json")
+
+    def _cache_read(self, path: str) -> dict | None:
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _cache_write(self, path: str, response_json: dict):
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            os.chmod(self.cache_dir, 0o700)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(response_json, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.getLogger().debug(f"Falha ao gravar cache da Zabbix API: {e}")
+
+    def _post(self, payload: dict, timeout: int | None) -> dict:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {}
+        if self.gzip_requests:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        resp = self.session.post(self.url, data=body, headers=headers, timeout=timeout or self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def call(self, method: str, params: dict, use_cache: bool = True, timeout: int | None = None) -> dict:
+        """
+        Executa um método da API e retorna a resposta JSON-RPC completa.
+        """
+        logger = logging.getLogger()
+        cache_path = self._cache_path(method, params) if use_cache else None
+        if cache_path:
+            cached = self._cache_read(cache_path)
+            if cached is not None:
+                logger.debug(f"Resposta da Zabbix API para '{method}' servida do cache local.")
+                return cached
+
+        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": self._next_id()}
+        logger.debug(f"Enviando requisição para Zabbix API: {payload}")
+        response_json = self._post(payload, timeout)
+        logger.debug(f"Resposta recebida da Zabbix API: {response_json}")
+
+        if cache_path and "error" not in response_json:
+            self._cache_write(cache_path, response_json)
+        return response_json
+
+    def call_chunked(self, method: str, params: dict, ids_field: str, ids: list, use_cache: bool = True) -> list:
+        """
+        Divide 'ids' em blocos de chunk_size no campo 'ids_field' e concatena os resultados.
+        """
+        results = []
+        for start in range(0, len(ids), self.chunk_size):
+            chunk_params = dict(params)
+            chunk_params[ids_field] = ids[start:start + self.chunk_size]
+            response = self.call(method, chunk_params, use_cache=use_cache)
+            results.extend(response.get("result", []))
+        return results
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(config: dict) -> ZabbixClient:
+    """
+    Cliente compartilhado por processo para o par (servidor, token) do config.
+    """
+    key = (config.get("PARAM_ZABBIX_SERVER"), config.get("PARAM_TOKEN"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ZabbixClient.from_config(config)
+            _clients[key] = client
+        return client
+
+
+def _hosts_from_details(host_details: list[dict], logger: logging.Logger) -> list[dict]:
+    hosts = []
+    for h in host_details:
+        if not h.get("interfaces"):
+            logger.warning(f"Host '{h.get('host')}' ignorado por não ter interface de rede.")
+            continue
+            
+        iface = h["interfaces"][0]
+        inventory_data = h.get("inventory")
+        notes = ""
+        if isinstance(inventory_data, dict):
+            notes = inventory_data.get("notes", "")
+
+        parts = [p.strip() for p in notes.split(",") if p.strip()]
+        user      = parts[0] if len(parts) > 0 else ""
+        password  = parts[1] if len(parts) > 1 else ""
+        port_ssh  = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 22
+        port_zabbix = int(iface.get("port", 10050))
+
+        hosts.append({
+            "host":        h["host"], "ip": iface.get("ip", ""), "user": user,
+            "password":    password, "port_ssh": port_ssh, "port_zabbix": port_zabbix
+        })
+
+    return hosts
+
+
+def _host_search_term(config: dict, filters: dict) -> str | None:
+    search_parts = [config.get('PARAM_REDE', '')]
+    if filters.get('loja'):
+        search_parts.append(filters['loja'])
+    if filters.get('pdv'):
+        search_parts.append(filters['pdv'])
+
+    if len(search_parts) > 1:
+        search_term = "-".join(search_parts)
+        if search_term.strip() != "-":
+            return search_term
+    return None
+
+
+def _excluded_by_template(host: dict, exclude_set: set) -> bool:
+    host_template_ids = {str(t.get('templateid')) for t in host.get("parentTemplates", [])}
+    return bool(host_template_ids.intersection(exclude_set))
+
+
+def build_host_search_patterns(search_term: str | None) -> list[str]:
+    """
+    Padrões (searchWildcardsEnabled) equivalentes a "contém o termo E contém
+    uma das HOST_NAME_KEYWORDS". Padrões do mesmo campo são combinados com OR
+    pelo servidor.
+    """
+    patterns = []
+    for keyword in HOST_NAME_KEYWORDS:
+        if not search_term:
+            patterns.append(f"*{keyword}*")
+        elif keyword.lower() in search_term.lower():
+            patterns.append(f"*{search_term}*")
+        else:
+            patterns.append(f"*{search_term}*{keyword}*")
+            patterns.append(f"*{keyword}*{search_term}*")
+    # Remove duplicados preservando a ordem
+    return list(dict.fromkeys(patterns))
+
+
+def build_planned_host_query(config: dict, filters: dict) -> dict:
+    """
+    Parâmetros do host.get único: filtro de nome/termo no servidor e interfaces,
+    inventário e templates (só se houver exclusão) na mesma resposta.
+    """
+    params = {
+        "output": ["hostid", "host"],
+        "selectInterfaces": ["ip", "port"],
+        "selectInventory": ["notes"],
+        "filter": {"status": "0"},
+        "search": {"host": build_host_search_patterns(_host_search_term(config, filters))},
+        "searchWildcardsEnabled": True,
     }
-    logger.debug(f"Enviando requisição para Zabbix API: {payload}")
-    resp = requests.post(
-        url,
-        json=payload,
-        headers=headers,
-        verify=False,
-        timeout=30
-    )
-    resp.raise_for_status()
-    response_json = resp.json()
-    logger.debug(f"Resposta recebida da Zabbix API: {response_json}")
-    return response_json
+    if config.get("EXCLUDE_TEMPLATE_IDS"):
+        params["selectParentTemplates"] = ["templateid"]
+    if filters.get("agent_status") is not None:
+        params["filter"]["available"] = str(filters["agent_status"])
+    return params
 
 
-def get_hosts(config: dict, filters: dict) -> list[dict]:
-    logger = logging.getLogger()
-    url   = f"https://{config.get('PARAM_ZABBIX_SERVER')}/api_jsonrpc.php"
-    token = config.get("PARAM_TOKEN")
-    
-    if not token or not url:
-        logger.error("PARAM_ZABBIX_SERVER ou PARAM_TOKEN não encontrado no config.json.")
+def _get_hosts_planned(config: dict, filters: dict, logger: logging.Logger) -> list[dict]:
+    params = build_planned_host_query(config, filters)
+    logger.info("Buscando hosts, interfaces e inventário em uma única consulta...")
+    response = get_client(config).call("host.get", params)
+    host_details = response.get("result", [])
+
+    # A API não tem "excluir templateids"; o corte é feito sobre a mesma resposta.
+    exclude_set = {str(item) for item in config.get("EXCLUDE_TEMPLATE_IDS", [])}
+    if exclude_set:
+        host_details = [h for h in host_details if not _excluded_by_template(h, exclude_set)]
+
+    if not host_details:
+        logger.warning("Nenhum host selecionado após todos os filtros.")
         return []
 
+    logger.info(f"{len(host_details)} hosts selecionados para processamento.")
+    return _hosts_from_details(host_details, logger)
+
+
+def _get_hosts_legacy(config: dict, filters: dict, logger: logging.Logger) -> list[dict]:
     template_ids_to_exclude = config.get("EXCLUDE_TEMPLATE_IDS", [])
     
     payload = {
@@ -48,23 +288,17 @@ def get_hosts(config: dict, filters: dict) -> list[dict]:
         }
     }
 
-    search_parts = [config.get('PARAM_REDE', '')]
-    if filters.get('loja'):
-        search_parts.append(filters['loja'])
-    if filters.get('pdv'):
-        search_parts.append(filters['pdv'])
-    
-    if len(search_parts) > 1:
-        search_term = "-".join(search_parts)
-        if search_term.strip() != "-":
-             payload["params"]["search"] = {"host": search_term}
+    search_term = _host_search_term(config, filters)
+    if search_term:
+        payload["params"]["search"] = {"host": search_term}
     
     # Adiciona o filtro de 'agent-status' (available) à primeira consulta, se ele for fornecido.
     if filters.get("agent_status") is not None:
         payload["params"]["filter"]["available"] = str(filters["agent_status"])
 
+    client = get_client(config)
     logger.info("Etapa 1/3: Buscando hosts e templates para filtragem...")
-    response_step1 = _call_api(url, token, payload)
+    response_step1 = client.call(payload["method"], payload["params"])
     all_hosts_from_api = response_step1.get("result", [])
     
     # Filtro por Template ID
@@ -72,21 +306,18 @@ def get_hosts(config: dict, filters: dict) -> list[dict]:
     if template_ids_to_exclude:
         exclude_set = set(str(item) for item in template_ids_to_exclude)
         for h in all_hosts_from_api:
-            parent_templates = h.get("parentTemplates", [])
-            host_template_ids = {str(t.get('templateid')) for t in parent_templates}
-            if not host_template_ids.intersection(exclude_set):
+            if not _excluded_by_template(h, exclude_set):
                 template_filtered_hosts.append(h)
     else:
         template_filtered_hosts = all_hosts_from_api
 
     # ### INÍCIO DO WORKAROUND: FILTRO POR NOME DE HOST ###
     logger.info("Etapa 2/3: Aplicando workaround de filtro por nome...")
-    keywords_to_include = ("PDV", "SELF", "CONCENTRADOR")
     name_filtered_hosts = []
     for h in template_filtered_hosts:
         host_name = h.get('host', '')
         # Verifica se qualquer uma das palavras-chave está no nome do host (ignorando maiúsculas/minúsculas)
-        if any(keyword.lower() in host_name.lower() for keyword in keywords_to_include):
+        if any(keyword.lower() in host_name.lower() for keyword in HOST_NAME_KEYWORDS):
             name_filtered_hosts.append(h)
         else:
             logger.debug(f"Host '{host_name}' ignorado pelo filtro de nome (workaround).")
@@ -100,43 +331,32 @@ def get_hosts(config: dict, filters: dict) -> list[dict]:
         
     logger.info(f"Etapa 3/3: Buscando detalhes de conexão para {len(final_host_ids)} hosts filtrados...")
     
-    payload_step2 = {
-        "jsonrpc": "2.0", "method": "host.get", "id": 2,
-        "params": {
-            "output": ["host"], "hostids": final_host_ids,
-            "selectInventory": ["notes"], "selectInterfaces": ["ip", "port"]
-        }
-    }
-    
-    response_step2 = _call_api(url, token, payload_step2)
-    final_host_details = response_step2.get("result", [])
+    final_host_details = client.call_chunked(
+        "host.get",
+        {"output": ["host"], "selectInventory": ["notes"], "selectInterfaces": ["ip", "port"]},
+        "hostids",
+        final_host_ids,
+    )
     
     logger.info(f"{len(final_host_details)} hosts selecionados para processamento.")
     
-    hosts = []
-    for h in final_host_details:
-        if not h.get("interfaces"):
-            logger.warning(f"Host '{h.get('host')}' ignorado por não ter interface de rede.")
-            continue
-            
-        iface = h["interfaces"][0]
-        inventory_data = h.get("inventory")
-        notes = ""
-        if isinstance(inventory_data, dict):
-            notes = inventory_data.get("notes", "")
+    return _hosts_from_details(final_host_details, logger)
 
-        parts = [p.strip() for p in notes.split(",") if p.strip()]
-        user      = parts[0] if len(parts) > 0 else ""
-        password  = parts[1] if len(parts) > 1 else ""
-        port_ssh  = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 22
-        port_zabbix = int(iface.get("port", 10050))
 
-        hosts.append({
-            "host":        h["host"], "ip": iface.get("ip", ""), "user": user,
-            "password":    password, "port_ssh": port_ssh, "port_zabbix": port_zabbix
-        })
+def get_hosts(config: dict, filters: dict) -> list[dict]:
+    logger = logging.getLogger()
+    url   = f"https://{config.get('PARAM_ZABBIX_SERVER')}/api_jsonrpc.php"
+    token = config.get("PARAM_TOKEN")
+    
+    if not token or not url:
+        logger.error("PARAM_ZABBIX_SERVER ou PARAM_TOKEN não encontrado no config.json.")
+        return []
 
-    return hosts
+    # PARAM_ZABBIX_HOST_QUERY: "planned" (um host.get) ou "legacy" (três etapas)
+    strategy = str(config.get("PARAM_ZABBIX_HOST_QUERY", DEFAULT_HOST_QUERY)).strip().lower()
+    if strategy == "legacy":
+        return _get_hosts_legacy(config, filters, logger)
+    return _get_hosts_planned(config, filters, logger)
 
 
 def get_triggers(config: dict, filters: dict = None) -> list[dict]:
@@ -168,7 +388,7 @@ def get_triggers(config: dict, filters: dict = None) -> list[dict]:
     }
 
     logger.info("Obtendo triggers de credenciais inválidas do Zabbix...")
-    response = _call_api(url, token, payload)
+    response = get_client(config).call(payload["method"], payload["params"])
 
     triggers = []
     for trig in response.get("result", []):
@@ -210,7 +430,8 @@ def get_hosts_by_trigger_ids(config: dict, trigger_ids: list[str], agent_status:
     }
 
     logger.info("Obtendo hosts com triggers em problema no Zabbix...")
-    response = _call_api(url, token, payload)
+    client = get_client(config)
+    response = client.call(payload["method"], payload["params"])
 
     host_ids = []
     for trig in response.get("result", []):
@@ -228,21 +449,17 @@ def get_hosts_by_trigger_ids(config: dict, trigger_ids: list[str], agent_status:
     if agent_status is not None:
         host_filter["available"] = str(agent_status)
 
-    payload_hosts = {
-        "jsonrpc": "2.0",
-        "method": "host.get",
-        "id": 4,
-        "params": {
+    host_details = client.call_chunked(
+        "host.get",
+        {
             "output": ["host"],
-            "hostids": host_ids,
             "selectInventory": ["notes"],
             "selectInterfaces": ["ip", "port"],
             "filter": host_filter,
         },
-    }
-
-    response_hosts = _call_api(url, token, payload_hosts)
-    host_details = response_hosts.get("result", [])
+        "hostids",
+        host_ids,
+    )
 
     keywords_to_include = ("PDV", "SELF", "CONCENTRADOR")
     hosts = []
@@ -308,7 +525,8 @@ def get_hosts_by_trigger_name(config: dict, trigger_name: str, agent_status: int
     }
 
     logger.info("Obtendo hosts com triggers em problema no Zabbix (descricao exata)...")
-    response = _call_api(url, token, payload)
+    client = get_client(config)
+    response = client.call(payload["method"], payload["params"])
 
     host_ids = []
     for trig in response.get("result", []):
@@ -326,21 +544,17 @@ def get_hosts_by_trigger_name(config: dict, trigger_name: str, agent_status: int
     if agent_status is not None:
         host_filter["available"] = str(agent_status)
 
-    payload_hosts = {
-        "jsonrpc": "2.0",
-        "method": "host.get",
-        "id": 6,
-        "params": {
+    host_details = client.call_chunked(
+        "host.get",
+        {
             "output": ["host"],
-            "hostids": host_ids,
             "selectInventory": ["notes"],
             "selectInterfaces": ["ip", "port"],
             "filter": host_filter,
         },
-    }
-
-    response_hosts = _call_api(url, token, payload_hosts)
-    host_details = response_hosts.get("result", [])
+        "hostids",
+        host_ids,
+    )
 
     keywords_to_include = ("PDV", "SELF", "CONCENTRADOR")
     hosts = []
@@ -0,0 +1,449 @@
+# zabbix_sender.py
+"""
+Cliente nativo do protocolo trapper do Zabbix (o mesmo do zabbix_sender):
+cabeçalho "ZBXD\\x01" + tamanho em 8 bytes little-endian + JSON
+{"request": "sender data", "data": [{host, key, value, clock}, ...]}.
+
+Envia muitos itens por requisição (PARAM_ZABBIX_SENDER_BATCH, padrão 250,
+como o zabbix_sender) e reaproveita a conexão TCP enquanto o servidor/proxy a
+mantiver aberta; o trapper normalmente fecha após cada resposta, e aí a
+próxima requisição reconecta sem reenviar nada. A resposta traz
+"processed: N; failed: M; total: T; seconds spent: S", somada em SenderResult.
+
+Só fala o protocolo sem criptografia. O zabbix_sender -c também aplicava o
+TLSConnect/PSK do zabbix_agentd.conf, e com TLSConnect diferente de
+"unencrypted" o trapper recusaria o ZBXD em claro: nesse caso
+sender_for_agent devolve um ZabbixSenderCommand, que grava os itens num
+arquivo -i e chama o binário zabbix_sender uma vez por send().
+"""
+import json
+import logging
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+ZBX_HEADER = b"ZBXD\x01"
+_LENGTH = struct.Struct("<Q")
+DEFAULT_PORT = 10051
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_BATCH_SIZE = 250
+AGENT_CONFIG = "/etc/zabbix/zabbix_agentd.conf"
+# Resposta maior que isso indica lixo no socket, não um trapper
+MAX_RESPONSE = 16 * 1024 * 1024
+
+_INFO_RE = re.compile(
+    r"processed:\s*(?P<processed>\d+);\s*failed:\s*(?P<failed>\d+);\s*"
+    r"total:\s*(?P<total>\d+);\s*seconds spent:\s*(?P<seconds>[\d.]+)"
+)
+# Resumo final do binário zabbix_sender
+_SENT_RE = re.compile(r"sent:\s*(?P<sent>\d+);\s*skipped:\s*(?P<skipped>\d+);\s*total:\s*(?P<total>\d+)")
+
+
+class ZabbixSenderError(Exception):
+    pass
+
+
+@dataclass
+class SenderResult:
+    processed: int = 0
+    failed: int = 0
+    total: int = 0
+    seconds: float = 0.0
+    requests: int = 0
+
+    def add(self, other: "SenderResult"):
+        self.processed += other.processed
+        self.failed += other.failed
+        self.total += other.total
+        self.seconds += other.seconds
+        self.requests += other.requests
+
+    def __str__(self) -> str:
+        return (
+            f"processed: {self.processed}; failed: {self.failed}; total: {self.total}; "
+            f"requests: {self.requests}"
+        )
+
+
+def parse_info(info: str) -> SenderResult:
+    match = _INFO_RE.search(info or "")
+    if not match:
+        raise ZabbixSenderError(f"Resposta do trapper sem contadores: {info!r}")
+    return SenderResult(
+        processed=int(match["processed"]),
+        failed=int(match["failed"]),
+        total=int(match["total"]),
+        seconds=float(match["seconds"]),
+        requests=1,
+    )
+
+
+def pack(payload: dict) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return ZBX_HEADER + _LENGTH.pack(len(body)) + body
+
+
+def _agent_config_value(path: str, parameter: str) -> str | None:
+    """
+    Primeiro valor de 'parameter' no zabbix_agentd.conf (None se ausente ou ilegível).
+    """
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    for line in lines:
+        name, sep, value = line.strip().partition("=")
+        if sep and name.strip() == parameter:
+            return value.strip()
+    return None
+
+
+def server_from_agent_config(path: str = AGENT_CONFIG) -> tuple[str, int] | None:
+    """
+    Primeiro endereço de ServerActive do zabbix_agentd.conf (o que o
+    zabbix_sender usa com -c), como (host, porta).
+    """
+    value = _agent_config_value(path, "ServerActive")
+    if value is None:
+        return None
+    first = value.split(",")[0].split(";")[0].strip()
+    if not first:
+        return None
+    if first.startswith("["):
+        host, _, rest = first[1:].partition("]")
+        port = rest.lstrip(":")
+    elif first.count(":") == 1:
+        host, _, port = first.partition(":")
+    else:
+        host, port = first, ""
+    return host, int(port) if port.isdigit() else DEFAULT_PORT
+
+
+def tls_connect_from_agent_config(path: str = AGENT_CONFIG) -> str:
+    """
+    TLSConnect do zabbix_agentd.conf ("unencrypted" quando ausente, como no agente).
+    """
+    return (_agent_config_value(path, "TLSConnect") or "unencrypted").lower()
+
+
+class ZabbixSender:
+    """
+    Envio em lote de itens trapper. Seguro entre threads: as requisições são
+    serializadas na mesma conexão.
+    """
+
+    def __init__(self, server: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_TIMEOUT,
+                 batch_size: int = DEFAULT_BATCH_SIZE, logger: logging.Logger | None = None):
+        self.server = server
+        self.port = int(port)
+        self.timeout = timeout
+        self.batch_size = max(1, int(batch_size))
+        self.logger = logger or logging.getLogger()
+        self._sock = None
+        self._lock = threading.Lock()
+
+    @property
+    def target(self) -> str:
+        return f"trapper em {self.server}:{self.port}"
+
+    @classmethod
+    def from_config(cls, config: dict, agent_config: str | None = None,
+                    logger: logging.Logger | None = None) -> "ZabbixSender":
+        """
+        PARAM_ZABBIX_SENDER_SERVER/PORT; sem eles, o ServerActive de
+        'agent_config' (quando informado) ou 127.0.0.1:10051.
+
+        Com 'agent_config' em TLSConnect=psk/cert levanta ZabbixSenderError:
+        este cliente não fala TLS e o trapper recusaria os envios (use
+        sender_for_agent).
+        """
+        server = config.get("PARAM_ZABBIX_SENDER_SERVER")
+        port = config.get("PARAM_ZABBIX_SENDER_PORT")
+        if agent_config:
+            tls_connect = tls_connect_from_agent_config(agent_config)
+            if tls_connect != "unencrypted":
+                raise ZabbixSenderError(
+                    f"{agent_config} usa TLSConnect={tls_connect}; o envio nativo ao trapper "
+                    "não suporta TLS/PSK"
+                )
+        if not server and agent_config:
+            found = server_from_agent_config(agent_config)
+            if found:
+                server, port = found[0], port or found[1]
+        return cls(
+            server=server or "127.0.0.1",
+            port=int(port or DEFAULT_PORT),
+            timeout=float(config.get("PARAM_ZABBIX_SENDER_TIMEOUT", DEFAULT_TIMEOUT)),
+            batch_size=int(config.get("PARAM_ZABBIX_SENDER_BATCH", DEFAULT_BATCH_SIZE)),
+            logger=logger,
+        )
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self.server, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _recv_exact(self, sock: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = sock.recv(min(size, 65536))
+            if not chunk:
+                raise ConnectionResetError("conexão fechada pelo trapper")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _read_response(self, sock: socket.socket) -> dict:
+        header = self._recv_exact(sock, len(ZBX_HEADER) + _LENGTH.size)
+        if header[:4] != ZBX_HEADER[:4]:
+            raise ZabbixSenderError(f"Cabeçalho inválido na resposta do trapper: {header[:5]!r}")
+        if header[4] & 0x02:
+            raise ZabbixSenderError("Resposta comprimida do trapper não suportada.")
+        (length,) = _LENGTH.unpack(header[5:])
+        if length > MAX_RESPONSE:
+            raise ZabbixSenderError(f"Resposta do trapper grande demais ({length} bytes).")
+        return json.loads(self._recv_exact(sock, length))
+
+    def _peer_closed(self, sock: socket.socket) -> bool:
+        try:
+            sock.setblocking(False)
+            try:
+                return sock.recv(1, socket.MSG_PEEK) == b""
+            finally:
+                sock.setblocking(True)
+                sock.settimeout(self.timeout)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _request(self, packet: bytes) -> dict:
+        """
+        Uma ida e volta. Só repete na conexão nova quando a reaproveitada
+        falhou antes de qualquer byte de resposta (o trapper a tinha fechado).
+        """
+        reused = self._sock is not None
+        if self._sock is None:
+            self._sock = self._connect()
+        try:
+            self._sock.sendall(packet)
+            response = self._read_response(self._sock)
+        except (ConnectionError, BrokenPipeError) as e:
+            self.close()
+            if not reused:
+                raise ZabbixSenderError(f"Falha ao enviar para {self.server}:{self.port}: {e}") from e
+            self._sock = self._connect()
+            try:
+                self._sock.sendall(packet)
+                response = self._read_response(self._sock)
+            except OSError as retry_error:
+                self.close()
+                raise ZabbixSenderError(
+                    f"Falha ao enviar para {self.server}:{self.port}: {retry_error}"
+                ) from retry_error
+        except (OSError, ValueError):
+            self.close()
+            raise
+        if self._peer_closed(self._sock):
+            self.close()
+        return response
+
+    def send(self, items: list[dict]) -> SenderResult:
+        """
+        Envia itens {"host", "key", "value"[, "clock"]} em lotes de
+        batch_size e soma os contadores das respostas.
+        """
+        total = SenderResult()
+        now = int(time.time())
+        for start in range(0, len(items), self.batch_size):
+            data = []
+            for item in items[start:start + self.batch_size]:
+                data.append({
+                    "host": item["host"],
+                    "key": item["key"],
+                    "value": str(item["value"]),
+                    "clock": int(item.get("clock") or now),
+                })
+            packet = pack({"request": "sender data", "data": data, "clock": int(time.time())})
+            with self._lock:
+                try:
+                    response = self._request(packet)
+                except OSError as e:
+                    raise ZabbixSenderError(f"Falha ao enviar para {self.server}:{self.port}: {e}") from e
+            if response.get("response") != "success":
+                raise ZabbixSenderError(f"Trapper recusou o lote: {response}")
+            total.add(parse_info(response.get("info", "")))
+        return total
+
+    def send_value(self, host: str, key: str, value) -> SenderResult:
+        return self.send([{"host": host, "key": key, "value": value}])
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _quote(field) -> str:
+    text = str(field)
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ZabbixSenderCommand:
+    """
+    Mesma interface do ZabbixSender, pelo binário zabbix_sender -c
+    agent_config, que aplica o TLSConnect/PSK do agente. Cada send() grava
+    todos os itens num único arquivo -i (com -T, levando o clock) e executa
+    o binário uma vez; ele mesmo divide o envio em lotes de 250.
+    """
+
+    def __init__(self, agent_config: str, binary: str | None = None, server: str | None = None,
+                 port: int | None = None, timeout: float = DEFAULT_TIMEOUT,
+                 logger: logging.Logger | None = None):
+        self.agent_config = agent_config
+        self.binary = binary or shutil.which("zabbix_sender") or "/usr/bin/zabbix_sender"
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger()
+
+    @classmethod
+    def from_config(cls, config: dict, agent_config: str = AGENT_CONFIG,
+                    logger: logging.Logger | None = None) -> "ZabbixSenderCommand":
+        """
+        PARAM_ZABBIX_SENDER_BIN (padrão: zabbix_sender do PATH); com
+        PARAM_ZABBIX_SENDER_SERVER/PORT, -z/-p sobrepõem o ServerActive.
+        """
+        port = config.get("PARAM_ZABBIX_SENDER_PORT")
+        return cls(
+            agent_config,
+            binary=config.get("PARAM_ZABBIX_SENDER_BIN"),
+            server=config.get("PARAM_ZABBIX_SENDER_SERVER"),
+            port=int(port) if port else None,
+            timeout=float(config.get("PARAM_ZABBIX_SENDER_TIMEOUT", DEFAULT_TIMEOUT)),
+            logger=logger,
+        )
+
+    @property
+    def target(self) -> str:
+        return f"{self.binary} -c {self.agent_config}"
+
+    def _command(self, input_path: str) -> list[str]:
+        cmd = [self.binary, "-c", self.agent_config, "-T", "-i", input_path, "-v"]
+        if self.server:
+            cmd += ["-z", self.server]
+        if self.port:
+            cmd += ["-p", str(self.port)]
+        return cmd
+
+    def send(self, items: list[dict]) -> SenderResult:
+        """
+        Envia itens {"host", "key", "value"[, "clock"]} e soma os contadores
+        de cada resposta do servidor impressos pelo binário.
+        """
+        if not items:
+            return SenderResult()
+        now = int(time.time())
+        lines = [
+            f'{_quote(item["host"])} {_quote(item["key"])} {int(item.get("clock") or now)} {_quote(item["value"])}\n'
+            for item in items
+        ]
+        # O binário tem o próprio timeout por requisição; este só evita travar
+        requests = -(-len(items) // DEFAULT_BATCH_SIZE)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix="zabbix_sender_", suffix=".txt") as f:
+            f.writelines(lines)
+            f.flush()
+            try:
+                proc = subprocess.run(self._command(f.name), capture_output=True, text=True,
+                                      timeout=self.timeout * (requests + 1))
+            except (OSError, subprocess.SubprocessError) as e:
+                raise ZabbixSenderError(f"Falha ao executar {self.binary}: {e}") from e
+
+        output = f"{proc.stdout}\n{proc.stderr}"
+        # 0: tudo processado; 2: o servidor recusou parte dos itens; 1: falha
+        if proc.returncode not in (0, 2):
+            raise ZabbixSenderError(
+                f"{self.binary} saiu com código {proc.returncode}: {output.strip()[-500:]}"
+            )
+        total = SenderResult()
+        for match in _INFO_RE.finditer(output):
+            total.add(parse_info(match.group(0)))
+        if not total.requests:
+            summary = _SENT_RE.search(output)
+            if not summary:
+                raise ZabbixSenderError(f"Saída do {self.binary} sem contadores: {output.strip()[-500:]}")
+            sent, count = int(summary["sent"]), int(summary["total"])
+            total = SenderResult(processed=sent, failed=count - sent, total=count, requests=requests)
+        return total
+
+    def send_value(self, host: str, key: str, value) -> SenderResult:
+        return self.send([{"host": host, "key": key, "value": value}])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def sender_for_agent(config: dict, agent_config: str = AGENT_CONFIG,
+                     logger: logging.Logger | None = None) -> "ZabbixSender | ZabbixSenderCommand":
+    """
+    ZabbixSender nativo quando o TLSConnect de 'agent_config' é
+    "unencrypted"; com psk/cert, o binário zabbix_sender (ZabbixSenderCommand).
+    """
+    if tls_connect_from_agent_config(agent_config) == "unencrypted":
+        return ZabbixSender.from_config(config, agent_config=agent_config, logger=logger)
+    return ZabbixSenderCommand.from_config(config, agent_config, logger=logger)
+
+
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+def get_sender(config: dict) -> ZabbixSender:
+    """
+    Sender compartilhado por processo para o servidor/porta do config.
+    """
+    key = (config.get("PARAM_ZABBIX_SENDER_SERVER"), config.get("PARAM_ZABBIX_SENDER_PORT"))
+    with _senders_lock:
+        sender = _senders.get(key)
+        if sender is None:
+            sender = ZabbixSender.from_config(config)
+            _senders[key] = sender
+        return sender
+
+
+def send_trap(config: dict, host: str, key: str, value, logger: logging.Logger | None = None) -> bool:
+    """
+    Envia um único valor pelo sender compartilhado. Como o subprocess do
+    zabbix_sender fazia, falhas são só registradas no log.
+    """
+    logger = logger or logging.getLogger()
+    try:
+        result = get_sender(config).send_value(host, key, value)
+    except (ZabbixSenderError, OSError, ValueError) as e:
+        logger.warning(f"Zabbix trap {key} para {host} não enviado: {e}")
+        return False
+    if result.failed:
+        logger.warning(f"Zabbix trap {key} para {host} recusado pelo servidor ({result}).")
+        return False
+    return True